@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+GLEH Course Scan Benchmark
+Compares the original scan loop (listdir + isdir + exists, serial json parsing,
+setattr on every row) with course_indexer.scan_courses_dir() on a generated
+courses volume.
+
+Usage:
+    python scripts/bench_course_scan.py [--courses 5000] [--workers 8] [--stat-latency-ms 0]
+
+--stat-latency-ms adds a sleep to every os.stat() to approximate a Samba/NFS
+mount, where each stat is a network round trip. Run it on the real volume's
+host for representative numbers.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path so we can import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask  # noqa: E402
+from src.database import db  # noqa: E402
+from src.models import Course, CourseScanState  # noqa: E402
+from src.course_indexer import scan_courses_dir  # noqa: E402
+
+
+def generate_courses(courses_dir, count):
+    """Write `count` OCW-style course folders (index.html + ~6KB data.json)."""
+    for i in range(count):
+        path = os.path.join(courses_dir, f'course-{i:05d}')
+        os.makedirs(path)
+        with open(os.path.join(path, 'index.html'), 'w') as f:
+            f.write('<html></html>')
+        with open(os.path.join(path, 'data.json'), 'w') as f:
+            json.dump({
+                'course_title': f'Course {i}',
+                'course_description': 'Lorem ipsum dolor sit amet. ' * 150,
+                'instructors': [{'first_name': 'Ada', 'last_name': f'Lovelace {i}'}],
+                'topics': [['Science', 'Physics'], ['Mathematics', 'Linear Algebra']],
+                'image_src': './static_resources/thumb.jpg',
+                'primary_course_number': f'{i % 24}.{i:03d}',
+                'term': 'Fall', 'year': '2016', 'level': ['Undergraduate'],
+                'department_numbers': [str(i % 24)],
+                'learning_resource_types': ['Lecture Notes', 'Problem Sets'],
+            }, f)
+
+
+def legacy_scan(courses_dir):
+    """The scan loop as it was before course_indexer (admin_api.scan_courses)."""
+    course_folders = []
+    for item in os.listdir(courses_dir):
+        item_path = os.path.join(courses_dir, item)
+        if os.path.isdir(item_path):
+            if os.path.exists(os.path.join(item_path, 'index.html')) or \
+                    os.path.exists(os.path.join(item_path, 'data.json')):
+                course_folders.append(item)
+
+    existing_courses = {c.uid: c for c in Course.query.all()}
+    for folder in course_folders:
+        data_json_path = os.path.join(courses_dir, folder, 'data.json')
+        course_info = {'uid': folder, 'title': folder, 'path': f"{folder}/index.html",
+                       'description': '', 'categories': ''}
+        if os.path.exists(data_json_path) and os.path.isfile(data_json_path):
+            with open(data_json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            categories = set()
+            for topic_path in data.get('topics', []):
+                if isinstance(topic_path, list):
+                    categories.update(topic_path)
+            course_info.update({
+                'title': data.get('course_title', folder),
+                'description': data.get('course_description', ''),
+                'instructor': ', '.join(f"{i.get('first_name', '')} {i.get('last_name', '')}".strip()
+                                        for i in data.get('instructors', [])) or None,
+                'course_number': data.get('primary_course_number', ''),
+                'term': data.get('term', ''),
+                'year': data.get('year', ''),
+                'level': ', '.join(data.get('level', [])),
+                'department': ', '.join(data.get('department_numbers', [])),
+                'categories': ', '.join(sorted(categories)),
+                'thumbnail': f"{folder}/{data.get('image_src', '')[2:]}",
+                'learning_resources': json.dumps(data.get('learning_resource_types', [])),
+            })
+        if folder in existing_courses:
+            for key, value in course_info.items():
+                setattr(existing_courses[folder], key, value)
+        else:
+            db.session.add(Course(**course_info))
+    db.session.commit()
+
+
+def _reset():
+    db.session.execute(db.delete(CourseScanState))
+    db.session.execute(db.delete(Course))
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def _timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    db.session.expunge_all()
+    print(f"  {label:44s}{elapsed:8.2f} s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--stat-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='gleh-scan-bench-')
+    courses_dir = os.path.join(work_dir, 'courses')
+    os.makedirs(courses_dir)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    db.init_app(app)
+
+    print("=" * 60)
+    print(f"GLEH Course Scan Benchmark ({args.courses} courses, stat latency {args.stat_latency_ms}ms)")
+    print("=" * 60)
+
+    try:
+        generate_courses(courses_dir, args.courses)
+        if args.stat_latency_ms:
+            real_stat, delay = os.stat, args.stat_latency_ms / 1000
+
+            def slow_stat(*a, **kw):
+                time.sleep(delay)
+                return real_stat(*a, **kw)
+            os.stat = slow_stat
+
+        with app.app_context():
+            db.create_all()
+
+            print("\nFirst scan (empty database)")
+            legacy = _timed("legacy loop", lambda: legacy_scan(courses_dir))
+            _reset()
+            _timed("scan_courses_dir, inline", lambda: scan_courses_dir(courses_dir, workers=0))
+            _reset()
+            new = _timed(f"scan_courses_dir, {args.workers} threads",
+                         lambda: scan_courses_dir(courses_dir, workers=args.workers))
+            print(f"  speedup x{legacy / new:.1f}")
+
+            print("\nRescan, nothing changed")
+            legacy_scan(courses_dir)
+            legacy = _timed("legacy loop", lambda: legacy_scan(courses_dir))
+            new = _timed(f"scan_courses_dir, {args.workers} threads",
+                         lambda: scan_courses_dir(courses_dir, workers=args.workers))
+            print(f"  speedup x{legacy / new:.1f}")
+
+            print("\nRescan, 1% of data.json files rewritten")
+            for i in range(0, args.courses, 100):
+                path = os.path.join(courses_dir, f'course-{i:05d}', 'data.json')
+                with open(path) as f:
+                    data = json.load(f)
+                data['course_title'] += ' (Revised)'
+                with open(path, 'w') as f:
+                    json.dump(data, f)
+                os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+            _timed(f"scan_courses_dir, {args.workers} threads",
+                   lambda: scan_courses_dir(courses_dir, workers=args.workers))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+GLEH Request Context Microbenchmark
+Measures the per-request cost of before_request_logging in lean and legacy mode
+
+Usage:
+    python scripts/bench_request_context.py [iterations]
+"""
+import sys
+import os
+import timeit
+import uuid
+
+# Add parent directory to path so we can import from src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.app import app, before_request_logging
+from src.logging_config import new_request_id
+import src.app as app_module
+
+
+def _per_call_us(func, iterations):
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def bench_request_ids(iterations):
+    print("\nRequest id generation")
+    print(f"  str(uuid.uuid4()):  {_per_call_us(lambda: str(uuid.uuid4()), iterations):7.2f} us")
+    print(f"  new_request_id():   {_per_call_us(new_request_id, iterations):7.2f} us")
+
+
+def bench_hook(iterations, path):
+    """Time the hook for a request that logs nothing (sampled out)."""
+    sampler = app_module.request_log_sampler
+    original_rate_for = sampler.rate_for if sampler else None
+    if sampler:
+        sampler.rate_for = lambda request_path: 0.0
+
+    print(f"\nbefore_request_logging, nothing logged ({path})")
+    try:
+        with app.test_request_context(path, headers={'User-Agent': 'bench'}):
+            for lean in (False, True):
+                app.config['LOG_LEAN_CONTEXT'] = lean
+                label = 'lean (counter id, lazy bind)' if lean else 'legacy (uuid4, eager bind)'
+                print(f"  {label:32s}{_per_call_us(before_request_logging, iterations):7.2f} us")
+    finally:
+        if sampler:
+            sampler.rate_for = original_rate_for
+        app.config['LOG_LEAN_CONTEXT'] = True
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    print("=" * 60)
+    print("GLEH Request Context Microbenchmark")
+    print("=" * 60)
+
+    bench_request_ids(iterations)
+    bench_hook(iterations, '/health')
+    bench_hook(iterations, '/api/content')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+GLEH Serving Load Test
+Measures throughput of a running server, or compares serving modes by starting
+the app with increasing worker counts (python -m src.server) and loading each.
+
+Usage:
+    # Load an already running server
+    python scripts/load_test.py --url http://localhost:5000/ --concurrency 16 --duration 15
+
+    # Compare waitress with gunicorn at 1, 2 and 4 workers on this host
+    python scripts/load_test.py --compare 1,2,4 --path / --concurrency 32
+
+Results depend on the host: run --compare on the deployment hardware. Use a
+CPU-bound path (e.g. / renders a template; /api/login hashes a password) to
+see scaling; /health serves a cached snapshot and scales with anything.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def run_load(url, concurrency, duration):
+    """Hit `url` from `concurrency` keep-alive clients for `duration` seconds."""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def _wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+
+
+def compare(worker_counts, path, concurrency, duration, threads, port):
+    """Start the app in each serving mode and print a throughput table."""
+    modes = [('waitress', 1)] + [('gunicorn', count) for count in worker_counts]
+    results = []
+    for mode, workers in modes:
+        env = dict(os.environ, SERVER_MODE=mode, SERVER_WORKERS=str(workers), SERVER_THREADS=str(threads),
+                   SERVER_HOST='127.0.0.1', SERVER_PORT=str(port), HEALTH_MONITOR_ENABLED='true')
+        server = subprocess.Popen([sys.executable, '-m', 'src.server'], cwd=ROOT, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_ready(base_url)
+            run_load(base_url + path, concurrency, min(duration, 3))  # Warm-up
+            result = run_load(base_url + path, concurrency, duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        results.append((mode, workers, result))
+        print(f"  {mode:9s} workers={workers:<3d} {result['rps']:9.1f} req/s  "
+              f"p50={result['p50_ms']:7.1f}ms  p95={result['p95_ms']:7.1f}ms  errors={result['errors']}")
+
+    baseline = results[0][2]['rps'] or 1
+    print("\nThroughput relative to waitress (1 process):")
+    for mode, workers, result in results:
+        print(f"  {mode:9s} workers={workers:<3d} x{result['rps'] / baseline:5.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Load this running server URL')
+    parser.add_argument('--compare', help='Comma-separated gunicorn worker counts to compare, e.g. 1,2,4')
+    parser.add_argument('--path', default='/', help='Path to load in --compare mode')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--threads', type=int, default=4, help='SERVER_THREADS in --compare mode')
+    parser.add_argument('--port', type=int, default=5055, help='Port for servers started by --compare')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"GLEH Load Test ({os.cpu_count()} CPUs, concurrency {args.concurrency})")
+    print("=" * 60)
+
+    if args.compare:
+        compare([int(n) for n in args.compare.split(',')], args.path, args.concurrency, args.duration,
+                args.threads, args.port)
+    elif args.url:
+        result = run_load(args.url, args.concurrency, args.duration)
+        print(f"  {result['requests']} requests, {result['rps']:.1f} req/s, p50={result['p50_ms']:.1f}ms, "
+              f"p95={result['p95_ms']:.1f}ms, errors={result['errors']}")
+    else:
+        parser.error('pass --url or --compare')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,16 +5,28 @@ Handles all admin operations: scanning, importing, diagnostics, server control
 
 import os
 import sys
-import zipfile
+import csv
+import io
 import subprocess
 import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from werkzeug.utils import secure_filename
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context, url_for
 from flask_login import login_required, current_user
 from .database import db
-from .models import Course, User
-from .build import categories_from_name
+from .models import Course, CourseManifest, CourseUpload, User
+from .course_archive import ExtractionLimits, extract_archive
+from .course_dedupe import ContentStore, dedupe_courses
+from .course_indexer import categories_from_name, scan_courses_dir
+from .course_manifest import Manifest, verify_course
+from .course_uploads import (UPLOADS_DIRNAME, UploadError, current_offset, discard_upload, expire_uploads,
+                             file_sha256, part_path, write_chunk)
+from .jobs import get_job_runner, JobCancelled
+from .rate_limit import rate_limit
+from .passwords import get_password_hasher, PasswordHasherBusy, HASH_CHUNK_SIZE
 import hashlib
 
 admin_bp = Blueprint('admin_api', __name__, url_prefix='/api/admin')
@@ -86,15 +98,87 @@ def update_env_config():
         return jsonify({'error': str(e)}), 500
 
 
+# ===========================
+# BACKGROUND JOBS
+# ===========================
+
+def _job_accepted(job_id):
+    """202 response for an endpoint that handed its work to the job runner."""
+    job = get_job_runner().get(job_id)
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('admin_api.get_job', job_id=job_id),
+        'job': job.to_dict(),
+    }), 202
+
+
+@admin_bp.route('/jobs', methods=['GET'])
+@login_required
+@admin_required
+def list_jobs():
+    """Most recent admin jobs, newest first"""
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({'jobs': [job.to_dict() for job in get_job_runner().recent(limit)]})
+
+
+@admin_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_job(job_id):
+    """Status, progress and result of one admin job"""
+    job = get_job_runner().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
+
+@admin_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop at its next progress report"""
+    job = get_job_runner().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict()})
+
+
 # ===========================
 # COURSE OPERATIONS
 # ===========================
 
+def _scan_courses_job(job, courses_dir, full, workers):
+    job.report(0, 'Scanning course folders')
+
+    def progress(done, total):
+        # Writing the results is the last ~10%
+        job.report(done * 90 // total, f'Inspected {done}/{total} folders')
+
+    result = scan_courses_dir(courses_dir, full=full, workers=workers, progress=progress,
+                              manifests=current_app.config.get('COURSE_MANIFESTS_ENABLED', True))
+    job.report(100, 'Scan complete', force=True)
+    return {
+        **result,
+        # Pre-manifest clients read 'existing'
+        'existing': result['changed'] + result['unchanged'],
+        'message': (f"Imported {result['new']} new courses, updated {result['changed']}, "
+                    f"{result['unchanged']} unchanged, {result['removed']} removed"),
+    }
+
+
 @admin_bp.route('/scan-courses', methods=['POST'])
 @login_required
 @admin_required
+@rate_limit('admin_scan')
 def scan_courses():
-    """Scan /courses directory and import courses to database"""
+    """
+    Scan /courses directory and import courses to database.
+
+    Only folders whose fingerprint changed since the last scan are re-read
+    (see course_indexer.py); ?full=1 re-parses every course. Runs as a
+    background job: returns 202 with the job id, the counts end up in the
+    job's result.
+    """
     try:
         # Determine courses directory (Docker volume or local)
         courses_dir = '/app/data/courses' if os.path.exists(
@@ -104,111 +188,10 @@ def scan_courses():
         if not os.path.isdir(courses_dir):
             return jsonify({'error': 'Courses directory not found'}), 400
 
-        # Find all valid course directories (must have index.html or data.json)
-        course_folders = []
-        for item in os.listdir(courses_dir):
-            item_path = os.path.join(courses_dir, item)
-            if os.path.isdir(item_path):
-                index_path = os.path.join(item_path, 'index.html')
-                data_path = os.path.join(item_path, 'data.json')
-                if os.path.exists(index_path) or os.path.exists(data_path):
-                    course_folders.append(item)
-
-        # Get existing course UIDs
-        existing_courses = {c.uid: c for c in Course.query.all()}
-
-        new_count = 0
-        updated_count = 0
-
-        # Process each course folder
-        for folder in course_folders:
-            course_path = os.path.join(courses_dir, folder)
-            data_json_path = os.path.join(course_path, 'data.json')
-
-            # Default course info
-            course_info = {
-                'uid': folder,
-                'title': folder.replace('-', ' ').replace('_', ' '),
-                'path': f"{folder}/index.html",
-                'description': '',
-                'categories': '',
-            }
-
-            # Parse data.json if available (MIT OCW courses)
-            if os.path.exists(data_json_path) and os.path.isfile(data_json_path):
-                try:
-                    with open(data_json_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-
-                    # Extract instructors
-                    instructors = data.get('instructors', [])
-                    instructor_names = []
-                    for instructor in instructors:
-                        if 'title' in instructor and instructor['title']:
-                            instructor_names.append(instructor['title'])
-                        else:
-                            first = instructor.get('first_name', '')
-                            last = instructor.get('last_name', '')
-                            if first or last:
-                                instructor_names.append(f"{first} {last}".strip())
-
-                    # Extract topics/categories
-                    topics = data.get('topics', [])
-                    categories = set()
-                    if topics:
-                        for topic_path in topics:
-                            if isinstance(topic_path, list):
-                                categories.update(topic_path)
-
-                    # Handle thumbnail
-                    thumbnail = None
-                    image_src = data.get('image_src', '')
-                    if image_src:
-                        if image_src.startswith('./'):
-                            thumbnail = f"{folder}/{image_src[2:]}"
-                        else:
-                            thumbnail = f"{folder}/{image_src}"
-
-                    # Update course info with MIT OCW data
-                    course_info.update({
-                        'title': data.get('course_title', folder),
-                        'description': data.get('course_description', ''),
-                        'instructor': ', '.join(instructor_names) if instructor_names else None,
-                        'course_number': data.get('primary_course_number', ''),
-                        'term': data.get('term', ''),
-                        'year': data.get('year', ''),
-                        'level': ', '.join(data.get('level', [])),
-                        'department': ', '.join(data.get('department_numbers', [])),
-                        'categories': ', '.join(sorted(categories)) if categories else '',
-                        'thumbnail': thumbnail,
-                        'learning_resources': json.dumps(data.get('learning_resource_types', [])),
-                    })
-
-                except Exception as e:
-                    current_app.logger.warning(f"Failed to parse data.json for {folder}: {e}")
-
-            # Create or update course in database
-            if folder in existing_courses:
-                # Update existing course
-                course = existing_courses[folder]
-                for key, value in course_info.items():
-                    setattr(course, key, value)
-                updated_count += 1
-            else:
-                # Create new course
-                course = Course(**course_info)
-                db.session.add(course)
-                new_count += 1
-
-        # Commit all changes to database
-        db.session.commit()
-
-        return jsonify({
-            'total': len(course_folders),
-            'new': new_count,
-            'existing': updated_count,
-            'message': f'Successfully imported {new_count} new courses and updated {updated_count} existing courses'
-        })
+        full = _parse_bool(request.args.get('full', ''))
+        job_id = get_job_runner().submit('scan_courses', _scan_courses_job, courses_dir, full,
+                                         current_app.config.get('COURSE_SCAN_WORKERS', 8), user_id=current_user.id)
+        return _job_accepted(job_id)
 
     except Exception as e:
         db.session.rollback()
@@ -251,29 +234,35 @@ def get_courses():
 @login_required
 @admin_required
 def generate_thumbnails_route():
-    """Generate missing course thumbnails"""
+    """Generate missing course thumbnails (background job)"""
     try:
-        generated = 0
-        failed = 0
+        job_id = get_job_runner().submit('generate_thumbnails', _generate_thumbnails_job, user_id=current_user.id)
+        return _job_accepted(job_id)
 
-        courses = Course.query.all()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        for course in courses:
-            if not course.thumbnail or 'default' in course.thumbnail:
-                try:
-                    # Would need to regenerate from video
-                    # This is a placeholder
-                    generated += 1
-                except Exception:
-                    failed += 1
 
-        return jsonify({
-            'generated': generated,
-            'failed': failed
-        })
+def _generate_thumbnails_job(job):
+    generated = 0
+    failed = 0
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    courses = Course.query.all()
+
+    for index, course in enumerate(courses, 1):
+        if not course.thumbnail or 'default' in course.thumbnail:
+            try:
+                # Would need to regenerate from video
+                # This is a placeholder
+                generated += 1
+            except Exception:
+                failed += 1
+        job.report(index * 100 // len(courses), f'Checked {index}/{len(courses)} courses')
+
+    return {
+        'generated': generated,
+        'failed': failed
+    }
 
 
 @admin_bp.route('/autocategorize', methods=['POST'])
@@ -323,6 +312,7 @@ def delete_course(course_id):
 @admin_bp.route('/upload-course', methods=['POST'])
 @login_required
 @admin_required
+@rate_limit('admin_upload')
 def upload_course():
     """Upload course files to the courses volume"""
     try:
@@ -348,14 +338,13 @@ def upload_course():
         upload_path = os.path.join(courses_dir, filename)
         file.save(upload_path)
 
-        # If it's a zip file, extract it
+        # If it's a zip file, extract it in the background
         if filename.endswith('.zip'):
             extract_dir = os.path.join(
                 courses_dir, filename.replace('.zip', ''))
-            with zipfile.ZipFile(upload_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-            # Remove the zip file after extraction
-            os.remove(upload_path)
+            job_id = get_job_runner().submit('extract_course', _extract_course_job, upload_path, extract_dir,
+                                             user_id=current_user.id, cleanup=lambda: _remove_file(upload_path))
+            return _job_accepted(job_id)
 
         return jsonify({
             'message': 'Course uploaded successfully',
@@ -366,6 +355,300 @@ def upload_course():
         return jsonify({'error': str(e)}), 500
 
 
+def _extract_course_job(job, upload_path, extract_dir):
+    """Extract an uploaded zip (see course_archive.py), then scan just that course folder."""
+    limits = ExtractionLimits.from_config(current_app.config)
+    courses_dir = os.path.dirname(os.path.abspath(extract_dir))
+    store = _content_store(courses_dir) if current_app.config.get('COURSE_DEDUPE_ENABLED') else None
+    try:
+        extracted = extract_archive(upload_path, extract_dir, limits, progress=lambda done, total: job.report(
+            done * 90 // total, f'Extracted {done}/{total} files'), store=store)
+    finally:
+        # Rejected, cancelled or done: the zip is not needed any more
+        _remove_file(upload_path)
+
+    job.report(90, 'Importing course', force=True)
+    scan = scan_courses_dir(courses_dir, folders=[os.path.basename(extract_dir)], workers=0,
+                            manifests=current_app.config.get('COURSE_MANIFESTS_ENABLED', True))
+
+    return {
+        'message': 'Course uploaded successfully',
+        'filename': os.path.basename(upload_path),
+        'files': extracted['files'],
+        'bytes': extracted['bytes'],
+        'bytes_saved': extracted.get('bytes_saved', 0),
+        'scan': scan,
+    }
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _content_store(courses_dir):
+    return ContentStore(courses_dir, min_size=current_app.config.get('COURSE_DEDUPE_MIN_BYTES', 4096))
+
+
+@admin_bp.route('/dedupe-courses', methods=['POST'])
+@login_required
+@admin_required
+def dedupe_courses_route():
+    """
+    Hardlink identical files across course folders into the content store (see course_dedupe.py).
+
+    Runs as a background job: returns 202 with the job id; files linked and
+    bytes saved end up in the job's result.
+    """
+    try:
+        courses_dir = _upload_courses_dir()
+        if not os.path.isdir(courses_dir):
+            return jsonify({'error': 'Courses directory not found'}), 400
+
+        job_id = get_job_runner().submit('dedupe_courses', _dedupe_courses_job, courses_dir,
+                                         current_app.config.get('COURSE_SCAN_WORKERS', 8), user_id=current_user.id)
+        return _job_accepted(job_id)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _dedupe_courses_job(job, courses_dir, workers):
+    result = dedupe_courses(courses_dir, _content_store(courses_dir), workers=workers,
+                            progress=lambda files: job.report(None, f'Checked {files} files'))
+    result['message'] = f"Linked {result['linked']} duplicate files, saved {result['bytes_saved']} bytes"
+    return result
+
+
+@admin_bp.route('/verify-courses', methods=['POST'])
+@login_required
+@admin_required
+def verify_courses_route():
+    """
+    Re-hash course files against their scan manifests (see course_manifest.py).
+
+    Optional JSON body {"uids": [...]} limits the check to those courses.
+    Runs as a background job: returns 202 with the job id; missing, modified
+    and unexpected files end up in the job's result.
+    """
+    try:
+        courses_dir = _upload_courses_dir()
+        if not os.path.isdir(courses_dir):
+            return jsonify({'error': 'Courses directory not found'}), 400
+
+        uids = (request.get_json(silent=True) or {}).get('uids')
+        if uids is not None and (not isinstance(uids, list) or not all(isinstance(uid, str) for uid in uids)):
+            return jsonify({'error': 'uids must be a list of course folder names'}), 400
+
+        job_id = get_job_runner().submit('verify_courses', _verify_courses_job, courses_dir, uids,
+                                         current_app.config.get('COURSE_SCAN_WORKERS', 8), user_id=current_user.id)
+        return _job_accepted(job_id)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _verify_courses_job(job, courses_dir, uids, workers, batch_size=50, max_reported=100):
+    query = db.select(CourseManifest.uid, CourseManifest.files).order_by(CourseManifest.uid)
+    if uids is not None:
+        query = query.where(CourseManifest.uid.in_(uids))
+    sizes = dict(db.session.execute(query).all())
+    total_files = sum(sizes.values()) or 1
+
+    result = {'courses': 0, 'files': 0, 'intact': 0, 'missing': 0, 'modified': 0, 'unexpected': 0, 'problems': []}
+    if uids is not None:
+        result['no_manifest'] = sorted(set(uids) - set(sizes))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='course-verify') if workers > 1 else None
+    try:
+        checked_files = 0
+        ordered = list(sizes)
+        for start in range(0, len(ordered), batch_size):
+            chunk = ordered[start:start + batch_size]
+            manifests = dict(db.session.execute(
+                db.select(CourseManifest.uid, CourseManifest.data).where(CourseManifest.uid.in_(chunk))).all())
+            for uid in chunk:
+                report = verify_course(os.path.join(courses_dir, uid), Manifest.decode(manifests[uid]), executor)
+                result['courses'] += 1
+                result['files'] += report['files']
+                for kind in ('missing', 'modified', 'unexpected'):
+                    result[kind] += report[kind]
+                if report['missing'] or report['modified'] or report['unexpected']:
+                    if len(result['problems']) < max_reported:
+                        result['problems'].append({'uid': uid, **report})
+                else:
+                    result['intact'] += 1
+                checked_files += sizes[uid]
+                job.report(checked_files * 100 // total_files, f"Verified {result['courses']}/{len(sizes)} courses")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    result['message'] = (f"{result['intact']}/{result['courses']} courses intact; {result['missing']} missing, "
+                         f"{result['modified']} modified, {result['unexpected']} unexpected files")
+    return result
+
+
+def _upload_courses_dir():
+    # Determine courses directory (Docker volume or local)
+    return '/app/data/courses' if os.path.exists(
+        '/app/data/courses') else os.path.join(
+            current_app.config.get('CONTENT_DIR', '.'), 'courses')
+
+
+def _upload_error(error):
+    body = {'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
+
+
+@admin_bp.route('/uploads', methods=['POST'])
+@login_required
+@admin_required
+@rate_limit('admin_upload')
+def start_upload():
+    """
+    Start a resumable chunked course upload (see course_uploads.py).
+
+    Body: {"filename": "course.zip", "size": <bytes>, "sha256": <hex, optional>}
+    Returns 201 with the upload (offset 0) and the chunk size to send.
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename') or ''))
+    size = data.get('size')
+    sha256 = data.get('sha256') or None
+    if not filename:
+        return jsonify({'error': 'filename required'}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({'error': 'size must be a positive number of bytes'}), 400
+    max_bytes = current_app.config.get('COURSE_UPLOAD_MAX_BYTES', 50 * 1024 ** 3)
+    if size > max_bytes:
+        return jsonify({'error': f'Upload exceeds the {max_bytes} byte limit'}), 413
+    if sha256 is not None and (not isinstance(sha256, str) or len(sha256) != 64):
+        return jsonify({'error': 'sha256 must be a hex digest'}), 400
+
+    courses_dir = _upload_courses_dir()
+    os.makedirs(os.path.join(courses_dir, UPLOADS_DIRNAME), exist_ok=True)
+    expire_uploads(courses_dir, current_app.config.get('COURSE_UPLOAD_RETENTION_HOURS', 24))
+
+    upload = CourseUpload(id=uuid.uuid4().hex, filename=filename, size=size,
+                          sha256=sha256.lower() if sha256 else None, created_by=current_user.id)
+    db.session.add(upload)
+    db.session.commit()
+    open(part_path(courses_dir, upload.id), 'wb').close()
+    return jsonify({
+        'upload': upload.to_dict(offset=0),
+        'chunk_size': current_app.config.get('COURSE_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+        'upload_url': url_for('admin_api.upload_status', upload_id=upload.id),
+    }), 201
+
+
+@admin_bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+@admin_required
+def upload_status(upload_id):
+    """Bytes received so far: where to resume after a dropped connection"""
+    upload = db.session.get(CourseUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    offset = current_offset(part_path(_upload_courses_dir(), upload.id))
+    return jsonify({'upload': upload.to_dict(offset=offset)})
+
+
+@admin_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+@admin_required
+def upload_chunk(upload_id):
+    """
+    Append one chunk (raw request body) at ?offset=N.
+
+    The body is streamed to disk; an optional X-Chunk-SHA256 header makes the
+    chunk all or nothing. 409 with the current offset if N is not where the
+    upload is.
+    """
+    upload = db.session.get(CourseUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    chunk_limit = current_app.config.get('COURSE_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > chunk_limit:
+        return jsonify({'error': f'Chunks are limited to {chunk_limit} bytes'}), 413
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset required'}), 400
+
+    path = part_path(_upload_courses_dir(), upload.id)
+    # Release the pooled connection while the body streams in
+    size, sha256 = upload.size, request.headers.get('X-Chunk-SHA256')
+    db.session.rollback()
+    try:
+        offset = write_chunk(path, offset, request.stream, request.content_length, size, sha256)
+    except UploadError as e:
+        if e.offset is None:
+            e.offset = current_offset(path)
+        return _upload_error(e)
+    return jsonify({'offset': offset, 'size': size})
+
+
+@admin_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+@admin_required
+def complete_upload(upload_id):
+    """Verify and move a fully received upload into the courses volume (zip extraction is a job)"""
+    upload = db.session.get(CourseUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    courses_dir = _upload_courses_dir()
+    offset = current_offset(part_path(courses_dir, upload.id))
+    if offset != upload.size:
+        return jsonify({'error': 'Upload is incomplete', 'offset': offset, 'size': upload.size}), 409
+
+    job_id = get_job_runner().submit('complete_upload', _complete_upload_job, courses_dir, upload.id,
+                                     user_id=current_user.id)
+    return _job_accepted(job_id)
+
+
+@admin_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+@admin_required
+def abort_upload(upload_id):
+    """Abandon an upload and delete the bytes received so far"""
+    upload = db.session.get(CourseUpload, upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    discard_upload(_upload_courses_dir(), upload)
+    db.session.commit()
+    return jsonify({'message': 'Upload discarded'})
+
+
+def _complete_upload_job(job, courses_dir, upload_id):
+    upload = db.session.get(CourseUpload, upload_id)
+    if upload is None:
+        raise ValueError('Upload not found')
+    path = part_path(courses_dir, upload.id)
+    filename, size, sha256 = upload.filename, upload.size, upload.sha256
+    db.session.rollback()
+
+    if sha256:
+        job.report(0, 'Verifying checksum')
+        digest = file_sha256(path, progress=lambda done, total: job.report(
+            done * 100 // total, f'Verified {done // (1024 * 1024)}/{total // (1024 * 1024)} MB'))
+        if digest != sha256:
+            discard_upload(courses_dir, db.session.get(CourseUpload, upload_id))
+            db.session.commit()
+            raise ValueError(f'Checksum mismatch: expected {sha256}, got {digest}; upload discarded')
+
+    target_path = os.path.join(courses_dir, filename)
+    os.replace(path, target_path)
+    db.session.delete(db.session.get(CourseUpload, upload_id))
+    db.session.commit()
+
+    if filename.endswith('.zip'):
+        return _extract_course_job(job, target_path, os.path.join(courses_dir, filename.replace('.zip', '')))
+    return {'message': 'Course uploaded successfully', 'filename': filename, 'size': size}
+
+
 # ===========================
 # SERVER OPERATIONS & DIAGNOSTICS
 # ===========================
@@ -391,7 +674,7 @@ def restart_server():
 @login_required
 @admin_required
 def run_script():
-    """Run maintenance scripts"""
+    """Run maintenance scripts (background job, 5 minute timeout)"""
     try:
         data = request.json
         script_name = data.get('script')
@@ -416,27 +699,47 @@ def run_script():
         if not os.path.exists(script_path):
             return jsonify({'error': 'Script not found'}), 404
 
-        # Run the script
-        result = subprocess.run(
-            [sys.executable, script_path],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
-
-        return jsonify({
-            'success': result.returncode == 0,
-            'stdout': result.stdout,
-            'stderr': result.stderr,
-            'returncode': result.returncode
-        })
+        job_id = get_job_runner().submit('run_script', _run_script_job, script_path, user_id=current_user.id)
+        return _job_accepted(job_id)
 
-    except subprocess.TimeoutExpired:
-        return jsonify({'error': 'Script execution timed out'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _run_script_job(job, script_path, timeout=300):
+    """Run a maintenance script; cancelling the job kills it."""
+    process = subprocess.Popen(
+        [sys.executable, script_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    started = time.monotonic()
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=1)
+            break
+        except subprocess.TimeoutExpired:
+            elapsed = time.monotonic() - started
+            if elapsed > timeout:
+                process.kill()
+                process.communicate()
+                raise RuntimeError('Script execution timed out')
+            try:
+                job.report(message=f'Running {os.path.basename(script_path)} ({elapsed:.0f}s)')
+            except JobCancelled:
+                process.kill()
+                process.communicate()
+                raise
+
+    return {
+        'success': process.returncode == 0,
+        'stdout': stdout,
+        'stderr': stderr,
+        'returncode': process.returncode
+    }
+
+
 @admin_bp.route('/self-heal', methods=['POST'])
 @login_required
 @admin_required
@@ -568,30 +871,133 @@ def diagnostics():
 @login_required
 @admin_required
 def get_logs():
-    """Get recent application logs"""
+    """
+    Get application logs, newest first, read backwards from the end of app.log.
+
+    Query params:
+        limit: Lines per page (default 50, max 500)
+        cursor: next_cursor from the previous page, to continue with older lines
+        level: Minimum level (debug, info, warning, error, critical)
+        event: Exact event name (e.g. request_completed)
+        request_id: Exact request id
+        user_id: Lines for this user (all of their requests when the log index is enabled)
+        since, until: ISO 8601 timestamps bounding the time range
+
+    With LOG_INDEX_ENABLED, request_id/user_id lookups go through the sidecar
+    index and cover every retained file, not just today's app.log.
+    """
+    from .log_reader import LogFilter, read_log_page, parse_timestamp
+    from .logging_config import get_log_file_path
+
     try:
-        # Try to read from Docker logs volume
-        log_file = '/app/logs/app.log' if os.path.exists(
-            '/app/logs') else None
-
-        logs = []
-        if log_file and os.path.exists(log_file):
-            with open(log_file, 'r') as f:
-                # Get last 50 lines
-                all_lines = f.readlines()
-                logs = all_lines[-50:]
-        else:
-            logs = [
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        user_id = request.args.get('user_id')
+        since = request.args.get('since')
+        until = request.args.get('until')
+        log_filter = LogFilter(
+            level=request.args.get('level') or None,
+            event=request.args.get('event') or None,
+            request_id=request.args.get('request_id') or None,
+            user_id=int(user_id) if user_id else None,
+            since=parse_timestamp(since) if since else None,
+            until=parse_timestamp(until) if until else None,
+        )
+        if (since and log_filter.since is None) or (until and log_filter.until is None):
+            raise ValueError("since/until must be ISO 8601 timestamps")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    log_file = get_log_file_path(current_app)
+    if not log_file.exists():
+        return jsonify({
+            'logs': [
                 '[INFO] No log file found',
                 '[INFO] Logs may be in Docker stdout',
                 '[INFO] Use: docker logs gleh-web'
-            ]
+            ],
+            'next_cursor': None
+        })
 
-        return jsonify({'logs': logs})
+    if current_app.config.get('LOG_INDEX_ENABLED') and (log_filter.request_id or log_filter.user_id is not None):
+        from .log_index import LogIndex, INDEX_FILENAME, read_indexed_lines
+
+        index_path = log_file.parent / INDEX_FILENAME
+        if index_path.exists():
+            cursor = request.args.get('cursor')
+            if cursor and not cursor.isdigit():
+                return jsonify({'error': 'Invalid cursor'}), 400
+            index = LogIndex(index_path)
+            try:
+                entries = index.lookup(
+                    request_id=log_filter.request_id,
+                    user_id=log_filter.user_id,
+                    event=log_filter.event,
+                    since=log_filter.since,
+                    until=log_filter.until,
+                    level=request.args.get('level') or None,
+                    before=int(cursor) if cursor else None,
+                    limit=limit,
+                )
+            finally:
+                index.close()
+            # Offsets are verified against the request_id; a stale entry is dropped, so a page may come up short
+            lines = read_indexed_lines(log_file.parent, entries, log_filter.request_id)
+            next_cursor = str(entries[-1][2]) if len(entries) == limit else None
+            return jsonify({'logs': lines, 'next_cursor': next_cursor, 'indexed': True})
 
-    except Exception as e:
+    try:
+        page = read_log_page(log_file, log_filter, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except OSError as e:
         return jsonify({'error': str(e)}), 500
 
+    return jsonify({'logs': page.lines, 'next_cursor': page.next_cursor})
+
+
+@admin_bp.route('/events', methods=['GET'])
+@login_required
+@admin_required
+def admin_events():
+    """
+    Server-Sent Events stream of admin job progress and new log lines (see admin_events.py).
+
+    Query params:
+        job: Follow only this job; the stream ends once it has finished
+        jobs: Include every active job (default 1)
+        logs: Include lines appended to app.log (default 0)
+        offset: Log byte offset to resume from (default: end of file); Last-Event-ID takes precedence
+    """
+    from .admin_events import LogFollower, event_stream, get_stream_slots
+    from .logging_config import get_log_file_path
+
+    config = current_app.config
+    release = get_stream_slots(config.get('ADMIN_EVENTS_MAX_STREAMS', 2)).acquire()
+    if release is None:
+        response = jsonify({'error': 'Too many open event streams, try again shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    follower = None
+    if _parse_bool(request.args.get('logs', '')):
+        offset = request.headers.get('Last-Event-ID') or request.args.get('offset', '')
+        follower = LogFollower(get_log_file_path(current_app), offset=int(offset) if offset.isdigit() else None,
+                               max_lag=config.get('ADMIN_EVENTS_MAX_LAG_BYTES', 1024 * 1024))
+
+    stream = event_stream(
+        follower=follower,
+        job_id=request.args.get('job') or None,
+        watch_jobs=_parse_bool(request.args.get('jobs', '1')),
+        poll_interval=config.get('ADMIN_EVENTS_POLL_INTERVAL', 1.0),
+        max_seconds=config.get('ADMIN_EVENTS_MAX_SECONDS', 300.0),
+        release=release,
+    )
+    response = Response(stream_with_context(stream), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    response.call_on_close(release)
+    return response
+
 
 # ===========================
 # USER MANAGEMENT
@@ -657,6 +1063,151 @@ def create_user():
         return jsonify({'error': str(e)}), 500
 
 
+# Usernames per IN (...) lookup; stays under SQLite's bound-parameter limit
+USERNAME_LOOKUP_CHUNK = 500
+
+
+def _parse_bulk_users(req):
+    """
+    Read user rows from a JSON body ({"users": [...]}), a CSV body, or an uploaded CSV file.
+
+    CSV needs a header row with username and password columns; is_admin is optional.
+    Returns a list of dicts or raises ValueError.
+    """
+    upload = req.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif req.mimetype == 'text/csv':
+        text = req.get_data(as_text=True)
+    else:
+        data = req.get_json(silent=True)
+        users = data.get('users') if isinstance(data, dict) else data
+        if not isinstance(users, list):
+            raise ValueError('Expected JSON {"users": [...]} or a CSV upload')
+        return [user if isinstance(user, dict) else {} for user in users]
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {'username', 'password'} <= {f.strip() for f in reader.fieldnames}:
+        raise ValueError('CSV header must include username and password columns')
+    return [{key.strip(): (value or '').strip() for key, value in row.items() if key} for row in reader]
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def provision_users(rows, validate=None):
+    """
+    Create many users at once, yielding one result dict per row.
+
+    Existing usernames are found with IN queries, passwords are hashed in
+    parallel by the password pool, and all new users are inserted with one
+    executemany in a single transaction. validate(username, password) returns
+    an error message or None.
+
+    Yields {'row', 'username', 'status': created|exists|duplicate|invalid, 'error'?}
+    per row, and {'progress': {'hashed', 'total'}} between hashing batches.
+    """
+    pending, seen = [], set()
+    for index, row in enumerate(rows, start=1):
+        username = str(row.get('username') or '').strip()
+        password = str(row.get('password') or '')
+        error = validate(username, password) if validate else (
+            None if username and password else 'Username and password are required')
+        if error:
+            yield {'row': index, 'username': username, 'status': 'invalid', 'error': error}
+        elif username in seen:
+            yield {'row': index, 'username': username, 'status': 'duplicate'}
+        else:
+            seen.add(username)
+            pending.append((index, username, password, _parse_bool(row.get('is_admin'))))
+
+    names = [username for _, username, _, _ in pending]
+    existing = set()
+    for start in range(0, len(names), USERNAME_LOOKUP_CHUNK):
+        chunk = names[start:start + USERNAME_LOOKUP_CHUNK]
+        existing.update(name for (name,) in db.session.query(User.username).filter(User.username.in_(chunk)))
+
+    to_create = []
+    for index, username, password, is_admin in pending:
+        if username in existing:
+            yield {'row': index, 'username': username, 'status': 'exists'}
+        else:
+            to_create.append((index, username, password, is_admin))
+    if not to_create:
+        return
+
+    hasher = get_password_hasher()
+    batch_size = max(hasher.workers, 1) * HASH_CHUNK_SIZE
+    hashes = []
+    for start in range(0, len(to_create), batch_size):
+        hashes.extend(hasher.hash_many(password for _, _, password, _ in to_create[start:start + batch_size]))
+        yield {'progress': {'hashed': len(hashes), 'total': len(to_create)}}
+
+    db.session.execute(
+        db.insert(User),
+        [{'username': username, 'password_hash': password_hash, 'is_admin': is_admin}
+         for (_, username, _, is_admin), password_hash in zip(to_create, hashes)],
+    )
+    db.session.commit()
+
+    for index, username, _, _ in to_create:
+        yield {'row': index, 'username': username, 'status': 'created'}
+
+
+@admin_bp.route('/users/bulk', methods=['POST'])
+@login_required
+@admin_required
+def bulk_create_users():
+    """
+    Create many users from JSON or CSV (classroom provisioning).
+
+    Streams newline-delimited JSON: one line per row as it is decided,
+    {"progress": ...} lines while passwords are hashed, and a final
+    {"summary": ...} line. Rows are created in a single transaction; if the
+    insert fails nothing is created and the last line carries the error.
+    """
+    from .app import validate_username, validate_password
+
+    try:
+        rows = _parse_bulk_users(request)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+
+    max_rows = current_app.config.get('BULK_USER_MAX_ROWS', 1000)
+    if not rows:
+        return jsonify({'error': 'No users provided'}), 400
+    if len(rows) > max_rows:
+        return jsonify({'error': f'At most {max_rows} users per request'}), 413
+
+    def validate(username, password):
+        for is_valid, error in (validate_username(username), validate_password(password)):
+            if not is_valid:
+                return error
+        return None
+
+    def generate():
+        counts = {}
+        try:
+            for result in provision_users(rows, validate=validate):
+                if 'status' in result:
+                    counts[result['status']] = counts.get(result['status'], 0) + 1
+                yield json.dumps(result) + '\n'
+            summary = {'total': len(rows), **counts}
+        except PasswordHasherBusy as e:
+            db.session.rollback()
+            summary = {'total': len(rows), 'error': f'Password hashing busy, nothing created: {e}'}
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Bulk user creation failed: {e}")
+            summary = {'total': len(rows), 'error': f'Insert failed, nothing created: {e}'}
+        yield json.dumps({'summary': summary}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @admin_bp.route('/delete-user', methods=['POST'])
 @login_required
 @admin_required
@@ -728,20 +1279,9 @@ def seed_test_users():
             {'username': 'testuser3', 'password': 'test123'},
         ]
 
-        created = []
-        skipped = []
-
-        for user_data in test_users:
-            if User.query.filter_by(
-                    username=user_data['username']).first():
-                skipped.append(user_data['username'])
-            else:
-                new_user = User(username=user_data['username'])
-                new_user.set_password(user_data['password'])
-                db.session.add(new_user)
-                created.append(user_data['username'])
-
-        db.session.commit()
+        results = [r for r in provision_users(test_users) if 'status' in r]
+        created = [r['username'] for r in results if r['status'] == 'created']
+        skipped = [r['username'] for r in results if r['status'] != 'created']
 
         return jsonify({
             'message': 'Test users seeded',
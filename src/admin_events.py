@@ -0,0 +1,206 @@
+"""
+Server-Sent Events for the admin panel.
+
+GET /api/admin/events streams admin job progress and lines appended to app.log,
+replacing the panel's polling loops. Each stream polls the admin_job table and
+the log file every ADMIN_EVENTS_POLL_INTERVAL seconds; both are shared across
+worker processes, so a job running in another gunicorn worker is seen too.
+
+Memory per client is bounded: the stream is a generator that reads at most
+one chunk of the log per poll, and a client that falls more than
+ADMIN_EVENTS_MAX_LAG_BYTES behind skips ahead (a 'gap' event reports the
+skipped bytes) instead of the backlog being buffered for it.
+
+Every open stream holds a server thread, so streams are capped per process
+(ADMIN_EVENTS_MAX_STREAMS, 503 beyond that) and end after
+ADMIN_EVENTS_MAX_SECONDS. EventSource reconnects by itself, sending the last
+event id (the log offset) so the log resumes where it stopped.
+
+Events:
+    job   admin_job row as JSON, sent when status/progress/message change
+    log   {'lines': [...]} newly appended log lines
+    gap   {'skipped_bytes': n} log lines dropped because the client lagged
+    not_found  the job given with ?job= does not exist (stream ends)
+"""
+
+import json
+import os
+import threading
+import time
+
+from .database import db
+from .models import AdminJob
+
+# Log bytes read per poll per client
+LOG_CHUNK_SIZE = 64 * 1024
+# Seconds between keepalive comments (proxies close idle connections)
+HEARTBEAT_INTERVAL = 15.0
+# EventSource reconnect delay sent to the browser (ms)
+RETRY_MS = 2000
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def format_event(event, data, event_id=None):
+    """Encode one SSE message."""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+class LogFollower:
+    """
+    Returns lines appended to a log file since the last read.
+
+    Only complete lines are returned; a partial last line is left for the next
+    read. Rotation (new inode, or the file shrank) restarts at offset 0.
+
+    Args:
+        path: Log file
+        offset: Byte offset to start from (None = current end of file)
+        max_lag: A reader further behind than this skips ahead
+    """
+
+    def __init__(self, path, offset=None, max_lag=1024 * 1024, chunk_size=LOG_CHUNK_SIZE):
+        self.path = str(path)
+        self.max_lag = max_lag
+        self.chunk_size = chunk_size
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            stat = None
+        self.inode = stat.st_ino if stat else None
+        self.offset = (stat.st_size if stat else 0) if offset is None else offset
+
+    def read(self):
+        """Return (lines, skipped_bytes)."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return [], 0
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            self.inode, self.offset = stat.st_ino, 0
+        if stat.st_size == self.offset:
+            return [], 0
+
+        skipped = 0
+        with open(self.path, 'rb') as f:
+            if stat.st_size - self.offset > self.max_lag:
+                # Too far behind: resume at the first line boundary within max_lag of the end
+                f.seek(stat.st_size - self.max_lag)
+                f.readline()
+                skipped = f.tell() - self.offset
+                self.offset = f.tell()
+            f.seek(self.offset)
+            chunk = f.read(self.chunk_size)
+
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            if len(chunk) < self.chunk_size:
+                return [], skipped  # Partial line still being written
+            end = len(chunk) - 1  # A single line longer than a chunk: emit it in pieces
+        self.offset += end + 1
+        lines = [line.decode('utf-8', errors='replace') for line in chunk[:end + 1].splitlines()]
+        return [line for line in lines if line], skipped
+
+
+class StreamSlots:
+    """Per-process cap on concurrently open event streams."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        """Return a release callable, or None if every slot is taken."""
+        if not self._semaphore.acquire(blocking=False):
+            return None
+        released = threading.Event()
+
+        def release():
+            # Called from both the generator's finally and response.call_on_close
+            if not released.is_set():
+                released.set()
+                self._semaphore.release()
+        return release
+
+
+_stream_slots = {}
+_slots_lock = threading.Lock()
+
+
+def get_stream_slots(limit):
+    with _slots_lock:
+        if limit not in _stream_slots:
+            _stream_slots[limit] = StreamSlots(limit)
+        return _stream_slots[limit]
+
+
+def _job_state(job):
+    return job.status, job.progress, job.message, job.cancel_requested
+
+
+def event_stream(follower=None, job_id=None, watch_jobs=True, poll_interval=1.0, max_seconds=300.0,
+                 release=None):
+    """
+    Generate SSE messages until max_seconds pass (or job_id finishes).
+
+    Must run with an app context (stream_with_context). The session is rolled
+    back after every poll so the stream does not hold a pooled connection.
+    """
+    started = time.monotonic()
+    last_write = started
+    sent = {}
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            messages = []
+
+            if watch_jobs or job_id:
+                query = AdminJob.query
+                if job_id:
+                    query = query.filter(AdminJob.id == job_id)
+                else:
+                    query = query.filter(db.or_(AdminJob.status.in_(ACTIVE_STATUSES), AdminJob.id.in_(list(sent))))
+                try:
+                    jobs = query.all()
+                    for job in jobs:
+                        state = _job_state(job)
+                        if sent.get(job.id) != state:
+                            messages.append(format_event(
+                                'job', job.to_dict(), follower.offset if follower else None))
+                        if job.status in ACTIVE_STATUSES:
+                            sent[job.id] = state
+                        else:
+                            sent.pop(job.id, None)  # Final state sent; stop querying it
+                    watched_job_done = job_id and (not jobs or jobs[0].status not in ACTIVE_STATUSES)
+                finally:
+                    db.session.rollback()
+                if watched_job_done:
+                    if not jobs:
+                        messages.append(format_event('not_found', {'error': 'Job not found'}))
+                    yield ''.join(messages)
+                    return
+
+            if follower is not None:
+                lines, skipped = follower.read()
+                if skipped:
+                    messages.append(format_event('gap', {'skipped_bytes': skipped}, follower.offset))
+                if lines:
+                    messages.append(format_event('log', {'lines': lines}, follower.offset))
+
+            now = time.monotonic()
+            if messages:
+                last_write = now
+                yield ''.join(messages)
+            elif now - last_write >= HEARTBEAT_INTERVAL:
+                last_write = now
+                yield ": keepalive\n\n"
+
+            if now - started >= max_seconds:
+                return
+            time.sleep(poll_interval)
+    finally:
+        if release is not None:
+            release()
@@ -14,9 +14,9 @@ import traceback
 import zipfile
 import io
 from datetime import datetime, timedelta
-from collections import defaultdict
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.exceptions import HTTPException, NotFound
 from flask import Flask, request, jsonify, render_template, abort, url_for, redirect, session, g, send_file, send_from_directory, make_response
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_wtf.csrf import generate_csrf, CSRFError
@@ -35,20 +35,70 @@ env = os.environ.get('FLASK_ENV', 'development')
 from .config import config
 app.config.from_object(config[env])
 
+# Behind nginx, request.remote_addr is the proxy; take the client IP from X-Forwarded-For
+if app.config.get('PROXY_FIX_X_FOR'):
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
 # --- Structured Logging Configuration ---
 # Import and configure structured logging (Phase 1 P5)
 try:
-    from .logging_config import configure_logging
+    from .logging_config import (
+        configure_logging, get_log_queue_stats, ResponseSizeMiddleware, RequestLogSampler,
+        LazyBoundLogger, new_request_id
+    )
     log = configure_logging(app)
+    # Sample routine request logs (health polls, auth subrequests); errors and slow requests always logged
+    request_log_sampler = RequestLogSampler.from_config(app.config)
+    # request_completed is logged once the server has consumed the response body
+    app.wsgi_app = ResponseSizeMiddleware(app.wsgi_app, sampler=request_log_sampler)
 except ImportError:
     # Fallback to standard logging if structlog not installed
     import logging
     log = logging.getLogger(__name__)
     log.warning("structlog not installed, using standard logging")
 
+    def get_log_queue_stats(mark_checked=False):
+        return None
+
+    request_log_sampler = None
+
 # --- Database Initialization ---
+# Instrumented QueuePool: checkout wait, pre-ping time, peak usage (see db_pool.py)
+from .db_pool import configure_pool
+configure_pool(app)
 db.init_app(app)
 
+# --- Metrics ---
+# Per-endpoint latency/status, SQL statement counts and cache hit counters for /metrics
+from .metrics import init_metrics, registry as metrics_registry
+if app.config.get('METRICS_ENABLED', True):
+    init_metrics(app)
+
+# Per-request query count/DB time (logged with request_completed) and slow-query logging
+from .query_stats import init_query_stats, get_request_query_stats
+init_query_stats(app)
+
+# --- Password Hashing ---
+# scrypt runs in a bounded process pool; a saturated pool returns 503 (see passwords.py)
+from .passwords import init_password_hasher, PasswordHasherBusy
+password_hasher = init_password_hasher(app)
+
+# --- Health Monitor ---
+# Component checks refreshed in the background; /health, /health/deep and /ready serve the snapshot
+from .health import init_health_monitor, pool_status
+health_monitor = init_health_monitor(app, db)
+
+# --- Admin Jobs ---
+# Scans, upload extraction and scripts run on a background thread pool (see jobs.py)
+from .jobs import init_job_runner
+job_runner = init_job_runner(app)
+
+# --- Course File Manifests ---
+# /courses/ sends strong ETags from the file hashes stored by course scans (see course_manifest.py)
+from .course_manifest import init_manifest_cache, get_manifest_cache, entry_matches_disk
+init_manifest_cache(app)
+
 # --- CSRF Protection Initialization ---
 from flask_wtf.csrf import CSRFProtect
 csrf = CSRFProtect(app)
@@ -73,68 +123,71 @@ def before_request_logging():
     Initialize logging context before each request.
 
     Actions:
-    1. Generate unique request_id (UUID4)
+    1. Generate a request_id (counter-based in lean mode, UUID4 otherwise)
     2. Store start_time for latency calculation
-    3. Bind request context to logger
-    4. Log request_received event
-
-    Performance: ~0.2ms overhead
+    3. Attach the request context to g.log (bound on first log call in lean mode)
+    4. Decide whether this request is sampled in (LOG_SAMPLE_RATES)
+    5. Log request_received event if sampled in; user lookup is skipped for
+       LOG_SKIP_USER_LOOKUP_PATHS
+
+    Performance (scripts/bench_request_context.py): ~7us for a request that
+    logs nothing in lean mode, ~17us with LOG_LEAN_CONTEXT=false. A sampled-in
+    request also pays for the request_received write itself.
     """
-    # Generate unique request ID for tracing
-    request_id = str(uuid.uuid4())
-    g.request_id = request_id
-    g.start_time = time.time()
+    lean = app.config.get('LOG_LEAN_CONTEXT', True)
+    # Resolve the context-local proxies once; each attribute access through them costs a lookup
+    req = request._get_current_object()
+    ctx_g = g._get_current_object()
 
-    # Bind request context to logger
-    g.log = log.bind(
+    # Generate request ID for tracing
+    request_id = new_request_id() if lean else str(uuid.uuid4())
+    ctx_g.start_time = time.time()
+
+    context = dict(
         request_id=request_id,
-        method=request.method,
-        path=request.path,
-        ip=request.remote_addr,
-        user_agent=request.headers.get('User-Agent', 'Unknown')[:100]  # Truncate long user agents
+        method=req.method,
+        path=req.path,
+        ip=req.remote_addr,
+        user_agent=req.headers.get('User-Agent', 'Unknown')[:100]  # Truncate long user agents
     )
+    ctx_g.log = LazyBoundLogger(log, context) if lean else log.bind(**context)
+
+    ctx_g.log_sampled = request_log_sampler is None or request_log_sampler.sample_request(req.path)
+    if not ctx_g.log_sampled:
+        request_log_sampler.record_dropped('request_received')
+        return
+
+    # current_user triggers load_user (a query); skip it where the user is irrelevant
+    if lean and req.path.startswith(app.config.get('LOG_SKIP_USER_LOOKUP_PATHS', ())):
+        user_id = None
+    else:
+        user_id = current_user.id if current_user.is_authenticated else None
 
     # Log request received
-    g.log.info(
-        "request_received",
-        user_id=current_user.id if current_user.is_authenticated else None
-    )
+    g.log.info("request_received", user_id=user_id)
 
 @app.after_request
 def after_request_logging(response):
     """
-    Log request completion metrics after each request.
+    Hand request completion logging to ResponseSizeMiddleware.
 
     Actions:
-    1. Calculate request latency
-    2. Log request_completed event with status code
-    3. Include performance metrics
-
-    Performance: ~0.3ms overhead
+    1. Stash the bound logger (with the request's SQL query count and DB
+       time), status code, start time and sampling decision in the WSGI environ
+    2. ResponseSizeMiddleware logs request_completed with latency and the
+       bytes actually sent once the server closes the response (sampled-out
+       requests only if they errored or were slow)
+
+    The body is never materialized here, so large and streamed responses
+    are not buffered just to measure them.
     """
     if hasattr(g, 'log') and hasattr(g, 'start_time'):
-        latency_ms = (time.time() - g.start_time) * 1000
-
-        # Calculate response size safely
-        # For file responses in passthrough mode, use Content-Length header
-        # For regular responses, use get_data() if available
-        response_size = 0
-        try:
-            if hasattr(response, 'is_streamed') and response.is_streamed:
-                # Streamed/file responses: use Content-Length header
-                response_size = int(response.headers.get('Content-Length', 0))
-            else:
-                # Regular responses: buffer and measure
-                response_size = len(response.get_data())
-        except (RuntimeError, ValueError):
-            # Fallback: use Content-Length header
-            response_size = int(response.headers.get('Content-Length', 0))
-
-        g.log.info(
-            "request_completed",
-            status=response.status_code,
-            latency_ms=round(latency_ms, 2),
-            response_size_bytes=response_size
+        request_log = g.log
+        query_stats = get_request_query_stats()
+        if query_stats is not None:
+            request_log = request_log.bind(db_queries=query_stats.count, db_time_ms=query_stats.duration_ms)
+        request.environ['gleh.request_log'] = (
+            request_log, response.status_code, g.start_time, g.get('log_sampled', True)
         )
 
     return response
@@ -152,6 +205,15 @@ def handle_csrf_error(e):
         )
     return jsonify({'error': str(e.description)}), 400
 
+@app.errorhandler(PasswordHasherBusy)
+def handle_password_hasher_busy(e):
+    """Login/registration burst beyond the hashing pool's queue: ask the client to retry."""
+    if hasattr(g, 'log'):
+        g.log.warning("password_hashing_busy", error_message=str(e))
+    response = jsonify({'error': 'Server is busy, please try again in a moment.'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.errorhandler(Exception)
 def handle_exception_logging(e):
     """
@@ -159,6 +221,11 @@ def handle_exception_logging(e):
 
     Logs all unhandled exceptions with full traceback for debugging.
     """
+    # HTTP errors (abort(404), ...) are responses, not failures; re-raising them from
+    # this handler would turn them into 500s
+    if isinstance(e, HTTPException):
+        return e
+
     if hasattr(g, 'log'):
         g.log.error(
             "error_occurred",
@@ -215,39 +282,31 @@ def validate_password(password):
 
 # --- Security: Rate Limiting ---
 
-# Simple in-memory rate limiting (IP -> list of timestamps)
-auth_attempts = defaultdict(list)
+# Token-bucket rate limiting with pluggable storage (see rate_limit.py)
+from .rate_limit import create_rate_limiter, rate_limit
+rate_limiter = create_rate_limiter(app, db)
 
 def check_rate_limit(ip_address):
     """
     Check if IP has exceeded rate limit for auth endpoints.
     Returns (is_allowed, error_message)
     """
-    now = datetime.utcnow()
-    cutoff = now - timedelta(minutes=1)
-
-    # Clean old attempts
-    auth_attempts[ip_address] = [
-        timestamp for timestamp in auth_attempts[ip_address]
-        if timestamp > cutoff
-    ]
+    limit = app.config['AUTH_RATE_LIMIT']
+    result = rate_limiter.hit(f'auth:{ip_address}', limit, 60)
 
-    # Check limit
-    if len(auth_attempts[ip_address]) >= app.config['AUTH_RATE_LIMIT']:
+    if not result.allowed:
         # Log rate limit exceeded
         if hasattr(g, 'log'):
             g.log.warning(
                 "rate_limit_exceeded",
                 ip=ip_address,
                 endpoint=request.path,
-                limit=app.config['AUTH_RATE_LIMIT'],
+                limit=limit,
                 period_seconds=60,
-                attempt_count=len(auth_attempts[ip_address])
+                retry_after_seconds=round(result.retry_after, 1)
             )
         return False, "Too many attempts. Please try again in a minute."
 
-    # Record this attempt
-    auth_attempts[ip_address].append(now)
     return True, None
 
 # --- CSRF Token Endpoint ---
@@ -296,30 +355,69 @@ def get_layout_css():
 
 # --- Health Check Endpoints ---
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text-format metrics, merged across worker processes.
+
+    Scraped on the internal network (app:5000/metrics); nginx denies it externally.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/health', methods=['GET'])
 def health():
     """
     Lightweight health check for load balancers and orchestrators.
     Returns 200 if application is responding, 503 if unhealthy.
 
+    Serves the health monitor's cached snapshot (see health.py), so frequent
+    probes never touch the database. age_seconds is the snapshot's age.
+
     Used by: AWS ELB, nginx, Kubernetes liveness probes.
-    Response time: Expected <10ms under normal load.
+    Response time: Expected <1ms (no I/O).
     SLA: Must respond in <2 seconds.
     """
-    try:
-        # Test database connectivity with timeout protection
-        db.session.execute(db.text('SELECT 1'))
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.utcnow().isoformat()
-        }), 200
-    except Exception as e:
-        app.logger.error(f"Health check failed: {str(e)}")
-        return jsonify({
-            'status': 'unhealthy',
-            'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        }), 503
+    snapshot = health_monitor.snapshot()
+    body = {
+        'status': snapshot['status'],
+        'timestamp': snapshot['timestamp'],
+        'age_seconds': snapshot['age_seconds'],
+    }
+    if snapshot['status'] == 'unhealthy':
+        body['error'] = snapshot.get('error') or ', '.join(
+            f"{name}: {component.get('error', component['status'])}"
+            for name, component in snapshot['components'].items()
+            if component['status'] == 'unhealthy'
+        )
+        return jsonify(body), 503
+    return jsonify(body), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 503 while the app should not receive new traffic.
+
+    Not ready when a critical component is unhealthy in the cached snapshot or
+    the connection pool is close to exhaustion (read live; it costs no I/O).
+    """
+    snapshot = health_monitor.snapshot()
+    reasons = [f"{name} {component['status']}" for name, component in snapshot['components'].items()
+               if component['status'] == 'unhealthy']
+    if snapshot.get('error'):
+        reasons.append(snapshot['error'])
+
+    pool = pool_status(db.engine)
+    threshold = app.config.get('HEALTH_POOL_SATURATION_THRESHOLD', 0.9)
+    if pool and pool['saturation'] is not None and pool['saturation'] >= threshold:
+        reasons.append(f"connection pool {pool['saturation']:.0%} checked out")
+
+    body = {'status': 'not_ready' if reasons else 'ready', 'pool': pool}
+    if reasons:
+        body['reasons'] = reasons
+        return jsonify(body), 503
+    return jsonify(body), 200
 
 @app.route('/health/deep', methods=['GET'])
 def health_deep():
@@ -327,30 +425,23 @@ def health_deep():
     Detailed health check with component diagnostics.
     For monitoring dashboards and SRE analysis (AHDM integration).
 
+    Database, storage, Calibre-Web and pool results come from the health
+    monitor's cached snapshot; in-process components are read live.
+
     Used by: Monitoring dashboards, AHDM predictive analysis, SRE alerting.
-    Response time: Expected <50ms under normal load.
+    Response time: Expected <5ms (no I/O).
     SLA: Must respond in <5 seconds.
     """
+    snapshot = health_monitor.snapshot()
     checks = {
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'components': {}
+        'status': snapshot['status'],
+        'timestamp': snapshot['timestamp'],
+        'age_seconds': snapshot['age_seconds'],
+        # Component 1: Database, storage, Calibre-Web and connection pool (cached)
+        'components': dict(snapshot['components'])
     }
-
-    # Component 1: Database connectivity
-    try:
-        db.session.execute(db.text('SELECT 1'))
-        checks['components']['database'] = {
-            'status': 'healthy',
-            'message': 'Database connection verified'
-        }
-    except Exception as e:
-        app.logger.error(f"Database health check failed: {str(e)}")
-        checks['components']['database'] = {
-            'status': 'unhealthy',
-            'error': str(e)
-        }
-        checks['status'] = 'unhealthy'
+    if snapshot.get('error'):
+        checks['error'] = snapshot['error']
 
     # Component 2: Flask-Login (authentication system)
     try:
@@ -383,8 +474,31 @@ def health_deep():
         }
         checks['status'] = 'unhealthy'
 
-    # Return appropriate status code
-    status_code = 200 if checks['status'] == 'healthy' else 503
+    # Component 4: Logging pipeline (queue-backed mode only)
+    # Degraded only if records were dropped since the previous deep check
+    log_stats = get_log_queue_stats(mark_checked=True)
+    if log_stats is not None:
+        checks['components']['logging'] = {
+            'status': 'healthy' if log_stats['dropped_since_last_check'] == 0 else 'degraded',
+            **log_stats
+        }
+
+    # Component 5: Password hashing pool (degraded if requests were turned away)
+    hasher_stats = password_hasher.get_stats()
+    checks['components']['password_hashing'] = {
+        'status': 'healthy' if hasher_stats['rejected'] == 0 else 'degraded',
+        **hasher_stats
+    }
+
+    # Component 6: Request log sampling counters (informational)
+    if request_log_sampler is not None:
+        checks['components']['log_sampling'] = {
+            'status': 'healthy',
+            **request_log_sampler.get_stats()
+        }
+
+    # Return appropriate status code (degraded: a non-critical component such as Calibre-Web is down)
+    status_code = 503 if checks['status'] == 'unhealthy' else 200
     return jsonify(checks), status_code
 
 # --- Front-end Rendering ---
@@ -488,7 +602,15 @@ def proxy_calibre_cover(book_id):
 
 @app.route('/courses/<path:filepath>')
 def serve_course_files(filepath):
-    """Serves course files from the courses directory."""
+    """
+    Serves course files from the courses directory.
+
+    Files listed in their course's manifest (see course_manifest.py) whose
+    size and mtime still match the disk carry their stored sha256 as a strong
+    ETag, and revalidations are answered 304 after a single stat, without
+    opening the file. Anything else (unlisted, changed since the last scan,
+    or a course without a manifest) is served from disk as before.
+    """
     from flask import send_from_directory
     import os
     # In Docker: serve from /app/data/courses (volume mount)
@@ -501,6 +623,19 @@ def serve_course_files(filepath):
         # Docker mode: use hardcoded volume path
         courses_dir = '/app/data/courses'
 
+    uid, _, relative = filepath.partition('/')
+    if uid.startswith('.'):
+        abort(404)  # Upload parts, content store, extraction staging
+
+    manifest = get_manifest_cache().get(uid)
+    entry = manifest.get(relative) if manifest is not None else None
+    if entry is not None and entry_matches_disk(entry, safe_join(courses_dir, filepath)):
+        if request.if_none_match.contains(entry.sha256):
+            response = make_response('', 304)
+            response.set_etag(entry.sha256)
+            return response
+        return send_from_directory(courses_dir, filepath, mimetype=entry.mime, etag=entry.sha256)
+
     if not os.path.exists(courses_dir):
         log.error(f'Courses directory does not exist: {courses_dir}')
         abort(404)
@@ -522,6 +657,7 @@ app.register_blueprint(admin_bp)
 # --- Main Content API ---
 
 @app.route('/api/content')
+@rate_limit('content')
 def get_content():
     all_courses = Course.query.all()
     content_list = []
@@ -690,6 +826,13 @@ def login():
 
     user = User.query.filter_by(username=data['username']).first()
     if user and user.check_password(data['password']):
+        # Upgrade hashes made with older PASSWORD_HASH_METHOD parameters while we have the password
+        if user.password_needs_rehash():
+            user.set_password(data['password'])
+            db.session.commit()
+            if hasattr(g, 'log'):
+                g.log.info("password_rehashed", user_id=user.id)
+
         login_user(user, remember=True)
         from flask import session
         session.permanent = True
@@ -762,6 +905,7 @@ def profile():
 
 @app.route('/api/profile', methods=['GET'])
 @login_required
+@rate_limit('profile')
 def get_profile():
     """Get user profile data with eager-loaded relationships to prevent N+1 queries"""
     # Get user's course progress - relationships are auto-joined via lazy='joined'
@@ -870,6 +1014,7 @@ def get_profile():
 
 @app.route('/api/profile', methods=['POST'])
 @login_required
+@rate_limit('profile')
 def update_profile():
     """Update user profile"""
     data = request.get_json()
@@ -25,56 +25,7 @@ from PIL import Image, ImageDraw, ImageFont
 from .app import app
 from .database import db
 from .models import Course, Ebook
-
-# --- Global Category Patterns ---
-CATEGORY_PATTERNS = {
-    'Python': re.compile(r'[Pp]ython', re.IGNORECASE),
-    'Java': re.compile(r'[Jj]ava', re.IGNORECASE),
-    'C++': re.compile(r'C\+\+', re.IGNORECASE),
-    'JavaScript': re.compile(r'[Jj]avascript|JS', re.IGNORECASE),
-    'DevOps': re.compile(r'DevOps|Docker|Ansible|Argo|Kubernetes|GitLab', re.IGNORECASE),
-    'Data Structures': re.compile(r'Data Structures|Algorithms|LeetCode', re.IGNORECASE),
-    'Rust': re.compile(r'Rust', re.IGNORECASE),
-    'Linux': re.compile(r'Linux', re.IGNORECASE),
-    'AI': re.compile(r'AI|Artificial Intelligence|Machine Learning', re.IGNORECASE),
-}
-
-def categories_from_name(name):
-    """Derives categories from a name using regex matching."""
-    found_categories = []
-    for category, pattern in CATEGORY_PATTERNS.items():
-        if pattern.search(name):
-            found_categories.append(category)
-    return list(set(found_categories))
-
-def parse_course_metadata(html_path, course_dir, course_name_for_categories):
-    """Parses metadata for a course."""
-    metadata = {
-        'title': os.path.basename(course_dir).replace('_', ' ').replace('-', ' ').title(),
-        'path': html_path.replace('\\', '/'),
-        'description': '',
-        'categories': [],
-        'intro_video_path': None
-    }
-    try:
-        with open(html_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f, 'html.parser')
-    except Exception:
-        return metadata
-
-    if title_tag := soup.select_one('div.intro h1'):
-        metadata['title'] = title_tag.get_text(strip=True)
-
-    if first_section := soup.select_one('#content-main > ul > li'):
-        if desc_tag := first_section.find('p'):
-            metadata['description'] = desc_tag.get_text(strip=True)
-
-    if first_video_tag := soup.select_one('div.chapter .watch[data-video]'):
-        relative_video_path = first_video_tag['data-video']
-        metadata['intro_video_path'] = os.path.join(course_dir, relative_video_path)
-
-    metadata['categories'] = categories_from_name(course_name_for_categories)
-    return metadata
+from .course_indexer import extract_batch, list_course_folders, save_records
 
 def generate_thumbnail(course_dir, metadata_dict):
     """Generates a thumbnail only if it doesn't already exist."""
@@ -429,28 +380,20 @@ def main():
         # Create tables if they don't exist
         db.create_all()
         # --- Process Courses ---
+        # Metadata comes from course_indexer.extract(), the same parser the admin
+        # scan uses; packaged courses keep their md5 uids and ffmpeg thumbnails
         if os.path.isdir(COURSES_DIR):
-            for course_name in os.listdir(COURSES_DIR):
-                course_dir = os.path.join(COURSES_DIR, course_name)
-                if os.path.isdir(course_dir):
-                    package_dir = os.path.join(course_dir, 'package')
-                    course_html_path = os.path.join(package_dir, 'index.html')
-                    if os.path.isfile(course_html_path):
-                        uid = hashlib.md5(course_name.encode()).hexdigest()
-                        metadata = parse_course_metadata(course_html_path, package_dir, course_name)
-                        metadata['uid'] = uid
-                        generate_thumbnail(package_dir, metadata)
-
-                        course = Course.query.filter_by(uid=uid).first()
-                        if course is None:
-                            course = Course(uid=uid)
-                            db.session.add(course)
-
-                        course.title = metadata['title']
-                        course.path = metadata['path']
-                        course.description = metadata['description']
-                        course.categories = ','.join(metadata['categories'])
-                        course.thumbnail = metadata['thumbnail']
+            course_names = [name for name in list_course_folders(COURSES_DIR)
+                            if os.path.isfile(os.path.join(COURSES_DIR, name, 'package', 'index.html'))]
+            records = extract_batch([os.path.join(COURSES_DIR, name) for name in course_names],
+                                    workers=app.config.get('COURSE_SCAN_WORKERS', 8))
+            for course_name, record in zip(course_names, records):
+                metadata = {'uid': hashlib.md5(course_name.encode()).hexdigest(),
+                            'intro_video_path': record.intro_video}
+                generate_thumbnail(os.path.join(COURSES_DIR, course_name, 'package'), metadata)
+                record.uid = metadata['uid']
+                record.thumbnail = metadata['thumbnail']
+            save_records(records)
 
         # --- Process E-books ---
         # REMOVED: Migrated to Calibre-Web for ebook management
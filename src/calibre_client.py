@@ -13,8 +13,11 @@ import requests
 import logging
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Optional
+from urllib.parse import urlparse
 from flask import current_app
 
+from .metrics import calibre_request_duration_seconds
+
 logger = logging.getLogger(__name__)
 
 # OPDS/Atom namespace
@@ -63,12 +66,23 @@ class CalibreWebClient:
         self.session.headers.update({
             'User-Agent': 'GLEH/1.0 Calibre-Web OPDS Client'
         })
+        # Upstream latency per OPDS operation (exposed at /metrics)
+        self.session.hooks['response'].append(self._record_latency)
 
         # Set up basic authentication if credentials are provided
         if self.username and self.password:
             self.session.auth = (self.username, self.password)
             logger.info(f"Calibre-Web authentication configured for user: {self.username}")
 
+    def _record_latency(self, response, *args, **kwargs):
+        """requests response hook: observe time-to-headers for this call."""
+        base_path = urlparse(self.base_url).path
+        path = urlparse(response.url).path[len(base_path):].strip('/')
+        operation = '/'.join('id' if part.isdigit() else part for part in path.split('/')[:2]) or 'root'
+        calibre_request_duration_seconds.observe(
+            response.elapsed.total_seconds(), operation=operation, status=response.status_code
+        )
+
     def _get_base_url(self) -> Optional[str]:
         """Get Calibre-Web base URL from environment or Flask config."""
         # Try Flask config first (if in app context)
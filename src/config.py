@@ -19,27 +19,150 @@ class Config:
     # pool_recycle: Recycle connections after 1 hour (prevents database-side timeouts)
     # pool_size: Number of persistent connections to maintain in the pool
     # max_overflow: Maximum overflow connections when pool is exhausted
+    # pool_timeout: Seconds a request waits for a connection before failing
+    # Per process; /health/deep reports observed peak usage and a recommended size
     SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,      # CRITICAL: Prevents stale connection failures in health checks
-        'pool_recycle': 3600,       # Recycle connections after 1 hour (matches typical DB connection timeout)
-        'pool_size': 10,            # Maintain 10 persistent connections
-        'max_overflow': 20,         # Allow up to 20 additional connections during spikes
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '3600')),
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', '30')),
     }
 
+    # Request threads per server process (see server.py); used for pool sizing recommendations
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '4'))
+
+    # Logging
+    # LOG_ASYNC: write logs from a background thread; request threads only enqueue
+    # LOG_QUEUE_SIZE: buffered records before new records are dropped (and counted)
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'false').lower() == 'true'
+    # LOG_DIR: where app.log is written and read by the admin log viewer (default: src/logs)
+    LOG_DIR = os.environ.get('LOG_DIR')
+    # LOG_INDEX_ENABLED: maintain an SQLite request_id/user_id -> offset index beside app.log
+    LOG_INDEX_ENABLED = os.environ.get('LOG_INDEX_ENABLED', 'false').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+
+    # Lean request context: short counter-based request ids, logger context bound only when
+    # something is logged, and no user lookup for the paths below. False restores uuid4 + eager bind.
+    LOG_LEAN_CONTEXT = os.environ.get('LOG_LEAN_CONTEXT', 'true').lower() == 'true'
+    LOG_SKIP_USER_LOOKUP_PATHS = ('/static/', '/health', '/metrics', '/avatars/')
+
+    # Request log sampling (request_received / request_completed only)
+    # LOG_SAMPLE_RATES: '<path prefix>=<rate>' pairs; unlisted paths are always logged
+    # LOG_SAMPLE_BUDGET_PER_SECOND: max sampled-in requests logged per second (0 = unlimited)
+    # Responses >= LOG_SAMPLE_ERROR_STATUS or slower than LOG_SLOW_REQUEST_MS are always logged
+    LOG_SAMPLE_RATES = os.environ.get('LOG_SAMPLE_RATES', '/health=0.01,/auth/check=0.05')
+    LOG_SAMPLE_BUDGET_PER_SECOND = int(os.environ.get('LOG_SAMPLE_BUDGET_PER_SECOND', '200'))
+    LOG_SLOW_REQUEST_MS = int(os.environ.get('LOG_SLOW_REQUEST_MS', '1000'))
+    LOG_SAMPLE_ERROR_STATUS = int(os.environ.get('LOG_SAMPLE_ERROR_STATUS', '500'))
+
+    # Log SQL statements slower than this (ms) with parameters redacted; 0 disables
+    DB_SLOW_QUERY_MS = int(os.environ.get('DB_SLOW_QUERY_MS', '500'))
+
+    # Metrics (/metrics, Prometheus text format)
+    # METRICS_MULTIPROC_DIR: shared directory for per-worker snapshots when running several processes
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+
+    # Health monitor (/health, /health/deep, /ready serve a cached snapshot)
+    # HEALTH_CHECK_INTERVAL: seconds between background refreshes (snapshot is unhealthy after 3 intervals)
+    # HEALTH_POOL_SATURATION_THRESHOLD: checked-out fraction of pool capacity that fails /ready
+    HEALTH_MONITOR_ENABLED = os.environ.get('HEALTH_MONITOR_ENABLED', 'true').lower() == 'true'
+    HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', '10'))
+    HEALTH_POOL_SATURATION_THRESHOLD = float(os.environ.get('HEALTH_POOL_SATURATION_THRESHOLD', '0.9'))
+
     # Application
     APP_NAME = 'Gammons Landing Educational Hub'
 
+    # Password hashing (see passwords.py)
+    # PASSWORD_HASH_METHOD: werkzeug method, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000';
+    #   existing hashes with other parameters are rehashed on the user's next login
+    # PASSWORD_HASH_WORKERS: hashing processes (0 = hash on the request thread)
+    # PASSWORD_HASH_MAX_QUEUE: hashes waiting for a process before requests get 503; admitted hashes
+    #   (WORKERS + MAX_QUEUE) are also capped at SERVER_THREADS - 1 so a login burst never holds every thread
+    # PASSWORD_HASH_TIMEOUT: seconds a request waits for its hash (a scrypt hash takes ~50ms)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '1'))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '2'))
+
+    # Threads that stat course folders and parse data.json during a scan (I/O bound on network mounts)
+    COURSE_SCAN_WORKERS = int(os.environ.get('COURSE_SCAN_WORKERS', '8'))
+
+    # Admin jobs (see jobs.py): threads per process running scans, extraction and scripts
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+    JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', '0.5'))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '30'))
+
+    # Admin panel event stream (/api/admin/events); every open stream holds a server thread
+    ADMIN_EVENTS_MAX_STREAMS = int(os.environ.get('ADMIN_EVENTS_MAX_STREAMS', '2'))
+    ADMIN_EVENTS_MAX_SECONDS = float(os.environ.get('ADMIN_EVENTS_MAX_SECONDS', '300'))
+    ADMIN_EVENTS_POLL_INTERVAL = float(os.environ.get('ADMIN_EVENTS_POLL_INTERVAL', '1'))
+    ADMIN_EVENTS_MAX_LAG_BYTES = int(os.environ.get('ADMIN_EVENTS_MAX_LAG_BYTES', str(1024 * 1024)))
+
+    # Max users per /api/admin/users/bulk request
+    BULK_USER_MAX_ROWS = int(os.environ.get('BULK_USER_MAX_ROWS', '1000'))
+
     # Auth settings
     MIN_USERNAME_LENGTH = 3
     MAX_USERNAME_LENGTH = 64
     MIN_PASSWORD_LENGTH = 8
 
+    # Number of trusted reverse proxies in front of the app (nginx in docker = 1)
+    # Rate limits key anonymous clients on request.remote_addr; without this it is the proxy's IP
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', '0'))
+
     # Rate limiting (requests per minute)
     AUTH_RATE_LIMIT = 5  # 5 login/register attempts per minute per IP
 
+    # Rate limit storage backend
+    # memory: per-process token buckets (single worker)
+    # database: shared rate_limit_bucket table (required for multiple workers);
+    #   row locks on PostgreSQL, on SQLite every check takes the database write lock
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))  # LRU bound for memory backend
+    RATE_LIMIT_IDLE_TTL = int(os.environ.get('RATE_LIMIT_IDLE_TTL', '3600'))  # Purge idle DB buckets after 1 hour
+    # Database backend errors: true = allow the request (fail open), false = reject it (fail closed)
+    RATE_LIMIT_FAIL_OPEN = os.environ.get('RATE_LIMIT_FAIL_OPEN', 'true').lower() == 'true'
+
+    # Per-route limits applied by the @rate_limit decorator
+    # Keyed by user id when logged in, IP otherwise (format: '<count>/<second|minute|hour|day>')
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMITS = {
+        'content': os.environ.get('RATE_LIMIT_CONTENT', '120/minute'),
+        'profile': os.environ.get('RATE_LIMIT_PROFILE', '60/minute'),
+        'admin_scan': os.environ.get('RATE_LIMIT_ADMIN_SCAN', '6/minute'),
+        'admin_upload': os.environ.get('RATE_LIMIT_ADMIN_UPLOAD', '20/hour'),
+    }
+
     # File upload settings
     MAX_UPLOAD_SIZE = 5 * 1024 * 1024  # 5MB max file size
 
+    # Resumable course uploads (/api/admin/uploads): bytes per PUT (keep below nginx client_max_body_size),
+    # largest accepted course file, and hours before an upload that stopped receiving chunks is discarded
+    COURSE_UPLOAD_CHUNK_SIZE = int(os.environ.get('COURSE_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    COURSE_UPLOAD_MAX_BYTES = int(os.environ.get('COURSE_UPLOAD_MAX_BYTES', str(50 * 1024 ** 3)))
+    COURSE_UPLOAD_RETENTION_HOURS = int(os.environ.get('COURSE_UPLOAD_RETENTION_HOURS', '24'))
+
+    # Uploaded course zips are rejected before extraction beyond these limits (ratio: any member over 1 MiB
+    # expanding more than this many times its compressed size); large members extract on EXTRACT_WORKERS threads
+    COURSE_EXTRACT_MAX_BYTES = int(os.environ.get('COURSE_EXTRACT_MAX_BYTES', str(20 * 1024 ** 3)))
+    COURSE_EXTRACT_MAX_FILES = int(os.environ.get('COURSE_EXTRACT_MAX_FILES', '100000'))
+    COURSE_EXTRACT_MAX_RATIO = int(os.environ.get('COURSE_EXTRACT_MAX_RATIO', '100'))
+    COURSE_EXTRACT_WORKERS = int(os.environ.get('COURSE_EXTRACT_WORKERS', '4'))
+
+    # Identical course files (shared CSS/JS, fonts, logos) become hardlinks to one copy in <courses>/.store;
+    # when enabled, uploads are deduplicated as they are extracted. Smaller files are left alone
+    COURSE_DEDUPE_ENABLED = os.environ.get('COURSE_DEDUPE_ENABLED', 'false').lower() == 'true'
+    COURSE_DEDUPE_MIN_BYTES = int(os.environ.get('COURSE_DEDUPE_MIN_BYTES', '4096'))
+
+    # Scans store each course's file list with sha256 hashes; /courses/ sends strong ETags from it.
+    # The first scan with manifests enabled hashes every course file once
+    COURSE_MANIFESTS_ENABLED = os.environ.get('COURSE_MANIFESTS_ENABLED', 'true').lower() == 'true'
+    COURSE_MANIFEST_CACHE_TTL = int(os.environ.get('COURSE_MANIFEST_CACHE_TTL', '60'))
+    COURSE_MANIFEST_CACHE_SIZE = int(os.environ.get('COURSE_MANIFEST_CACHE_SIZE', '64'))
+
     # Content directory settings (DEPRECATED - kept for backwards compatibility)
     # CONTENT_DIR: Base directory containing 'courses' and 'ebooks' folders
     # Can be set via CONTENT_DIR environment variable for flexibility
@@ -0,0 +1,245 @@
+"""
+Guarded extraction of uploaded course archives.
+
+extract_archive() unpacks a course zip into a temporary directory next to the
+destination and renames it into place once every member is on disk, so the
+course folder either appears complete or not at all (a scan running
+meanwhile never sees half a course).
+
+Before anything is written the central directory is checked against
+ExtractionLimits: member count, total uncompressed bytes, per-member
+compression ratio (zip bombs), and unsafe names (absolute paths, '..',
+symlinks). Declared sizes are also enforced while streaming, since a crafted
+archive can lie about them.
+
+Members are streamed to disk in COPY_BLOCK pieces. Small members are written
+on the calling thread; members of LARGE_MEMBER bytes or more (videos) go to a
+thread pool, each thread with its own ZipFile handle. zlib releases the GIL
+while inflating, so large members decompress in parallel.
+
+Given a course_dedupe.ContentStore, members are hashed while they stream and
+hardlinked into the store as soon as they are written, so a new course shares
+the assets it has in common with the courses already on the volume.
+
+    limits = ExtractionLimits.from_config(current_app.config)
+    extract_archive('/app/data/courses/new.zip', '/app/data/courses/new', limits, progress=report)
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Bytes per read/write while streaming a member
+COPY_BLOCK = 1024 * 1024
+# Members at least this large are extracted on the thread pool
+LARGE_MEMBER = 8 * 1024 * 1024
+# Compression ratio is only checked for members at least this large (tiny files compress absurdly well)
+RATIO_MIN_BYTES = 1024 * 1024
+# Staging directories next to the destination; ones left by a killed process are swept by expire_uploads()
+STAGING_PREFIX = '.extract-'
+
+
+class ArchiveRejected(Exception):
+    """The archive is unsafe or exceeds the extraction limits; nothing was extracted."""
+
+
+class ExtractionLimits:
+    """Limits applied to an uploaded archive."""
+
+    __slots__ = ('max_bytes', 'max_files', 'max_ratio', 'workers')
+
+    def __init__(self, max_bytes=20 * 1024 ** 3, max_files=100_000, max_ratio=100, workers=4):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_ratio = max_ratio
+        self.workers = workers
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Config:
+            COURSE_EXTRACT_MAX_BYTES: Total uncompressed size
+            COURSE_EXTRACT_MAX_FILES: Number of members
+            COURSE_EXTRACT_MAX_RATIO: Uncompressed/compressed size of any member over 1 MiB
+            COURSE_EXTRACT_WORKERS: Threads extracting large members
+        """
+        return cls(
+            max_bytes=config.get('COURSE_EXTRACT_MAX_BYTES', 20 * 1024 ** 3),
+            max_files=config.get('COURSE_EXTRACT_MAX_FILES', 100_000),
+            max_ratio=config.get('COURSE_EXTRACT_MAX_RATIO', 100),
+            workers=config.get('COURSE_EXTRACT_WORKERS', 4),
+        )
+
+
+def _safe_name(name):
+    """Relative path of a member inside the destination, or None if it would escape it."""
+    name = name.replace('\\', '/')
+    if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+        return None
+    parts = [part for part in name.split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(*parts)
+
+
+def check_archive(zf, limits):
+    """
+    Validate an archive's central directory.
+
+    Returns:
+        [(ZipInfo, relative path)] for the file members, in archive order
+
+    Raises:
+        ArchiveRejected
+    """
+    infos = zf.infolist()
+    if len(infos) > limits.max_files:
+        raise ArchiveRejected(f'Archive has {len(infos)} entries (limit {limits.max_files})')
+
+    members = []
+    total = 0
+    for info in infos:
+        if info.is_dir():
+            continue
+        relative = _safe_name(info.filename)
+        if relative is None:
+            raise ArchiveRejected(f'Unsafe path in archive: {info.filename}')
+        if stat.S_ISLNK(info.external_attr >> 16):
+            raise ArchiveRejected(f'Symbolic links are not allowed: {info.filename}')
+        if info.file_size >= RATIO_MIN_BYTES and info.file_size > limits.max_ratio * max(info.compress_size, 1):
+            raise ArchiveRejected(f'{info.filename} expands more than {limits.max_ratio}x')
+        total += info.file_size
+        if total > limits.max_bytes:
+            raise ArchiveRejected(f'Archive expands to more than {limits.max_bytes} bytes')
+        members.append((info, relative))
+    return members
+
+
+def _copy_member(source, info, target, store=None):
+    """
+    Stream one member to target, refusing to write more than its declared size.
+
+    Returns:
+        (bytes written, bytes saved by linking target into store)
+    """
+    written = 0
+    digest = hashlib.sha256() if store is not None and info.file_size >= store.min_size else None
+    with source.open(info) as src, open(target, 'wb') as dst:
+        while block := src.read(COPY_BLOCK):
+            written += len(block)
+            if written > info.file_size:
+                raise ArchiveRejected(f'{info.filename} is larger than its declared size')
+            dst.write(block)
+            if digest is not None:
+                digest.update(block)
+    if digest is None:
+        return written, 0
+    return written, store.link(target, digest.hexdigest(), written)
+
+
+def extract_archive(zip_path, dest_dir, limits=None, progress=None, store=None):
+    """
+    Extract zip_path into dest_dir atomically.
+
+    Args:
+        limits: ExtractionLimits (defaults if None)
+        progress: Optional callable(done, total) on the calling thread after each
+            member; raising from it aborts and removes the partial extraction
+        store: Optional course_dedupe.ContentStore on the same filesystem as dest_dir
+
+    Returns:
+        {'files': members written, 'bytes': uncompressed bytes}, plus
+        'bytes_saved' (bytes shared with the store) when store is given
+
+    Raises:
+        ArchiveRejected, zipfile.BadZipFile
+    """
+    limits = limits or ExtractionLimits()
+    parent = os.path.dirname(os.path.abspath(dest_dir))
+    staging = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=parent)
+    os.chmod(staging, 0o755)  # mkdtemp creates 0700; nginx must be able to read the course
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+
+    def worker_zip():
+        # ZipFile handles share one file position; give each thread its own
+        if not hasattr(local, 'zf'):
+            local.zf = zipfile.ZipFile(zip_path)
+            with lock:
+                opened.append(local.zf)
+        return local.zf
+
+    executor = None
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            members = check_archive(zf, limits)
+            for directory in {os.path.dirname(relative) for _, relative in members}:
+                os.makedirs(os.path.join(staging, directory), exist_ok=True)
+
+            total_bytes = 0
+            saved_bytes = 0
+            done = 0
+            pending = set()
+            if limits.workers > 1 and any(info.file_size >= LARGE_MEMBER for info, _ in members):
+                executor = ThreadPoolExecutor(max_workers=limits.workers, thread_name_prefix='course-extract')
+
+            def finish(futures):
+                nonlocal total_bytes, saved_bytes, done
+                for future in futures:
+                    written, saved = future.result()
+                    total_bytes += written
+                    saved_bytes += saved
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(members))
+
+            for info, relative in members:
+                target = os.path.join(staging, relative)
+                if executor is not None and info.file_size >= LARGE_MEMBER:
+                    pending.add(executor.submit(lambda i=info, t=target: _copy_member(worker_zip(), i, t, store)))
+                else:
+                    written, saved = _copy_member(zf, info, target, store)
+                    total_bytes += written
+                    saved_bytes += saved
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(members))
+                completed = {future for future in pending if future.done()}
+                pending -= completed
+                finish(completed)
+            while pending:
+                completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                finish(completed)
+
+        _replace_dir(staging, dest_dir)
+    except BaseException:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)  # No thread may still be writing
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        for handle in opened:
+            handle.close()
+    result = {'files': len(members), 'bytes': total_bytes}
+    if store is not None:
+        result['bytes_saved'] = saved_bytes
+    return result
+
+
+def _replace_dir(staging, dest_dir):
+    """Move staging to dest_dir; an existing dest_dir is swapped out and removed afterwards."""
+    if not os.path.exists(dest_dir):
+        os.rename(staging, dest_dir)
+        return
+    retired = tempfile.mkdtemp(prefix='.replaced-', dir=os.path.dirname(os.path.abspath(dest_dir)))
+    os.rename(dest_dir, os.path.join(retired, 'old'))
+    os.rename(staging, dest_dir)
+    shutil.rmtree(retired, ignore_errors=True)
@@ -0,0 +1,197 @@
+"""
+Content-addressed deduplication of course files.
+
+OCW exports ship the same CSS/JS bundles, fonts and logos in every course
+folder. ContentStore keeps one copy of each file's content under
+<courses_dir>/.store/<sha256[:2]>/<sha256> and replaces duplicates in course
+folders with hardlinks to it. A course file keeps its path, so nginx and
+send_from_directory serve it unchanged; the volume holds the bytes once and
+the page cache caches them once for every course.
+
+The store directory is the index: a blob's path is its hash, so looking up
+content is a single stat, and the inode of every blob identifies course files
+that are already links (a rerun skips them without hashing). Blobs whose link
+count drops to 1 belong to no course any more (course deleted or replaced) and
+are removed by collect_garbage().
+
+Extraction (course_archive.extract_archive(store=...)) hashes members while
+writing them and links them into the store immediately, so new uploads are
+deduplicated as they land. dedupe_courses() is the pass over existing folders.
+
+Hardlinked files share their content: edit course files by replacing them
+(write a new file, rename over), never in place.
+"""
+
+import logging
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+from .course_indexer import list_course_folders
+from .course_manifest import hash_file
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = '.store'
+
+
+class ContentStore:
+    """
+    Hardlink store for course files.
+
+    Args:
+        courses_dir: Courses volume; the store lives in it (hardlinks cannot cross filesystems)
+        min_size: Files smaller than this are left alone (a link saves less than it costs to track)
+    """
+
+    def __init__(self, courses_dir, min_size=4096):
+        self.root = os.path.join(courses_dir, STORE_DIRNAME)
+        self.min_size = min_size
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def link(self, path, digest=None, size=None):
+        """
+        Make path a hardlink to the store's copy of its content.
+
+        The first file with a given content becomes the store's copy. Returns
+        the bytes saved (0 for the first copy, a file already linked, or one
+        below min_size).
+        """
+        if size is None:
+            size = os.lstat(path).st_size
+        if size < self.min_size:
+            return 0
+        digest = digest or hash_file(path)
+        blob = self.blob_path(digest)
+        try:
+            blob_stat = os.stat(blob)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            try:
+                os.link(path, blob)
+                return 0
+            except FileExistsError:
+                blob_stat = os.stat(blob)  # Another thread stored the same content first
+
+        file_stat = os.lstat(path)
+        if (blob_stat.st_dev, blob_stat.st_ino) == (file_stat.st_dev, file_stat.st_ino):
+            return 0
+        if blob_stat.st_size != file_stat.st_size:
+            logger.warning(f"Content store blob {digest} has the wrong size; not linking {path}")
+            return 0
+        # Link beside the file, then rename over it: the path never disappears
+        temp = f"{path}.dedupe-{os.getpid()}"
+        os.link(blob, temp)
+        os.replace(temp, path)
+        return size
+
+    def inodes(self):
+        """(st_dev, st_ino) of every blob: course files with these are already deduplicated."""
+        found = set()
+        if not os.path.isdir(self.root):
+            return found
+        for bucket in os.scandir(self.root):
+            if bucket.is_dir(follow_symlinks=False):
+                for blob in os.scandir(bucket.path):
+                    blob_stat = blob.stat(follow_symlinks=False)
+                    found.add((blob_stat.st_dev, blob_stat.st_ino))
+        return found
+
+    def collect_garbage(self):
+        """Remove blobs no course file links to any more. Returns (blobs removed, bytes freed)."""
+        removed = freed = 0
+        if not os.path.isdir(self.root):
+            return removed, freed
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            for blob in os.scandir(bucket.path):
+                blob_stat = blob.stat(follow_symlinks=False)
+                if blob_stat.st_nlink == 1:
+                    os.remove(blob.path)
+                    removed += 1
+                    freed += blob_stat.st_size
+        return removed, freed
+
+
+def _course_files(courses_dir, min_size):
+    """(path, size, (dev, inode)) of regular files of at least min_size in the course folders."""
+    for folder in list_course_folders(courses_dir):
+        for dirpath, _, filenames in os.walk(os.path.join(courses_dir, folder)):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                file_stat = os.lstat(path)
+                if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size >= min_size:
+                    yield path, file_stat.st_size, (file_stat.st_dev, file_stat.st_ino)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def dedupe_courses(courses_dir, store, workers=4, progress=None, batch_size=256):
+    """
+    Hardlink duplicate files across all course folders into the store.
+
+    Files already linked to a blob are skipped without being read. The rest
+    are hashed on `workers` threads (hashlib releases the GIL) and linked on
+    the calling thread, batch_size files at a time.
+
+    Args:
+        progress: Optional callable(files_seen) after each batch; raising from it aborts
+            (files linked so far stay linked)
+
+    Returns:
+        dict with 'files', 'already_linked', 'hashed', 'linked', 'bytes_saved',
+        'blobs_removed' and 'bytes_freed'
+    """
+    linked_inodes = store.inodes()
+    result = {'files': 0, 'already_linked': 0, 'hashed': 0, 'linked': 0, 'bytes_saved': 0}
+
+    def unlinked(files):
+        for entry in files:
+            result['files'] += 1
+            if entry[2] in linked_inodes:
+                result['already_linked'] += 1
+            else:
+                yield entry
+
+    def hash_entry(entry):
+        try:
+            return hash_file(entry[0])
+        except OSError as e:
+            logger.warning(f"Dedupe: cannot read {entry[0]}: {e}")
+            return None
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='course-dedupe') if workers > 1 else None
+    try:
+        for batch in _batches(unlinked(_course_files(courses_dir, store.min_size)), batch_size):
+            digests = executor.map(hash_entry, batch) if executor is not None else map(hash_entry, batch)
+            for (path, size, _), digest in zip(batch, digests):
+                if digest is None:
+                    continue
+                result['hashed'] += 1
+                saved = store.link(path, digest, size)
+                if saved:
+                    result['linked'] += 1
+                    result['bytes_saved'] += saved
+                # Other hardlinks of this file later in the walk are now known too
+                blob_stat = os.stat(store.blob_path(digest))
+                linked_inodes.add((blob_stat.st_dev, blob_stat.st_ino))
+            if progress is not None:
+                progress(result['files'])
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    result['blobs_removed'], result['bytes_freed'] = store.collect_garbage()
+    return result
@@ -0,0 +1,616 @@
+"""
+Course metadata extraction and incremental course scanning for GLEH.
+
+Extraction is pure: extract(course_dir) reads one course folder and returns a
+CourseRecord without touching the database. Three layouts are understood, in
+order of preference:
+
+    <folder>/data.json              MIT OCW export (title, instructors, topics, ...)
+    <folder>/package/index.html     packaged video course (title/description from the HTML)
+    <folder>/index.html             plain HTML course (title from the folder name)
+
+extract_batch() runs extract() over many folders on a thread pool, and
+save_records() is the shared persistence step: it compares records with the
+stored Course rows and writes only the differences as executemany
+INSERT/UPDATE statements.
+
+Scanning adds change detection on top. Every course folder's fingerprint
+(folder mtime, index.html presence, data.json mtime/size/sha256) is stored in
+the course_scan_state table. A rescan stats each folder and its data.json;
+folders whose fingerprint is unchanged are skipped without opening any file.
+When the stat changed, data.json is read and hashed, and parsed only if its
+content changed.
+
+Folders are processed in batches. Each batch's filesystem stage runs on a
+thread pool (COURSE_SCAN_WORKERS); its database reads and writes follow on the
+calling thread as one IN query and a few executemany INSERT/UPDATE statements.
+The admin scan endpoint and scripts/import_courses_from_volume.py go through
+scan_courses_dir(); build.py uses extract_batch() and save_records().
+
+    from src.course_indexer import scan_courses_dir
+    result = scan_courses_dir('/app/data/courses')
+    # {'total': 5000, 'new': 3, 'changed': 1, 'unchanged': 4996, 'removed': 0, 'failed': 0}
+
+Scans also keep each course's file manifest (course_manifest.py) current:
+new folders and folders whose fingerprint changed get theirs rebuilt in the
+same batch, re-hashing only files whose size or mtime changed.
+
+Folders that disappeared are reported as removed and dropped from the scan
+state and manifests. Their Course rows are kept: user progress and notes
+reference them, and deleting a course stays an explicit admin action.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import stat
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+
+from .course_manifest import Manifest, build_manifest, discard_cached_manifests
+from .database import db
+from .models import Course, CourseManifest, CourseScanState
+
+logger = logging.getLogger(__name__)
+
+# Folders per scan batch, and uids per IN query
+UID_LOOKUP_CHUNK = 500
+
+# Course columns a CourseRecord can carry
+COURSE_FIELDS = (
+    'uid', 'title', 'path', 'description', 'categories', 'thumbnail', 'instructor', 'course_number',
+    'term', 'year', 'level', 'department', 'license_url', 'learning_resources',
+)
+
+# --- Global Category Patterns ---
+CATEGORY_PATTERNS = {
+    'Python': re.compile(r'[Pp]ython', re.IGNORECASE),
+    'Java': re.compile(r'[Jj]ava', re.IGNORECASE),
+    'C++': re.compile(r'C\+\+', re.IGNORECASE),
+    'JavaScript': re.compile(r'[Jj]avascript|JS', re.IGNORECASE),
+    'DevOps': re.compile(r'DevOps|Docker|Ansible|Argo|Kubernetes|GitLab', re.IGNORECASE),
+    'Data Structures': re.compile(r'Data Structures|Algorithms|LeetCode', re.IGNORECASE),
+    'Rust': re.compile(r'Rust', re.IGNORECASE),
+    'Linux': re.compile(r'Linux', re.IGNORECASE),
+    'AI': re.compile(r'AI|Artificial Intelligence|Machine Learning', re.IGNORECASE),
+}
+
+
+def categories_from_name(name):
+    """Derives categories from a name using regex matching."""
+    found_categories = []
+    for category, pattern in CATEGORY_PATTERNS.items():
+        if pattern.search(name):
+            found_categories.append(category)
+    return list(set(found_categories))
+
+
+class CourseRecord:
+    """
+    Course metadata extracted from one folder.
+
+    Only the columns extraction set are written back (see to_dict()), so a
+    folder without data.json does not blank fields an admin filled in.
+    intro_video (packaged courses) and failed are not Course columns.
+    """
+
+    __slots__ = COURSE_FIELDS + ('intro_video', 'failed')
+
+    def __init__(self, uid, **fields):
+        self.uid = uid
+        self.intro_video = None
+        self.failed = False
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        """Course column values that were set, keyed by column name."""
+        return {key: getattr(self, key) for key in COURSE_FIELDS if hasattr(self, key)}
+
+    def __eq__(self, other):
+        return isinstance(other, CourseRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"<CourseRecord {self.uid}>"
+
+
+def default_record(folder, path=None):
+    """Record for a folder without (or with unreadable) metadata."""
+    return CourseRecord(
+        folder,
+        title=folder.replace('-', ' ').replace('_', ' '),
+        path=path or f"{folder}/index.html",
+        description='',
+        categories='',
+    )
+
+
+def parse_data_json(folder, data):
+    """Map an MIT OCW data.json document to Course fields."""
+    # Extract instructors
+    instructor_names = []
+    for instructor in data.get('instructors', []):
+        if 'title' in instructor and instructor['title']:
+            instructor_names.append(instructor['title'])
+        else:
+            first = instructor.get('first_name', '')
+            last = instructor.get('last_name', '')
+            if first or last:
+                instructor_names.append(f"{first} {last}".strip())
+
+    # Extract topics/categories
+    categories = set()
+    for topic_path in data.get('topics', []) or []:
+        if isinstance(topic_path, list):
+            categories.update(topic_path)
+
+    # Handle thumbnail
+    thumbnail = None
+    image_src = data.get('image_src', '')
+    if image_src:
+        thumbnail = f"{folder}/{image_src[2:]}" if image_src.startswith('./') else f"{folder}/{image_src}"
+
+    return {
+        'title': data.get('course_title', folder),
+        'description': data.get('course_description', ''),
+        'instructor': ', '.join(instructor_names) if instructor_names else None,
+        'course_number': data.get('primary_course_number', ''),
+        'term': data.get('term', ''),
+        'year': data.get('year', ''),
+        'level': ', '.join(data.get('level', [])),
+        'department': ', '.join(data.get('department_numbers', [])),
+        'categories': ', '.join(sorted(categories)) if categories else '',
+        'thumbnail': thumbnail,
+        'learning_resources': json.dumps(data.get('learning_resource_types', [])),
+        'license_url': (data.get('course_image_metadata') or {}).get('license') or None,
+    }
+
+
+def record_from_data_json(folder, raw):
+    """Record from the bytes of a data.json; unparseable content gives a default record marked failed."""
+    record = default_record(folder)
+    try:
+        for key, value in parse_data_json(folder, json.loads(raw)).items():
+            setattr(record, key, value)
+    except Exception as e:
+        logger.warning(f"Failed to parse data.json for {folder}: {e}")
+        record.failed = True
+    return record
+
+
+# Elements that never have an end tag
+_VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                            'source', 'track', 'wbr'))
+
+
+class _PackageIndexParser(HTMLParser):
+    """
+    Reads a packaged course's index.html:
+        title        first <h1> inside div.intro
+        description  first <p> of the first #content-main > ul > li
+        intro_video  data-video of the first .watch inside div.chapter
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.intro_video = None
+        self._stack = []
+        self._capture = None
+        self._text = []
+        self._first_li_depth = None  # Stack index of the first #content-main > ul > li
+
+    def _inside(self, tag, attr, value):
+        for open_tag, attrs in self._stack:
+            if (tag is None or open_tag == tag) and value in (attrs.get(attr) or '').split():
+                return True
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'h1' and self.title is None and self._capture is None and self._inside('div', 'class', 'intro'):
+            self._capture, self._text = 'title', []
+        elif tag == 'li' and self._first_li_depth is None and len(self._stack) >= 2 \
+                and self._stack[-1][0] == 'ul' and self._stack[-2][1].get('id') == 'content-main':
+            self._first_li_depth = len(self._stack)
+        elif tag == 'p' and self.description is None and self._capture is None \
+                and self._first_li_depth is not None and len(self._stack) > self._first_li_depth:
+            self._capture, self._text = 'description', []
+        if self.intro_video is None and attrs.get('data-video') and 'watch' in (attrs.get('class') or '').split() \
+                and self._inside('div', 'class', 'chapter'):
+            self.intro_video = attrs['data-video']
+        if tag not in _VOID_ELEMENTS:
+            self._stack.append((tag, attrs))
+
+    def handle_endtag(self, tag):
+        if self._capture and tag == {'title': 'h1', 'description': 'p'}[self._capture]:
+            setattr(self, self._capture, ' '.join(''.join(self._text).split()))
+            self._capture = None
+        # Pop to the matching start tag; tolerates unclosed <p>/<li>
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                del self._stack[index:]
+                if self._first_li_depth is not None and index <= self._first_li_depth:
+                    self._first_li_depth = -1  # Left the first item; later items are not searched
+                break
+
+    def handle_data(self, data):
+        if self._capture:
+            self._text.append(data)
+
+
+def record_from_package(folder, course_dir):
+    """Record for a packaged video course (<folder>/package/index.html)."""
+    record = default_record(folder, path=f"{folder}/package/index.html")
+    record.categories = ','.join(sorted(categories_from_name(folder)))
+    parser = _PackageIndexParser()
+    try:
+        with open(os.path.join(course_dir, 'package', 'index.html'), 'r', encoding='utf-8') as f:
+            parser.feed(f.read())
+        parser.close()
+    except Exception as e:
+        logger.warning(f"Failed to parse package/index.html for {folder}: {e}")
+        record.failed = True
+        return record
+    if parser.title:
+        record.title = parser.title
+    if parser.description:
+        record.description = parser.description
+    if parser.intro_video:
+        record.intro_video = os.path.join(course_dir, 'package', parser.intro_video)
+    return record
+
+
+def _record_without_data_json(folder, course_dir):
+    if os.path.isfile(os.path.join(course_dir, 'package', 'index.html')):
+        return record_from_package(folder, course_dir)
+    return default_record(folder)
+
+
+def extract(course_dir):
+    """
+    Extract a course folder's metadata. Reads files only; no database access.
+
+    Returns:
+        CourseRecord (uid = folder name), or None if course_dir is not a course
+    """
+    course_dir = os.path.normpath(course_dir)
+    folder = os.path.basename(course_dir)
+    try:
+        with open(os.path.join(course_dir, 'data.json'), 'rb') as f:
+            raw = f.read()
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        raw = None
+    except OSError as e:
+        logger.warning(f"Failed to read data.json for {folder}: {e}")
+        record = default_record(folder)
+        record.failed = True
+        return record
+    if raw is not None:
+        return record_from_data_json(folder, raw)
+    if os.path.isfile(os.path.join(course_dir, 'index.html')) or \
+            os.path.isfile(os.path.join(course_dir, 'package', 'index.html')):
+        return _record_without_data_json(folder, course_dir)
+    return None
+
+
+def extract_batch(course_dirs, workers=8):
+    """extract() over many folders on a thread pool; returns records (or None) in input order."""
+    course_dirs = list(course_dirs)
+    if workers <= 1 or len(course_dirs) <= 1:
+        return [extract(course_dir) for course_dir in course_dirs]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='course-extract') as executor:
+        return list(executor.map(extract, course_dirs))
+
+
+def save_records(records, known_uids=None):
+    """
+    Insert or update the Course rows for extracted records.
+
+    Stored rows are loaded with one IN query per UID_LOOKUP_CHUNK records and
+    compared column by column; only new rows and differing columns are written,
+    as executemany statements. Does not commit.
+
+    Args:
+        records: CourseRecords (None entries are skipped)
+        known_uids: Optional set of uids already in the course table; records
+            outside it are inserted without a lookup. Updated with new uids.
+
+    Returns:
+        dict with 'new', 'changed' and 'unchanged' counts
+    """
+    result = {'new': 0, 'changed': 0, 'unchanged': 0}
+    records = [record for record in records if record is not None]
+    for chunk in _chunks(records):
+        pending = {record.uid: record.to_dict() for record in chunk}
+        lookup = [uid for uid in pending if known_uids is None or uid in known_uids]
+        stored = {}
+        if lookup:
+            columns = sorted({key for uid in lookup for key in pending[uid]} - {'uid'})
+            stored = {row.uid: row for row in db.session.execute(
+                db.select(Course.id, Course.uid, *(getattr(Course, key) for key in columns))
+                .where(Course.uid.in_(lookup)))}
+
+        new_courses, course_updates = [], []
+        for uid, values in pending.items():
+            row = stored.get(uid)
+            if row is None:
+                new_courses.append(values)
+                continue
+            diff = {key: value for key, value in values.items() if key != 'uid' and getattr(row, key) != value}
+            if diff:
+                course_updates.append({'id': row.id, **diff})
+            result['changed' if diff else 'unchanged'] += 1
+        result['new'] += len(new_courses)
+
+        # render_nulls keeps rows with None values in one executemany batch
+        if new_courses:
+            db.session.execute(db.insert(Course).execution_options(render_nulls=True), new_courses)
+            if known_uids is not None:
+                known_uids.update(values['uid'] for values in new_courses)
+        if course_updates:
+            db.session.execute(db.update(Course), course_updates)
+    return result
+
+
+def fingerprint_folder(course_path):
+    """
+    Stat a course folder.
+
+    Returns {'dir_mtime_ns', 'has_index', 'data_mtime_ns', 'data_size'}, or
+    None if the path is not a course (not a directory, or none of data.json,
+    index.html and package/index.html present).
+    """
+    try:
+        dir_stat = os.stat(course_path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(dir_stat.st_mode):
+        return None
+
+    try:
+        data_stat = os.stat(os.path.join(course_path, 'data.json'))
+    except OSError:
+        data_stat = None
+    if data_stat is not None and not stat.S_ISREG(data_stat.st_mode):
+        data_stat = None
+    has_index = os.path.exists(os.path.join(course_path, 'index.html')) or \
+        os.path.exists(os.path.join(course_path, 'package', 'index.html'))
+    if data_stat is None and not has_index:
+        return None
+
+    return {
+        'dir_mtime_ns': dir_stat.st_mtime_ns,
+        'has_index': has_index,
+        'data_mtime_ns': data_stat.st_mtime_ns if data_stat else None,
+        'data_size': data_stat.st_size if data_stat else None,
+    }
+
+
+STATE_FIELDS = ('dir_mtime_ns', 'has_index', 'data_mtime_ns', 'data_size')
+
+
+def inspect_folder(courses_dir, folder, known=None):
+    """
+    Filesystem half of a scan for one folder; safe to run in a worker thread.
+
+    Args:
+        known: Stored (dir_mtime_ns, has_index, data_mtime_ns, data_size, data_hash)
+            for a course that exists in the database, or None to extract unconditionally
+
+    Returns:
+        None if the folder is not a course, else a tuple
+        (fingerprint, data_hash, record). record is None when the folder is
+        unchanged since `known`.
+    """
+    course_path = os.path.join(courses_dir, folder)
+    fingerprint = fingerprint_folder(course_path)
+    if fingerprint is None:
+        return None
+    stat_key = tuple(fingerprint[key] for key in STATE_FIELDS)
+    if known is not None and known[:4] == stat_key:
+        return fingerprint, known[4], None
+
+    if fingerprint['data_mtime_ns'] is None:
+        if known is not None and known[1] == fingerprint['has_index'] and known[2] is None:
+            return fingerprint, None, None  # HTML-only course: nothing to re-read
+        return fingerprint, None, _record_without_data_json(folder, course_path)
+
+    try:
+        with open(os.path.join(course_path, 'data.json'), 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        logger.warning(f"Failed to read data.json for {folder}: {e}")
+        record = default_record(folder)
+        record.failed = True
+        return fingerprint, None, record
+    data_hash = hashlib.sha256(raw).hexdigest()
+    if known is not None and known[1] == fingerprint['has_index'] and known[4] == data_hash:
+        return fingerprint, data_hash, None  # Touched or folder contents changed, data.json identical
+    return fingerprint, data_hash, record_from_data_json(folder, raw)
+
+
+def list_course_folders(courses_dir):
+    """
+    Names of the subdirectories of courses_dir; DirEntry type info avoids a stat per entry.
+
+    Dot directories (.uploads, .store, extraction staging) are not courses.
+    """
+    with os.scandir(courses_dir) as entries:
+        return [entry.name for entry in entries if entry.is_dir() and not entry.name.startswith('.')]
+
+
+def _chunks(items, size=UID_LOOKUP_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def scan_courses_dir(courses_dir, full=False, workers=8, progress=None, chunk_size=UID_LOOKUP_CHUNK, folders=None,
+                     manifests=True):
+    """
+    Bring Course rows in line with the course folders under courses_dir.
+
+    Folders are processed in batches of chunk_size: stats and extraction run on
+    `workers` threads (network mounts pay a round trip per stat), then
+    save_records() writes the batch on the calling thread. Extracted records
+    are dropped after each batch, so memory stays bounded by chunk_size
+    however many courses the volume holds.
+
+    Args:
+        courses_dir: Directory containing one folder per course
+        full: Re-extract every folder, ignoring stored fingerprints
+        workers: Threads for the filesystem stage (0 or 1 = inline)
+        progress: Optional callable(done, total) invoked per inspected folder;
+            raising from it aborts the scan and rolls back every batch
+        chunk_size: Folders per batch
+        folders: Only scan these folder names (e.g. a course just extracted);
+            folders missing from the list are not reported as removed
+        manifests: Rebuild the file manifests of new and changed folders
+            (every folder's when full)
+
+    Returns:
+        dict with 'total', 'new', 'changed', 'unchanged', 'removed' and 'failed' counts.
+        Commits the session once, after the last batch.
+    """
+    partial = folders is not None
+    folders = list(folders) if partial else list_course_folders(courses_dir)
+
+    state_query = db.select(
+        CourseScanState.uid, CourseScanState.dir_mtime_ns, CourseScanState.has_index,
+        CourseScanState.data_mtime_ns, CourseScanState.data_size, CourseScanState.data_hash)
+    if manifests:
+        # Manifests are written and removed together with scan state rows: join instead of a third query
+        state_query = state_query.add_columns(CourseManifest.uid.label('manifest_uid')).outerjoin(
+            CourseManifest, CourseManifest.uid == CourseScanState.uid)
+    uid_query = db.select(Course.uid)
+    if partial:
+        state_query = state_query.where(CourseScanState.uid.in_(folders))
+        uid_query = uid_query.where(Course.uid.in_(folders))
+    states, manifest_uids = {}, set()
+    for row in db.session.execute(state_query):
+        states[row[0]] = tuple(row[1:6])
+        if manifests and row[6] is not None:
+            manifest_uids.add(row[0])
+    known_uids = set(db.session.execute(uid_query).scalars())
+    rebuilt = []
+
+    def inspect(folder):
+        known = states.get(folder) if not full and folder in known_uids else None
+        return inspect_folder(courses_dir, folder, known)
+
+    result = {'total': 0, 'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+    seen = set()
+    done = 0
+    executor = None
+    if workers > 1 and len(folders) > 1:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='course-scan')
+    try:
+        for batch in _chunks(folders, chunk_size):
+            inspected = []
+            for outcome in (executor.map(inspect, batch) if executor else map(inspect, batch)):
+                inspected.append(outcome)
+                done += 1
+                if progress is not None:
+                    progress(done, len(folders))
+            if manifests:
+                rebuilt += _update_manifests(courses_dir, batch, inspected, states, full, manifest_uids, executor)
+            _apply_batch(batch, inspected, states, known_uids, seen, result)
+
+        removed = [] if partial else [uid for uid in states if uid not in seen]
+        if removed:
+            logger.info(f"Course folders removed since last scan: {', '.join(sorted(removed))}")
+            for chunk in _chunks(removed):
+                db.session.execute(db.delete(CourseScanState).where(CourseScanState.uid.in_(chunk)))
+                if manifests:
+                    db.session.execute(db.delete(CourseManifest).where(CourseManifest.uid.in_(chunk)))
+        result['removed'] = len(removed)
+        db.session.commit()
+        discard_cached_manifests(rebuilt + removed)
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return result
+
+
+def _apply_batch(batch, inspected, states, known_uids, seen, result):
+    """Write one batch of inspected folders: save changed records and refresh fingerprints."""
+    new_states, changed_states, records = [], [], []
+    for folder, outcome in zip(batch, inspected):
+        if outcome is None:
+            continue
+        fingerprint, data_hash, record = outcome
+        seen.add(folder)
+        result['total'] += 1
+
+        state_row = {'uid': folder, **fingerprint, 'data_hash': data_hash}
+        stored = states.get(folder)
+        if stored is None:
+            new_states.append(state_row)
+        elif stored != tuple(state_row[key] for key in STATE_FIELDS + ('data_hash',)):
+            changed_states.append(state_row)
+
+        if record is None:
+            result['unchanged'] += 1
+        else:
+            result['failed'] += record.failed
+            records.append(record)
+
+    for key, count in save_records(records, known_uids).items():
+        result[key] += count
+    if new_states:
+        db.session.execute(db.insert(CourseScanState).execution_options(render_nulls=True), new_states)
+    if changed_states:
+        db.session.execute(db.update(CourseScanState), changed_states)
+
+
+def _update_manifests(courses_dir, batch, inspected, states, full, manifest_uids, executor):
+    """Rebuild the manifests of a batch's new and changed folders. Returns the folders rebuilt."""
+    stale = []
+    for folder, outcome in zip(batch, inspected):
+        if outcome is None:
+            continue
+        stored = states.get(folder)
+        stat_key = tuple(outcome[0][key] for key in STATE_FIELDS)
+        if full or folder not in manifest_uids or stored is None or stored[:4] != stat_key:
+            stale.append(folder)
+    if not stale:
+        return stale
+
+    previous = {}
+    lookup = [folder for folder in stale if folder in manifest_uids]
+    if lookup:
+        previous = dict(db.session.execute(
+            db.select(CourseManifest.uid, CourseManifest.data).where(CourseManifest.uid.in_(lookup))).all())
+
+    def build(folder):
+        data = previous.get(folder)
+        try:
+            old = Manifest.decode(data) if data is not None else None
+        except (ValueError, zlib.error):
+            old = None  # Unreadable or older format: hash everything again
+        return build_manifest(os.path.join(courses_dir, folder), old)
+
+    built_at = datetime.utcnow()
+    new_rows, changed_rows = [], []
+    for folder, manifest in zip(stale, executor.map(build, stale) if executor else map(build, stale)):
+        row = {'uid': folder, 'files': len(manifest), 'bytes': manifest.total_bytes, 'data': manifest.encode(),
+               'built_at': built_at}
+        (changed_rows if folder in manifest_uids else new_rows).append(row)
+    if new_rows:
+        # A folder new to the scan state may still have a manifest if its state row was deleted by hand
+        orphans = [row['uid'] for row in new_rows if row['uid'] not in states]
+        if orphans:
+            db.session.execute(db.delete(CourseManifest).where(CourseManifest.uid.in_(orphans)))
+        db.session.execute(db.insert(CourseManifest), new_rows)
+        manifest_uids.update(row['uid'] for row in new_rows)
+    if changed_rows:
+        db.session.execute(db.update(CourseManifest), changed_rows)
+    return stale
@@ -0,0 +1,268 @@
+"""
+Per-course file manifests.
+
+A manifest lists every regular file of a course folder with its size, mtime,
+sha256 and mime type. Scans build it (course_indexer.scan_courses_dir) and
+store it in the course_manifest table as zlib-compressed JSON, one row per
+course; a rebuild reuses the stored hash of every file whose size and mtime
+are unchanged, so only new or modified files are read.
+
+serve_course_files() sends a listed file's sha256 as a strong ETag and
+answers a matching If-None-Match with 304 before the file is opened. Decoded
+manifests are kept per process in ManifestCache for COURSE_MANIFEST_CACHE_TTL
+seconds, so a course updated by another worker's scan is picked up within
+that time. verify_course() re-hashes a folder against its manifest (the admin
+"Verify Integrity" job).
+
+Scans rebuild the manifests of new folders and of folders whose top-level
+stat changed, so a file edited or added deeper in a course by hand is not in
+the manifest until a full scan (?full=1). Serving never trusts a stale entry:
+entry_matches_disk() compares the stored size and mtime with a stat of the
+file, and unlisted or changed files are served from disk without the stored
+ETag.
+"""
+
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import stat
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+from .database import db
+from .metrics import record_cache
+from .models import CourseManifest
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+# Bytes per read while hashing
+HASH_BLOCK = 1024 * 1024
+DEFAULT_MIME = 'application/octet-stream'
+
+ManifestEntry = namedtuple('ManifestEntry', 'size mtime_ns sha256 mime')
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Files of one course folder, keyed by '/'-separated path relative to the folder."""
+
+    __slots__ = ('entries',)
+
+    def __init__(self, entries=None):
+        self.entries = entries if entries is not None else {}
+
+    def get(self, path):
+        return self.entries.get(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_bytes(self):
+        return sum(entry.size for entry in self.entries.values())
+
+    def encode(self):
+        """
+        Compact form stored in CourseManifest.data: zlib-compressed JSON rows
+        [path, size, mtime_ns, sha256, mime index] sorted by path, so shared
+        directory prefixes compress well, with mime types stored once.
+        """
+        mimes = sorted({entry.mime for entry in self.entries.values()})
+        index = {mime: i for i, mime in enumerate(mimes)}
+        rows = [[path, entry.size, entry.mtime_ns, entry.sha256, index[entry.mime]]
+                for path, entry in sorted(self.entries.items())]
+        document = {'v': MANIFEST_VERSION, 'mimes': mimes, 'files': rows}
+        return zlib.compress(json.dumps(document, separators=(',', ':')).encode('utf-8'))
+
+    @classmethod
+    def decode(cls, data):
+        document = json.loads(zlib.decompress(data))
+        if document.get('v') != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {document.get('v')}")
+        mimes = document['mimes']
+        return cls({path: ManifestEntry(size, mtime_ns, sha256, mimes[mime])
+                    for path, size, mtime_ns, sha256, mime in document['files']})
+
+
+def _walk_files(course_path):
+    """(relative path, os.stat_result) of the regular files under course_path."""
+    for dirpath, _, filenames in os.walk(course_path):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                file_stat = os.lstat(path)
+            except OSError:
+                continue  # Removed while walking
+            if stat.S_ISREG(file_stat.st_mode):
+                yield os.path.relpath(path, course_path).replace(os.sep, '/'), file_stat
+
+
+def build_manifest(course_path, previous=None):
+    """
+    List and hash the files of a course folder.
+
+    Args:
+        previous: The folder's last Manifest; files with the same size and
+            mtime keep their hash instead of being read again
+
+    Returns:
+        Manifest (unreadable files are left out and logged)
+    """
+    previous_entries = previous.entries if previous is not None else {}
+    entries = {}
+    for relative, file_stat in _walk_files(course_path):
+        known = previous_entries.get(relative)
+        if known is not None and (known.size, known.mtime_ns) == (file_stat.st_size, file_stat.st_mtime_ns):
+            entries[relative] = known
+            continue
+        try:
+            digest = hash_file(os.path.join(course_path, relative))
+        except OSError as e:
+            logger.warning(f"Manifest: cannot read {course_path}/{relative}: {e}")
+            continue
+        mime = mimetypes.guess_type(relative)[0] or DEFAULT_MIME
+        entries[relative] = ManifestEntry(file_stat.st_size, file_stat.st_mtime_ns, digest, mime)
+    return Manifest(entries)
+
+
+def entry_matches_disk(entry, path):
+    """True if the file at path still has the size and mtime recorded in its manifest entry."""
+    if path is None:
+        return False
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return False
+    return (file_stat.st_size, file_stat.st_mtime_ns) == (entry.size, entry.mtime_ns)
+
+
+def verify_course(course_path, manifest, executor=None, limit=20):
+    """
+    Re-hash a course folder and compare it with its manifest.
+
+    Args:
+        executor: Optional thread pool to hash files on (hashlib releases the GIL)
+        limit: Paths listed per problem kind (counts are always complete)
+
+    Returns:
+        dict with 'files' (files checked), counts 'missing', 'modified' and
+        'unexpected', and up to `limit` example paths of each under 'paths'
+    """
+    on_disk = dict(_walk_files(course_path)) if os.path.isdir(course_path) else {}
+    missing = sorted(path for path in manifest.entries if path not in on_disk)
+    unexpected = sorted(path for path in on_disk if path not in manifest.entries)
+
+    def check(path):
+        entry = manifest.entries[path]
+        if on_disk[path].st_size != entry.size:
+            return False
+        try:
+            return hash_file(os.path.join(course_path, path)) == entry.sha256
+        except OSError:
+            return False
+
+    present = sorted(path for path in manifest.entries if path in on_disk)
+    results = executor.map(check, present) if executor is not None else map(check, present)
+    modified = [path for path, ok in zip(present, results) if not ok]
+    return {
+        'files': len(present),
+        'missing': len(missing),
+        'modified': len(modified),
+        'unexpected': len(unexpected),
+        'paths': {'missing': missing[:limit], 'modified': modified[:limit], 'unexpected': unexpected[:limit]},
+    }
+
+
+class ManifestCache:
+    """
+    Decoded manifests by course uid, per process.
+
+    Entries (including "this course has no manifest") expire after ttl
+    seconds; the least recently used are dropped beyond max_entries.
+    """
+
+    def __init__(self, ttl=60, max_entries=64, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, uid):
+        """The course's Manifest, or None if it has none (never scanned, or built before manifests existed)."""
+        now = self.clock()
+        with self._lock:
+            cached = self._entries.get(uid)
+            if cached is not None and now - cached[0] < self.ttl:
+                self._entries.move_to_end(uid)
+                record_cache('course_manifest', True)
+                return cached[1]
+        record_cache('course_manifest', False)
+
+        data = db.session.execute(db.select(CourseManifest.data).where(CourseManifest.uid == uid)).scalar()
+        manifest = None
+        if data is not None:
+            try:
+                manifest = Manifest.decode(data)
+            except (ValueError, zlib.error) as e:
+                logger.warning(f"Ignoring unreadable manifest of {uid}: {e}")
+
+        with self._lock:
+            self._entries[uid] = (now, manifest)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return manifest
+
+    def discard(self, uids):
+        with self._lock:
+            for uid in uids:
+                self._entries.pop(uid, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_manifest_cache = None
+
+
+def get_manifest_cache() -> ManifestCache:
+    """Get the global ManifestCache (init_manifest_cache() must have run)."""
+    if _manifest_cache is None:
+        raise RuntimeError("Manifest cache not initialized; call init_manifest_cache(app)")
+    return _manifest_cache
+
+
+def discard_cached_manifests(uids):
+    """Drop rebuilt or removed manifests from this process's cache (no-op outside the app)."""
+    if _manifest_cache is not None:
+        _manifest_cache.discard(uids)
+
+
+def init_manifest_cache(app) -> ManifestCache:
+    """
+    Configure the global ManifestCache from app config.
+
+    Config:
+        COURSE_MANIFEST_CACHE_TTL: Seconds a process trusts a cached manifest
+        COURSE_MANIFEST_CACHE_SIZE: Manifests kept per process
+    """
+    global _manifest_cache
+    _manifest_cache = ManifestCache(
+        ttl=app.config.get('COURSE_MANIFEST_CACHE_TTL', 60),
+        max_entries=app.config.get('COURSE_MANIFEST_CACHE_SIZE', 64),
+    )
+    return _manifest_cache
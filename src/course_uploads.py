@@ -0,0 +1,174 @@
+"""
+Resumable chunked course uploads.
+
+Multi-GB course zips do not fit a single multipart POST: werkzeug spools the
+whole body before the view runs, and a dropped connection loses everything.
+The admin panel uploads in chunks instead:
+
+    POST   /api/admin/uploads                {"filename", "size", "sha256"?} -> 201, offset 0
+    PUT    /api/admin/uploads/<id>?offset=N  raw chunk bytes, optional X-Chunk-SHA256 header
+    GET    /api/admin/uploads/<id>           current offset (where to resume)
+    POST   /api/admin/uploads/<id>/complete  -> 202 job: verify sha256, move into place, extract zips
+    DELETE /api/admin/uploads/<id>           abort
+
+Chunks are copied from the request stream straight into
+<courses_dir>/.uploads/<id>.part in COPY_BLOCK pieces, so a request holds one
+block in memory whatever the chunk or file size. The part file's size is the
+upload offset, shared by every worker process: after a dropped connection the
+client asks for the offset and continues from there. A chunk sent with
+X-Chunk-SHA256 is all or nothing (truncated back if it is cut off or does not
+match); without it, whatever arrived is kept.
+
+Uploads are single-writer: chunks must be sent in order, one at a time, and a
+PUT whose offset is not the current size gets 409 with the current offset.
+write_chunk() holds an exclusive flock on the part file while it checks the
+offset and appends, so two PUTs racing for the same offset (a client retrying
+while its first request is still streaming, possibly on another worker)
+cannot both append: the second gets 409 instead of waiting.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from .course_archive import STAGING_PREFIX
+from .database import db
+from .models import CourseUpload
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied from the request stream (or hashed) per read
+COPY_BLOCK = 1024 * 1024
+
+UPLOADS_DIRNAME = '.uploads'
+
+
+class UploadError(Exception):
+    """A rejected upload request; status is the HTTP status, offset the current upload offset."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def part_path(courses_dir, upload_id):
+    return os.path.join(courses_dir, UPLOADS_DIRNAME, f"{upload_id}.part")
+
+
+def current_offset(path):
+    """Bytes received so far (0 before the first chunk)."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def write_chunk(path, offset, stream, length, total_size, sha256=None):
+    """
+    Append `length` bytes from `stream` to the part file at `offset`.
+
+    Args:
+        offset: Where the client thinks the upload is; must equal the part file's size
+        length: Content-Length of the chunk
+        total_size: Declared size of the whole upload
+        sha256: Optional hex digest of the chunk; a mismatch discards the chunk
+
+    Returns:
+        The new offset
+
+    Raises:
+        UploadError: offset mismatch or another chunk being written (409), chunk past the
+            declared size, short body or checksum mismatch
+    """
+    with open(path, 'ab') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Another chunk of this upload is being written', 409, current_offset(path))
+        # Checked under the lock: the size cannot change until this chunk is written
+        size = os.fstat(f.fileno()).st_size
+        if offset != size:
+            raise UploadError('Offset does not match the bytes received so far', 409, size)
+        if length is None:
+            raise UploadError('Content-Length required', 411, size)
+        if offset + length > total_size:
+            raise UploadError('Chunk extends past the declared upload size', 400, size)
+
+        digest = hashlib.sha256() if sha256 else None
+        received = 0
+        complete = False
+        try:
+            while received < length:
+                block = stream.read(min(COPY_BLOCK, length - received))
+                if not block:
+                    break
+                f.write(block)
+                if digest is not None:
+                    digest.update(block)
+                received += len(block)
+            if received < length:
+                raise UploadError('Connection closed before the chunk was complete', 400)
+            if digest is not None and digest.hexdigest() != sha256.lower():
+                raise UploadError('Chunk checksum mismatch', 400)
+            complete = True
+        finally:
+            if not complete and digest is not None:
+                # A checksummed chunk is all or nothing
+                f.truncate(offset)
+    return offset + received
+
+
+def file_sha256(path, progress=None):
+    """sha256 hex digest of a file, read in COPY_BLOCK pieces; progress(done, total) after each."""
+    total = os.path.getsize(path)
+    digest = hashlib.sha256()
+    done = 0
+    with open(path, 'rb') as f:
+        while block := f.read(COPY_BLOCK):
+            digest.update(block)
+            done += len(block)
+            if progress is not None:
+                progress(done, total)
+    return digest.hexdigest()
+
+
+def discard_upload(courses_dir, upload):
+    """Delete an upload's part file and row (does not commit)."""
+    try:
+        os.remove(part_path(courses_dir, upload.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+
+
+def expire_uploads(courses_dir, max_age_hours=24):
+    """
+    Discard uploads that received nothing for max_age_hours, and extraction
+    staging directories as old (left by a process killed mid-extract).
+    Returns how many uploads; commits.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    expired = 0
+    for upload in CourseUpload.query.filter(CourseUpload.created_at < cutoff).all():
+        try:
+            last_write = datetime.utcfromtimestamp(os.path.getmtime(part_path(courses_dir, upload.id)))
+        except OSError:
+            last_write = upload.created_at
+        if last_write < cutoff:
+            discard_upload(courses_dir, upload)
+            expired += 1
+    if expired:
+        logger.info(f"Discarded {expired} abandoned course uploads")
+        db.session.commit()
+
+    with os.scandir(courses_dir) as entries:
+        for entry in entries:
+            if (entry.name.startswith(STAGING_PREFIX) and entry.is_dir(follow_symlinks=False)
+                    and datetime.utcfromtimestamp(entry.stat(follow_symlinks=False).st_mtime) < cutoff):
+                logger.info(f"Removing abandoned extraction directory {entry.name}")
+                shutil.rmtree(entry.path, ignore_errors=True)
+    return expired
@@ -0,0 +1,189 @@
+"""
+Connection pool instrumentation for GLEH.
+
+InstrumentedQueuePool is a QueuePool that records, per checkout, how long the
+caller waited for a connection and how long pre-ping took, and tracks peak
+checked-out and overflow counts. Invalidations and checkout timeouts are
+counted from pool events. Values feed /metrics and the 'pool' component of
+/health/deep, together with a sizing recommendation that compares observed
+peak concurrency with the number of server threads.
+
+Pool parameters come from DB_POOL_* environment variables (see config.py).
+"""
+
+import math
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from .metrics import (
+    db_pool_checkout_wait_seconds, db_pool_pre_ping_seconds, db_pool_checked_out, db_pool_overflow,
+    db_pool_events_total,
+)
+
+
+class PoolStats:
+    """Counters shared by a pool and the pools it is recreated into (engine.dispose())."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.pre_ping_total = 0.0
+        self.pre_pings = 0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+
+    def record_checkout(self, wait, pre_ping, checked_out, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+            if pre_ping is not None:
+                self.pre_pings += 1
+                self.pre_ping_total += pre_ping
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'checkout_wait_avg_ms': round(self.checkout_wait_total / self.checkouts * 1000, 3)
+                if self.checkouts else 0.0,
+                'checkout_wait_max_ms': round(self.checkout_wait_max * 1000, 3),
+                'pre_ping_avg_ms': round(self.pre_ping_total / self.pre_pings * 1000, 3) if self.pre_pings else 0.0,
+                'peak_checked_out': self.peak_checked_out,
+                'peak_overflow': self.peak_overflow,
+                'timeouts': self.timeouts,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait, pre-ping time and peak usage."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._local_wait = threading.local()
+        event.listen(self, 'invalidate', self._on_invalidate)
+        event.listen(self, 'soft_invalidate', self._on_soft_invalidate)
+        event.listen(self, 'checkin', self._on_checkin)
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            waited = time.perf_counter() - start
+            with self.stats._lock:
+                self.stats.timeouts += 1
+                self.stats.checkout_wait_max = max(self.stats.checkout_wait_max, waited)
+            db_pool_checkout_wait_seconds.observe(waited)
+            db_pool_events_total.inc(event='timeout')
+            raise
+        finally:
+            self._local_wait.value = time.perf_counter() - start
+
+    def connect(self):
+        # Waiting for a slot happens in _do_get(); the rest of connect() is pre-ping and checkout events
+        start = time.perf_counter()
+        self._local_wait.value = 0.0
+        connection = super().connect()
+        elapsed = time.perf_counter() - start
+        wait = min(self._local_wait.value, elapsed)
+        pre_ping = elapsed - wait if self._pre_ping else None
+
+        checked_out = self.checkedout()
+        overflow = max(self.overflow(), 0)
+        self.stats.record_checkout(wait, pre_ping, checked_out, overflow)
+        db_pool_checkout_wait_seconds.observe(wait)
+        if pre_ping is not None:
+            db_pool_pre_ping_seconds.observe(pre_ping)
+        db_pool_checked_out.set(checked_out)
+        db_pool_overflow.set(overflow)
+        return connection
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        db_pool_checked_out.set(self.checkedout())
+        db_pool_overflow.set(max(self.overflow(), 0))
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.stats._lock:
+            self.stats.invalidations += 1
+        db_pool_events_total.inc(event='invalidate')
+
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.stats._lock:
+            self.stats.soft_invalidations += 1
+        db_pool_events_total.inc(event='soft_invalidate')
+
+
+def configure_pool(app):
+    """
+    Use InstrumentedQueuePool for the app's engines. Call before db.init_app().
+
+    Flask-SQLAlchemy still substitutes StaticPool for in-memory SQLite.
+    """
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if options.get('pool_size', 1) > 0:
+        options.setdefault('poolclass', InstrumentedQueuePool)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def get_pool_stats(engine):
+    """Return the instrumented counters for an engine's pool, or None for other pool classes."""
+    stats = getattr(engine.pool, 'stats', None)
+    return stats.as_dict() if isinstance(stats, PoolStats) else None
+
+
+def pool_recommendation(pool_size, max_overflow, peak_checked_out, threads, timeouts=0,
+                        connections_per_thread=1, job_workers=0):
+    """
+    Suggest pool_size/max_overflow for one process from observed peak concurrency.
+
+    The most connections a process can have checked out at once is
+    threads * connections_per_thread + 2 * job_workers + 1:
+
+    - A request holds its session's connection, plus a second one while the
+      database rate limit backend runs its check (engine.begin()), so pass
+      connections_per_thread=2 with RATE_LIMIT_BACKEND=database.
+    - An admin job holds its session's connection and JobContext.report()
+      writes progress on another.
+    - The health monitor thread uses one.
+
+    Connections beyond that only cost database slots.
+
+    Returns {'pool_size', 'max_overflow', 'notes'}.
+    """
+    usable = threads * connections_per_thread + 2 * job_workers + 1
+    recommended_size = max(2, min(usable, math.ceil(peak_checked_out * 1.25)))
+    if timeouts:
+        # Observed peak is capped by the pool itself; size for every thread
+        recommended_size = usable
+    recommended_overflow = max(usable - recommended_size, 0)
+
+    notes = []
+    if pool_size + max(max_overflow, 0) > usable:
+        notes.append(f"pool_size + max_overflow = {pool_size + max_overflow} but at most {usable} connections "
+                     f"can be in use with {threads} server threads and {job_workers} job workers")
+    if timeouts:
+        notes.append(f"{timeouts} checkouts timed out waiting for a connection")
+    if peak_checked_out > pool_size:
+        notes.append(f"overflow connections were opened (peak {peak_checked_out} > pool_size {pool_size}); "
+                     "each one is connected and discarded")
+    return {'pool_size': recommended_size, 'max_overflow': recommended_overflow, 'notes': notes}
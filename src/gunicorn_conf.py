@@ -0,0 +1,51 @@
+"""
+Gunicorn settings for SERVER_MODE=gunicorn (see server.py).
+
+    gunicorn --config python:src.gunicorn_conf src.app:app
+
+Environment:
+    SERVER_WORKERS: Worker processes ('auto' or 0 = one per CPU)
+    SERVER_THREADS: Threads per worker
+    SERVER_PRELOAD: Import the app once in the master before forking (default true)
+    SERVER_TIMEOUT: Seconds before a silent worker is killed and replaced
+    SERVER_MAX_REQUESTS: Recycle a worker after this many requests (0 = never)
+"""
+
+import os
+import shutil
+
+from src.server import worker_count
+
+bind = f"{os.environ.get('SERVER_HOST', '0.0.0.0')}:{os.environ.get('SERVER_PORT', '5000')}"
+workers = worker_count()
+threads = int(os.environ.get('SERVER_THREADS', '4'))
+worker_class = 'gthread'
+preload_app = os.environ.get('SERVER_PRELOAD', 'true').lower() == 'true'
+timeout = int(os.environ.get('SERVER_TIMEOUT', '60'))
+graceful_timeout = 30
+max_requests = int(os.environ.get('SERVER_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+# request_completed events come from the app; gunicorn's access log would duplicate them
+accesslog = None
+errorlog = '-'
+
+# /metrics merges per-worker snapshots; must be set before the app (and its config) is imported
+os.environ.setdefault('METRICS_MULTIPROC_DIR', '/tmp/gleh-metrics')
+
+
+def on_starting(server):
+    # Snapshots left by a previous run would be merged into the new counters
+    shutil.rmtree(os.environ['METRICS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def post_fork(server, worker):
+    from src.app import app
+    from src.server import init_worker
+    init_worker(app)
+
+
+def worker_exit(server, worker):
+    from src.metrics import registry
+    registry.flush()
@@ -0,0 +1,225 @@
+"""
+Background health monitor for GLEH.
+
+A daemon thread refreshes component checks (database round trip, Calibre-Web
+reachability, storage readiness, connection pool saturation) every
+HEALTH_CHECK_INTERVAL seconds. /health and /health/deep serve the cached
+snapshot with its age instead of querying the database on every probe, and
+/ready reports pool exhaustion before requests start failing.
+
+The thread is started lazily on the first snapshot() call in each process,
+so it also runs in worker processes forked after the app was imported. With
+HEALTH_MONITOR_ENABLED=false the checks run inline whenever the cached
+snapshot is older than the interval.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+HEALTHY = 'healthy'
+DEGRADED = 'degraded'
+UNHEALTHY = 'unhealthy'
+
+
+def pool_status(engine):
+    """
+    Return checked-out/overflow counts for a QueuePool engine, or None.
+
+    Other pool classes (SQLite's SingletonThreadPool/StaticPool) have no
+    fixed capacity, so there is nothing to saturate.
+    """
+    pool = engine.pool
+    if not all(hasattr(pool, attr) for attr in ('size', 'checkedout', 'overflow', '_max_overflow')):
+        return None
+    size = pool.size()
+    max_overflow = pool._max_overflow
+    checked_out = pool.checkedout()
+    capacity = size + max_overflow if max_overflow >= 0 else None
+    return {
+        'pool_size': size,
+        'max_overflow': max_overflow,
+        'checked_out': checked_out,
+        'overflow': max(pool.overflow(), 0),
+        'saturation': round(checked_out / capacity, 3) if capacity else None,
+    }
+
+
+class HealthMonitor:
+    """
+    Runs registered checks on an interval and caches the results.
+
+    A check is a callable returning a dict with at least 'status'. A check that
+    raises is reported unhealthy with the error. Critical checks make the
+    overall status unhealthy; non-critical ones only degrade it.
+    """
+
+    def __init__(self, interval=10.0, stale_after=None, enabled=True):
+        self.interval = interval
+        self.stale_after = stale_after or interval * 3
+        self.enabled = enabled
+        self._checks = []
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def add_check(self, name, check, critical=True):
+        self._checks.append((name, check, critical))
+
+    def refresh(self):
+        """Run every check now and replace the cached snapshot."""
+        components = {}
+        status = HEALTHY
+        for name, check, critical in self._checks:
+            start = time.perf_counter()
+            try:
+                result = dict(check())
+            except Exception as e:
+                logger.error(f"Health check '{name}' failed: {e}")
+                result = {'status': UNHEALTHY, 'error': str(e)}
+            result['check_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            components[name] = result
+
+            if result['status'] != HEALTHY:
+                if critical and result['status'] == UNHEALTHY:
+                    status = UNHEALTHY
+                elif status == HEALTHY:
+                    status = DEGRADED
+
+        self._snapshot = {'status': status, 'checked_at': time.time(), 'components': components}
+        return self._snapshot
+
+    def snapshot(self):
+        """
+        Return the cached snapshot plus its age.
+
+        A snapshot older than stale_after (monitor thread stuck or dead) is
+        reported unhealthy rather than served as if it were current.
+        """
+        self._ensure_started()
+        snapshot = self._snapshot
+        if snapshot is None or (not self._running() and time.time() - snapshot['checked_at'] >= self.interval):
+            snapshot = self._refresh_inline() or snapshot
+
+        age = time.time() - snapshot['checked_at']
+        result = {
+            **snapshot,
+            'timestamp': datetime.fromtimestamp(snapshot['checked_at'], timezone.utc).isoformat(),
+            'age_seconds': round(age, 3),
+        }
+        if age > self.stale_after:
+            result['status'] = UNHEALTHY
+            result['error'] = f"Health snapshot is {age:.0f}s old (monitor stalled)"
+        return result
+
+    def _refresh_inline(self):
+        # One thread refreshes; concurrent probes are served the previous snapshot
+        if not self._refresh_lock.acquire(blocking=self._snapshot is None):
+            return None
+        try:
+            return self.refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def _ensure_started(self):
+        if not self.enabled or self._running():
+            return
+        with self._refresh_lock:
+            if self._running():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='gleh-health-monitor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:  # Never let the monitor thread die
+                logger.error(f"Health monitor refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+def init_health_monitor(app, db):
+    """
+    Create the monitor with the standard GLEH checks.
+
+    Config:
+        HEALTH_MONITOR_ENABLED: Refresh in a background thread (False = inline, on demand)
+        HEALTH_CHECK_INTERVAL: Seconds between refreshes
+        HEALTH_POOL_SATURATION_THRESHOLD: Checked-out fraction of pool capacity reported as degraded
+    """
+    from .calibre_client import get_calibre_client
+    from .storage import get_storage
+
+    monitor = HealthMonitor(
+        interval=app.config.get('HEALTH_CHECK_INTERVAL', 10.0),
+        enabled=app.config.get('HEALTH_MONITOR_ENABLED', True),
+    )
+    threshold = app.config.get('HEALTH_POOL_SATURATION_THRESHOLD', 0.9)
+
+    def check_database():
+        with app.app_context():
+            start = time.perf_counter()
+            db.session.execute(db.text('SELECT 1'))
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        return {'status': HEALTHY, 'latency_ms': latency_ms}
+
+    def check_storage():
+        ready = get_storage().ensure_storage_ready()
+        return {'status': HEALTHY if ready else UNHEALTHY}
+
+    def check_calibre():
+        client = get_calibre_client()
+        if not client.base_url:
+            return {'status': HEALTHY, 'message': 'Calibre-Web not configured'}
+        start = time.perf_counter()
+        reachable = client.health_check()
+        return {
+            'status': HEALTHY if reachable else DEGRADED,
+            'reachable': reachable,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def check_pool():
+        from .db_pool import get_pool_stats, pool_recommendation
+
+        with app.app_context():
+            stats = pool_status(db.engine)
+            usage = get_pool_stats(db.engine)
+        if stats is None:
+            return {'status': HEALTHY, 'message': 'Pool has no fixed capacity'}
+        saturated = stats['saturation'] is not None and stats['saturation'] >= threshold
+        result = {'status': DEGRADED if saturated else HEALTHY, **stats}
+        if usage is not None:
+            result['usage'] = usage
+            result['recommendation'] = pool_recommendation(
+                stats['pool_size'], stats['max_overflow'], usage['peak_checked_out'],
+                threads=app.config.get('SERVER_THREADS', 4), timeouts=usage['timeouts'],
+                connections_per_thread=2 if app.config.get('RATE_LIMIT_BACKEND', 'memory').lower() == 'database' else 1,
+                job_workers=app.config.get('JOB_WORKERS', 2))
+        return result
+
+    monitor.add_check('database', check_database)
+    monitor.add_check('storage', check_storage)
+    monitor.add_check('calibre', check_calibre, critical=False)
+    monitor.add_check('pool', check_pool, critical=False)
+
+    app.extensions['health_monitor'] = monitor
+    return monitor
@@ -0,0 +1,321 @@
+"""
+Background jobs for long admin operations.
+
+Course scans, upload extraction, thumbnail generation and maintenance scripts
+can take minutes. Run inline they pin a server thread and are cut off by
+proxy timeouts. JobRunner records each job in the admin_job table and runs it
+on a small thread pool; the endpoint returns 202 with the job id and the admin
+panel polls /api/admin/jobs/<id>.
+
+A job function takes a JobContext as its first argument and returns a
+JSON-serializable result:
+
+    def scan_job(job, courses_dir):
+        job.report(10, 'Listing folders')   # raises JobCancelled once cancelled
+        ...
+        return {'new': 3}
+
+    job_id = get_job_runner().submit('scan_courses', scan_job, courses_dir, user_id=current_user.id)
+
+Cancellation is cooperative: a queued job is dropped, a running one stops at
+its next report() call. A job whose inputs must not outlive it (an uploaded
+zip waiting to be extracted) is submitted with cleanup=, which runs however
+the job ends, including cancelled before it started. Progress is written
+through a separate connection so the job's own session can keep an open
+transaction (on SQLite, do not hold a write transaction across report() calls).
+
+Jobs left queued or running by a process that exited are marked failed when
+the runner starts.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .database import db
+from .models import AdminJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.report() once cancellation has been requested."""
+
+
+class JobContext:
+    """Handle passed to a job function for progress reports and cancellation checks."""
+
+    def __init__(self, runner, job_id, cancel_event):
+        self.runner = runner
+        self.id = job_id
+        self._cancel_event = cancel_event
+        self._last_write = 0.0
+        self._progress = 0
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def report(self, progress=None, message=None, force=False):
+        """
+        Record progress (0-100) and/or a status message.
+
+        Writes are throttled to one per JOB_PROGRESS_INTERVAL seconds; the
+        write also picks up cancellation requested from another process.
+        Raises JobCancelled once the job has been cancelled.
+        """
+        if progress is not None:
+            self._progress = max(0, min(100, int(progress)))
+        now = time.monotonic()
+        if force or now - self._last_write >= self.runner.progress_interval:
+            self._last_write = now
+            values = {'progress': self._progress}
+            if message is not None:
+                values['message'] = message[:512]
+            if self.runner._write(self.id, values, check_cancel=True):
+                self._cancel_event.set()
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobRunner:
+    """
+    Runs admin jobs on a thread pool and tracks them in the admin_job table.
+
+    Args:
+        app: Flask app (jobs run inside its app context)
+        workers: Pool threads (0 = run the job inline in submit())
+        progress_interval: Minimum seconds between progress writes per job
+    """
+
+    def __init__(self, app, workers=2, progress_interval=0.5):
+        self.app = app
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._futures = {}
+        self._cancel_events = {}
+
+    def _get_executor(self):
+        # Threads do not survive fork; each worker process gets its own pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='admin-job')
+                self._pid = os.getpid()
+                self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+                self._futures.clear()
+                self._cancel_events.clear()
+            return self._executor
+
+    def _write(self, job_id, values, check_cancel=False):
+        """Update a job row in its own transaction; optionally return its cancel_requested flag."""
+        with db.engine.begin() as conn:
+            conn.execute(db.update(AdminJob).where(AdminJob.id == job_id).values(**values))
+            if check_cancel:
+                return bool(conn.execute(
+                    db.select(AdminJob.cancel_requested).where(AdminJob.id == job_id)).scalar())
+        return None
+
+    def submit(self, kind, func, *args, user_id=None, cleanup=None):
+        """
+        Record a queued job and schedule func(job_context, *args). Returns the job id.
+
+        cleanup: Optional callable() run once the job is over: after func returns
+            or raises, or instead of func if the job is cancelled before it starts
+        """
+        job_id = uuid.uuid4().hex
+        db.session.add(AdminJob(id=job_id, kind=kind, status=QUEUED, created_by=user_id, worker=self.worker_id))
+        db.session.commit()
+
+        cancel_event = threading.Event()
+        if not self.workers:
+            self._execute(job_id, func, args, cancel_event, cleanup)
+            return job_id
+
+        executor = self._get_executor()
+        with self._lock:
+            self._cancel_events[job_id] = cancel_event
+            future = executor.submit(self._execute, job_id, func, args, cancel_event, cleanup)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._forget(job_id, cleanup if f.cancelled() else None))
+        return job_id
+
+    def _forget(self, job_id, cleanup=None):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+        if cleanup is not None:
+            # Cancelled in the pool queue: _execute never ran
+            _run_cleanup(job_id, cleanup)
+
+    def _execute(self, job_id, func, args, cancel_event, cleanup=None):
+        try:
+            self._run(job_id, func, args, cancel_event)
+        finally:
+            if cleanup is not None:
+                _run_cleanup(job_id, cleanup)
+
+    def _run(self, job_id, func, args, cancel_event):
+        with self.app.app_context():
+            if cancel_event.is_set() or self._write(job_id, {'status': RUNNING, 'started_at': datetime.utcnow(),
+                                                             'worker': self.worker_id}, check_cancel=True):
+                self._write(job_id, {'status': CANCELLED, 'finished_at': datetime.utcnow()})
+                return
+
+            job = JobContext(self, job_id, cancel_event)
+            start = time.perf_counter()
+            try:
+                result = func(job, *args)
+            except JobCancelled:
+                db.session.rollback()
+                values = {'status': CANCELLED, 'message': 'Cancelled'}
+            except Exception as e:
+                db.session.rollback()
+                logger.exception(f"Admin job {job_id} failed")
+                values = {'status': FAILED, 'error': str(e)}
+            else:
+                values = {'status': SUCCEEDED, 'progress': 100,
+                          'result': json.dumps(result) if result is not None else None}
+            finally:
+                db.session.remove()
+            values['finished_at'] = datetime.utcnow()
+            self._write(job_id, values)
+            logger.info(f"Admin job {job_id} {values['status']} in {time.perf_counter() - start:.1f}s")
+
+    def cancel(self, job_id):
+        """Request cancellation. Returns the updated AdminJob, or None if it does not exist."""
+        job = db.session.get(AdminJob, job_id)
+        if job is None or job.status in FINISHED:
+            return job
+
+        job.cancel_requested = True
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+            future = self._futures.get(job_id)
+        if event is not None:
+            event.set()
+        if future is not None and future.cancel():
+            # Never started: nothing will report back, so finish it here
+            job.status = CANCELLED
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return job
+
+    def get(self, job_id):
+        return db.session.get(AdminJob, job_id)
+
+    def recent(self, limit=20):
+        return AdminJob.query.order_by(AdminJob.created_at.desc()).limit(limit).all()
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (for scripts and tests). Returns the AdminJob."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.result(timeout=timeout)
+        db.session.expire_all()
+        return db.session.get(AdminJob, job_id)
+
+    def reap_orphans(self, retention_days=30):
+        """
+        Mark jobs left queued/running by exited processes on this host as failed,
+        and delete finished jobs older than retention_days.
+        """
+        hostname = socket.gethostname()
+        stale = AdminJob.query.filter(AdminJob.status.in_((QUEUED, RUNNING)),
+                                      AdminJob.worker.like(f"{hostname}:%")).all()
+        reaped = 0
+        for job in stale:
+            pid = int(job.worker.rsplit(':', 1)[1])
+            # Our own pid without a future is a previous container run that got the same pid
+            if job.id in self._futures or (pid != os.getpid() and _pid_alive(pid)):
+                continue
+            reaped += 1
+            job.status = FAILED
+            job.error = 'Interrupted: the server process running this job exited'
+            job.finished_at = datetime.utcnow()
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        db.session.execute(db.delete(AdminJob).where(AdminJob.status.in_(FINISHED), AdminJob.created_at < cutoff))
+        db.session.commit()
+        return reaped
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _run_cleanup(job_id, cleanup):
+    try:
+        cleanup()
+    except Exception:
+        logger.exception(f"Cleanup of admin job {job_id} failed")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# Singleton instance
+_job_runner: Optional[JobRunner] = None
+
+
+def get_job_runner() -> JobRunner:
+    """Get the global JobRunner (init_job_runner() must have run)."""
+    if _job_runner is None:
+        raise RuntimeError("Job runner not initialized; call init_job_runner(app)")
+    return _job_runner
+
+
+def init_job_runner(app) -> JobRunner:
+    """
+    Configure the global JobRunner from app config.
+
+    Config:
+        JOB_WORKERS: Threads running admin jobs per process (0 = inline)
+        JOB_PROGRESS_INTERVAL: Minimum seconds between progress writes
+        JOB_RETENTION_DAYS: Finished jobs older than this are deleted at startup
+    """
+    global _job_runner
+    if _job_runner is not None:
+        _job_runner.shutdown()
+    _job_runner = JobRunner(
+        app,
+        workers=app.config.get('JOB_WORKERS', 2),
+        progress_interval=app.config.get('JOB_PROGRESS_INTERVAL', 0.5),
+    )
+    with app.app_context():
+        try:
+            reaped = _job_runner.reap_orphans(app.config.get('JOB_RETENTION_DAYS', 30))
+            if reaped:
+                logger.warning(f"Marked {reaped} interrupted admin jobs as failed")
+        except SQLAlchemyError:
+            # Tables not created yet (fresh database before init_database.py)
+            db.session.rollback()
+    return _job_runner
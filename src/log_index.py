@@ -0,0 +1,247 @@
+"""
+Optional sidecar index for app.log (LOG_INDEX_ENABLED).
+
+IndexedFileHandler writes log lines like the normal daily-rotating handler and
+also records (file, byte offset, request_id, user_id, event, minute) rows in a
+small SQLite database next to the logs. The admin log viewer looks up a
+request_id or user_id there and seeks straight to the matching lines across
+all retained files instead of scanning them.
+
+Rows are inserted in batches (every INDEX_BATCH_SIZE records or
+INDEX_FLUSH_SECONDS), so the last second of logs may not be indexed yet.
+Offsets are verified when read, and a stale entry is skipped rather than
+returning the wrong line.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from logging.handlers import TimedRotatingFileHandler
+from pathlib import Path
+
+from .log_reader import LEVELS, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'app.log.index.sqlite'
+INDEX_BATCH_SIZE = 200
+INDEX_FLUSH_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_index (
+    file TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    minute INTEGER,
+    event TEXT,
+    level TEXT,
+    request_id TEXT,
+    user_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_log_index_request_id ON log_index (request_id);
+CREATE INDEX IF NOT EXISTS ix_log_index_user_id ON log_index (user_id);
+CREATE INDEX IF NOT EXISTS ix_log_index_event_minute ON log_index (event, minute);
+CREATE INDEX IF NOT EXISTS ix_log_index_file ON log_index (file);
+"""
+
+
+class LogIndex:
+    """SQLite-backed map from request_id / user_id / event / minute to log file offsets."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.time()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(_SCHEMA)
+
+    def add(self, file_name, offset, record):
+        """Queue one structured record for indexing."""
+        timestamp = parse_timestamp(record.get('timestamp'))
+        user_id = record.get('user_id')
+        row = (
+            file_name,
+            offset,
+            int(timestamp.timestamp() // 60) if timestamp else None,
+            record.get('event'),
+            record.get('level'),
+            record.get('request_id'),
+            user_id if isinstance(user_id, int) else None,
+        )
+        with self._lock:
+            self._pending.append(row)
+            due = len(self._pending) >= INDEX_BATCH_SIZE or time.time() - self._last_flush >= INDEX_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write queued rows in one transaction."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            self._last_flush = time.time()
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO log_index (file, offset, minute, event, level, request_id, user_id) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def rename_file(self, old_name, new_name):
+        """Point entries at a file's rotated name."""
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE log_index SET file = ? WHERE file = ?', (new_name, old_name))
+
+    def drop_missing_files(self, log_dir):
+        """Delete entries for files removed by retention."""
+        with self._lock, self._conn:
+            files = [row[0] for row in self._conn.execute('SELECT DISTINCT file FROM log_index')]
+            for name in files:
+                if not (Path(log_dir) / name).exists():
+                    self._conn.execute('DELETE FROM log_index WHERE file = ?', (name,))
+
+    def lookup(self, request_id=None, user_id=None, event=None, since=None, until=None, level=None,
+               before=None, limit=50):
+        """
+        Return [(file, offset, rowid), ...] newest first for the given criteria.
+
+        user_id also matches every line of that user's requests, not just the
+        lines that carried user_id themselves (request_received, login events).
+        level is a minimum level as in LogFilter. Pass the rowid of the last
+        entry of a page as `before` to continue with older entries.
+        """
+        self.flush()
+        clauses, params = [], []
+        if before is not None:
+            clauses.append('rowid < ?')
+            params.append(before)
+        if level:
+            accepted = [name for name, value in LEVELS.items() if value >= LEVELS[level.lower()]]
+            clauses.append(f"lower(level) IN ({', '.join('?' * len(accepted))})")
+            params.extend(accepted)
+        if request_id:
+            clauses.append('request_id = ?')
+            params.append(request_id)
+        if user_id is not None:
+            clauses.append('(user_id = ? OR request_id IN '
+                           '(SELECT request_id FROM log_index WHERE user_id = ? AND request_id IS NOT NULL))')
+            params.extend([user_id, user_id])
+        if event:
+            clauses.append('event = ?')
+            params.append(event)
+        if since:
+            clauses.append('minute >= ?')
+            params.append(int(since.timestamp() // 60))
+        if until:
+            clauses.append('minute <= ?')
+            params.append(int(until.timestamp() // 60))
+
+        where = ' AND '.join(clauses) or '1 = 1'
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT file, offset, rowid FROM log_index WHERE {where} ORDER BY rowid DESC LIMIT ?',
+                (*params, limit)).fetchall()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+def read_indexed_lines(log_dir, entries, needle=None):
+    """
+    Read the lines at the given (file, offset, ...) entries, opening each file once.
+
+    Entries whose line no longer contains `needle` (e.g. offsets shifted by
+    another writer) are skipped. Returns lines in the order of `entries`.
+    """
+    by_file = {}
+    for position, (file_name, offset, *_) in enumerate(entries):
+        by_file.setdefault(file_name, []).append((position, offset))
+
+    lines = {}
+    needle = needle.encode() if needle else None
+    for file_name, positions in by_file.items():
+        path = Path(log_dir) / file_name
+        try:
+            with open(path, 'rb') as f:
+                for position, offset in sorted(positions, key=lambda item: item[1]):
+                    f.seek(offset)
+                    line = f.readline().rstrip(b'\n')
+                    if needle is None or needle in line:
+                        lines[position] = line.decode('utf-8', errors='replace')
+        except OSError:
+            continue
+    return [lines[position] for position in sorted(lines)]
+
+
+class IndexedFileHandler(TimedRotatingFileHandler):
+    """
+    Daily-rotating file handler that also indexes each JSON line it writes.
+
+    The offset of a line is taken from the stream position after the write,
+    so it stays correct with O_APPEND even when other processes append too
+    (a line interleaved by another writer is caught by read-time verification).
+    """
+
+    def __init__(self, filename, index, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.index = index
+
+    def emit(self, record):
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            message = self.format(record)
+            if self.stream is None:
+                self.stream = self._open()
+            data = message + self.terminator
+            self.stream.write(data)
+            self.stream.flush()
+            end = self.stream.tell()
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            parsed = json.loads(message)
+        except ValueError:
+            return  # Plain-text lines (stdlib loggers) are not indexed
+        if isinstance(parsed, dict):
+            try:
+                self.index.add(os.path.basename(self.baseFilename), end - len(data.encode(self.encoding or 'utf-8')),
+                               parsed)
+            except sqlite3.Error as e:
+                logger.debug(f"Log index write failed: {e}")
+
+    def rotate(self, source, dest):
+        super().rotate(source, dest)
+        try:
+            self.index.rename_file(os.path.basename(source), os.path.basename(dest))
+        except sqlite3.Error as e:
+            logger.debug(f"Log index rename failed: {e}")
+
+    def doRollover(self):
+        super().doRollover()
+        try:
+            self.index.drop_missing_files(os.path.dirname(self.baseFilename))
+        except sqlite3.Error as e:
+            logger.debug(f"Log index cleanup failed: {e}")
+
+    def flush(self):
+        super().flush()
+        try:
+            self.index.flush()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        super().close()
+        try:
+            self.index.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,186 @@
+"""
+Tail-seeking reader for the JSON application log.
+
+Reads app.log backwards in fixed-size blocks from the end (or from a cursor),
+so the admin log viewer uses constant memory however large the file gets.
+Filters are evaluated line by line while streaming; lines that cannot match
+are rejected by a substring check before any JSON parsing.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Bytes read per seek; one block plus one partial line is the memory ceiling
+BLOCK_SIZE = 64 * 1024
+
+# Stop scanning after this many bytes per page and hand back a cursor instead
+DEFAULT_MAX_SCAN_BYTES = 64 * 1024 * 1024
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'critical': 50}
+
+
+def read_lines_reverse(path, end_offset=None, block_size=BLOCK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (line_start_offset, line) pairs from end_offset (default: EOF) backwards.
+
+    Lines are returned without the trailing newline. Only one block and one
+    partial line are held in memory at a time.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell() if end_offset is None else min(end_offset, f.tell())
+        remainder = b''
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+
+            lines = block.split(b'\n')
+            # The first piece may continue in the previous block
+            remainder = lines.pop(0)
+            offset = position + len(remainder) + 1
+            line_offsets = []
+            for line in lines:
+                line_offsets.append((offset, line))
+                offset += len(line) + 1
+            for line_offset, line in reversed(line_offsets):
+                if line:
+                    yield line_offset, line
+
+        if remainder:
+            yield 0, remainder
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp (as written by structlog's TimeStamper) into aware UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class LogFilter:
+    """
+    Server-side filter for structured log lines.
+
+    Args:
+        level: Minimum level ('warning' also returns error and critical)
+        event: Exact event name (e.g. 'request_completed')
+        request_id: Exact request_id
+        user_id: Lines that carry this user_id (request_received, login events)
+        since / until: Datetime bounds (inclusive)
+    """
+
+    def __init__(self, level=None, event=None, request_id=None, user_id=None, since=None, until=None):
+        if level is not None and level.lower() not in LEVELS:
+            raise ValueError(f"Invalid level '{level}'. Must be one of: {', '.join(LEVELS)}")
+        self.min_level = LEVELS[level.lower()] if level else None
+        self.event = event
+        self.request_id = request_id
+        self.user_id = user_id
+        self.since = since
+        self.until = until
+        # Cheap pre-checks on the raw bytes before json.loads
+        self._needles = [json.dumps(v).encode() for v in (event, request_id) if v]
+
+    @property
+    def is_empty(self):
+        return not (self.min_level or self.event or self.request_id or self.user_id is not None
+                    or self.since or self.until)
+
+    def matches(self, line: bytes) -> Tuple[bool, Optional[dict]]:
+        """Return (matched, parsed_record). parsed_record is None for plain-text lines."""
+        if self.is_empty:
+            return True, None
+        if any(needle not in line for needle in self._needles):
+            return False, None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return False, None
+        if not isinstance(record, dict):
+            return False, None
+
+        if self.min_level and LEVELS.get(str(record.get('level', '')).lower(), 0) < self.min_level:
+            return False, record
+        if self.event and record.get('event') != self.event:
+            return False, record
+        if self.request_id and record.get('request_id') != self.request_id:
+            return False, record
+        if self.user_id is not None and record.get('user_id') != self.user_id:
+            return False, record
+        if self.since or self.until:
+            timestamp = parse_timestamp(record.get('timestamp'))
+            if timestamp is None:
+                return False, record
+            if self.since and timestamp < self.since:
+                return False, record
+            if self.until and timestamp > self.until:
+                return False, record
+        return True, record
+
+
+class LogPage(NamedTuple):
+    lines: List[str]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(path, offset) -> str:
+    """Cursor = '<inode>:<offset>' so a rotated file invalidates old cursors."""
+    return f"{os.stat(path).st_ino}:{offset}"
+
+
+def decode_cursor(path, cursor) -> int:
+    """Return the byte offset for a cursor, or raise ValueError if it is stale or malformed."""
+    try:
+        inode, offset = (int(part) for part in cursor.split(':', 1))
+    except (ValueError, AttributeError):
+        raise ValueError("Invalid cursor")
+    if inode != os.stat(path).st_ino:
+        raise ValueError("Log file was rotated; cursor expired")
+    return offset
+
+
+def read_log_page(path, log_filter=None, limit=50, cursor=None,
+                  max_scan_bytes=DEFAULT_MAX_SCAN_BYTES) -> LogPage:
+    """
+    Return up to `limit` matching lines, newest first, plus a cursor for older lines.
+
+    The scan stops early at the first line older than log_filter.since (the file
+    is chronological), and after max_scan_bytes so one sparse query cannot pin a
+    worker; in that case next_cursor resumes where the scan stopped.
+    """
+    log_filter = log_filter or LogFilter()
+    end_offset = decode_cursor(path, cursor) if cursor else None
+
+    lines = []
+    scanned = 0
+    last_offset = None
+    for offset, line in read_lines_reverse(path, end_offset):
+        last_offset = offset
+        scanned += len(line) + 1
+
+        matched, record = log_filter.matches(line)
+        if matched:
+            lines.append(line.decode('utf-8', errors='replace'))
+            if len(lines) >= limit:
+                break
+        elif record is not None and log_filter.since:
+            timestamp = parse_timestamp(record.get('timestamp'))
+            if timestamp is not None and timestamp < log_filter.since:
+                return LogPage(lines, None)
+
+        if scanned >= max_scan_bytes:
+            break
+    else:
+        return LogPage(lines, None)
+
+    next_cursor = encode_cursor(path, last_offset) if last_offset else None
+    return LogPage(lines, next_cursor)
@@ -0,0 +1,384 @@
+"""
+In-process metrics registry for GLEH.
+
+Counters, gauges and fixed-bucket histograms recorded by the request hooks,
+SQLAlchemy engine events and the Calibre-Web client, exposed in Prometheus
+text format at /metrics.
+
+Each metric holds its own lock, so recording only contends with other updates
+of the same metric. With several worker processes, set METRICS_MULTIPROC_DIR:
+every process periodically writes its values to <dir>/gleh_<pid>.json and
+/metrics merges all files (counters and histograms are summed, gauges are
+summed or maxed over live processes).
+"""
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds (5ms .. 10s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """Base class: a named family of samples keyed by label values."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down. multiprocess_mode is 'sum' or 'max'."""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), multiprocess_mode='sum'):
+        super().__init__(name, documentation, labelnames)
+        if multiprocess_mode not in ('sum', 'max'):
+            raise ValueError(f"Invalid multiprocess_mode '{multiprocess_mode}'. Must be 'sum' or 'max'")
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; each sample is [bucket counts..., +Inf count, sum]."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), list(counts)] for key, counts in self._values.items()]
+
+    def get_count(self, **labels):
+        counts = self._values.get(self._key(labels))
+        return sum(counts[:-1]) if counts else 0
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics with optional file-backed multi-process aggregation.
+
+    Args:
+        multiprocess_dir: Directory shared by all workers, or None for single-process
+        flush_interval: Minimum seconds between snapshot writes from maybe_flush()
+    """
+
+    def __init__(self, multiprocess_dir=None, flush_interval=5.0):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir = None
+        self.flush_interval = flush_interval
+        self._last_flush = 0.0
+        self.configure(multiprocess_dir, flush_interval)
+
+    def configure(self, multiprocess_dir=None, flush_interval=5.0):
+        """Enable or disable multi-process mode (called once at app startup)."""
+        self.multiprocess_dir = Path(multiprocess_dir) if multiprocess_dir else None
+        self.flush_interval = flush_interval
+        if self.multiprocess_dir is not None:
+            self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), multiprocess_mode='sum'):
+        return self._register(Gauge, name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def reset(self):
+        """Clear all recorded values (tests)."""
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    # --- Snapshots -----------------------------------------------------------
+
+    def snapshot(self):
+        """Return this process's values as a JSON-serializable dict."""
+        data = {}
+        for name, metric in list(self._metrics.items()):
+            entry = {
+                'type': metric.type,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'samples': metric.samples(),
+            }
+            if metric.type == 'histogram':
+                entry['buckets'] = list(metric.buckets)
+            if metric.type == 'gauge':
+                entry['multiprocess_mode'] = metric.multiprocess_mode
+            data[name] = entry
+        return data
+
+    def _snapshot_path(self, pid=None):
+        return self.multiprocess_dir / f'gleh_{pid or os.getpid()}.json'
+
+    def flush(self):
+        """Write this process's snapshot atomically (multi-process mode only)."""
+        if self.multiprocess_dir is None:
+            return
+        path = self._snapshot_path()
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            tmp_path.write_text(json.dumps(self.snapshot()), encoding='utf-8')
+            os.replace(tmp_path, path)
+            self._last_flush = time.time()
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot {path}: {e}")
+
+    def maybe_flush(self):
+        """Flush if flush_interval has passed; cheap to call on every request."""
+        if self.multiprocess_dir is not None and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """Return values merged across all worker processes."""
+        if self.multiprocess_dir is None:
+            return self.snapshot()
+
+        self.flush()
+        merged = {}
+        for path in sorted(self.multiprocess_dir.glob('gleh_*.json')):
+            try:
+                snapshot = json.loads(path.read_text(encoding='utf-8'))
+                pid = int(path.stem.split('_', 1)[1])
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable metrics snapshot {path}: {e}")
+                continue
+            _merge_snapshot(merged, snapshot, live=_pid_alive(pid))
+        return merged
+
+    def render(self):
+        """Render merged values in Prometheus text exposition format 0.0.4."""
+        lines = []
+        for name, entry in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {_escape_help(entry['help'])}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            labelnames = entry['labelnames']
+            for labels, value in entry['samples']:
+                pairs = list(zip(labelnames, labels))
+                if entry['type'] != 'histogram':
+                    lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(entry['buckets'] + [math.inf], value[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_format_labels(pairs)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _merge_snapshot(merged, snapshot, live=True):
+    """Fold one process's snapshot into the merged view."""
+    for name, entry in snapshot.items():
+        target = merged.setdefault(name, {**entry, 'samples': []})
+        if entry['type'] == 'gauge' and not live:
+            continue  # A dead worker's gauges (in-flight, pool size, ...) no longer apply
+
+        index = {tuple(sample[0]): sample for sample in target['samples']}
+        for labels, value in entry['samples']:
+            existing = index.get(tuple(labels))
+            if existing is None:
+                sample = [labels, list(value) if isinstance(value, list) else value]
+                target['samples'].append(sample)
+                index[tuple(labels)] = sample
+            elif entry['type'] == 'histogram':
+                existing[1] = [a + b for a, b in zip(existing[1], value)]
+            elif entry['type'] == 'gauge' and entry.get('multiprocess_mode') == 'max':
+                existing[1] = max(existing[1], value)
+            else:
+                existing[1] += value
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape_help(text):
+    return text.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+# ===========================
+# GLEH METRICS
+# ===========================
+
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'gleh_http_requests_total', 'HTTP responses by endpoint and status', ('method', 'endpoint', 'status'))
+http_request_duration_seconds = registry.histogram(
+    'gleh_http_request_duration_seconds', 'Request handling latency', ('method', 'endpoint'))
+db_queries_total = registry.counter(
+    'gleh_db_queries_total', 'SQL statements executed')
+db_query_duration_seconds = registry.histogram(
+    'gleh_db_query_duration_seconds', 'SQL statement latency')
+db_queries_per_request = registry.histogram(
+    'gleh_db_queries_per_request', 'SQL statements per request', ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+db_pool_checkout_wait_seconds = registry.histogram(
+    'gleh_db_pool_checkout_wait_seconds', 'Time waiting for a pooled connection (includes new connects)',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+db_pool_pre_ping_seconds = registry.histogram(
+    'gleh_db_pool_pre_ping_seconds', 'Pre-ping and checkout listener time per checkout',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+db_pool_checked_out = registry.gauge(
+    'gleh_db_pool_checked_out', 'Connections currently checked out of the pool')
+db_pool_overflow = registry.gauge(
+    'gleh_db_pool_overflow', 'Connections open beyond pool_size')
+db_pool_events_total = registry.counter(
+    'gleh_db_pool_events_total', 'Pool invalidations and checkout timeouts', ('event',))
+calibre_request_duration_seconds = registry.histogram(
+    'gleh_calibre_request_duration_seconds', 'Calibre-Web upstream latency', ('operation', 'status'))
+cache_requests_total = registry.counter(
+    'gleh_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+
+# Write the final snapshot so counters from exiting workers are not lost
+atexit.register(registry.flush)
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup; the hit ratio is hit / (hit + miss) per cache."""
+    cache_requests_total.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def init_metrics(app):
+    """
+    Configure the registry from METRICS_* config and install request hooks.
+
+    Records per-endpoint latency and status counts and HTTP conditional-request
+    cache hits (304s). SQL statement metrics are recorded by query_stats.
+    """
+    registry.configure(
+        multiprocess_dir=app.config.get('METRICS_MULTIPROC_DIR'),
+        flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 5),
+    )
+
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record_request(response):
+        start = g.get('metrics_start')
+        if start is not None:
+            endpoint = request.endpoint or 'unmatched'
+            http_requests_total.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+            http_request_duration_seconds.observe(
+                time.perf_counter() - start, method=request.method, endpoint=endpoint)
+            if request.if_none_match or request.if_modified_since:
+                record_cache('http_conditional', response.status_code == 304)
+        registry.maybe_flush()
+        return response
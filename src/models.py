@@ -1,6 +1,6 @@
 from .database import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import get_password_hasher
 from datetime import datetime
 import json
 
@@ -22,12 +22,16 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, password):
-        """Hashes the provided password and stores it."""
-        self.password_hash = generate_password_hash(password)
+        """Hashes the provided password and stores it (off-thread; may raise PasswordHasherBusy)."""
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password):
-        """Checks if the provided password matches the stored hash."""
-        return check_password_hash(self.password_hash, password)
+        """Checks if the provided password matches the stored hash (may raise PasswordHasherBusy)."""
+        return get_password_hasher().verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """True if the stored hash predates the current PASSWORD_HASH_METHOD."""
+        return get_password_hasher().needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -250,3 +254,108 @@ class LayoutSettings(db.Model):
 
     def __repr__(self):
         return f'<LayoutSettings {self.name}>'
+
+class RateLimitBucket(db.Model):
+    """
+    Shared token bucket for the database rate limit backend.
+    One row per rate limit key (e.g. 'auth:10.0.0.1'), read and written by primary key.
+    """
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # Unix timestamp of last refill
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key} tokens={self.tokens:.2f}>'
+
+class CourseScanState(db.Model):
+    """
+    Fingerprint of a course folder as of the last scan (see course_indexer.py).
+    A rescan re-reads a course's data.json only when these values change.
+    """
+    uid = db.Column(db.String(255), primary_key=True)  # Course folder name
+    dir_mtime_ns = db.Column(db.BigInteger, nullable=False)
+    has_index = db.Column(db.Boolean, nullable=False, default=False)
+    data_mtime_ns = db.Column(db.BigInteger)  # None when the folder has no data.json
+    data_size = db.Column(db.BigInteger)
+    data_hash = db.Column(db.String(64))  # sha256 of data.json
+    scanned_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CourseScanState {self.uid}>'
+
+class CourseManifest(db.Model):
+    """
+    Files of a course folder as of the last scan that rebuilt it (see course_manifest.py).
+    data is the zlib-compressed JSON from Manifest.encode(); files and bytes are kept for listing.
+    """
+    uid = db.Column(db.String(255), primary_key=True)  # Course folder name
+    files = db.Column(db.Integer, nullable=False, default=0)
+    bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CourseManifest {self.uid} ({self.files} files)>'
+
+class AdminJob(db.Model):
+    """
+    A long-running admin operation (course scan, upload extraction, script run)
+    executed in the background by jobs.py. Polled via /api/admin/jobs/<id>.
+    """
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    kind = db.Column(db.String(64), nullable=False)  # e.g. 'scan_courses'
+    status = db.Column(db.String(16), nullable=False, default='queued', index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0-100
+    message = db.Column(db.String(512))
+    result = db.Column(db.Text)  # JSON returned by the job function
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_by = db.Column(db.Integer)  # User id; not a foreign key so deleting a user keeps its job history
+    worker = db.Column(db.String(128))  # "<hostname>:<pid>" of the process that runs the job
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f'<AdminJob {self.id} {self.kind} {self.status}>'
+
+class CourseUpload(db.Model):
+    """
+    A resumable chunked course upload in progress (see course_uploads.py).
+    The bytes received so far are <courses_dir>/.uploads/<id>.part; its size is the resume offset.
+    """
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    filename = db.Column(db.String(255), nullable=False)  # secure_filename() of the client's name
+    size = db.Column(db.BigInteger, nullable=False)  # Declared total size in bytes
+    sha256 = db.Column(db.String(64))  # Optional whole-file checksum, verified on completion
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def to_dict(self, offset=None):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': offset,
+            'sha256': self.sha256,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<CourseUpload {self.id} {self.filename}>'
@@ -0,0 +1,231 @@
+"""
+Password hashing off the request threads.
+
+scrypt is deliberately slow (~50ms of CPU per hash). Run inline, a login burst
+occupies every server thread and even /health times out. PasswordHasher runs
+werkzeug's generate/check functions in a small process pool instead, and caps
+the number of hashes queued or running. Past that cap a request fails fast
+with PasswordHasherBusy (HTTP 503) instead of queueing behind the burst.
+
+Every admitted hash holds a request thread while it waits, so the cap is kept
+below the server's thread count (request_threads - 1): however long the queue,
+one thread per process stays free for /health and ordinary pages. A slot is
+only freed when its hash actually finishes, even if the waiting request gave
+up, so the pool is never handed more work than it can run.
+
+PASSWORD_HASH_METHOD sets the hash parameters. Hashes stored with other
+parameters still verify, and login rehashes them (see needs_rehash()).
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+# Passwords per task in hash_many(); small enough that logins interleave between chunks
+HASH_CHUNK_SIZE = 16
+
+
+def _hash_chunk(passwords, method):
+    return [generate_password_hash(password, method) for password in passwords]
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing pool is saturated or a hash did not finish in time; retry later."""
+
+
+def canonical_method(method):
+    """
+    Expand a werkzeug method string to the prefix it writes into stored hashes.
+
+    'scrypt' -> 'scrypt:32768:8:1', 'pbkdf2' -> 'pbkdf2:sha256:<default iterations>'.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args + ['32768', '8', '1'][len(args):]
+        return f"scrypt:{int(n)}:{int(r)}:{int(p)}"
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Invalid PASSWORD_HASH_METHOD '{method}'. Must start with 'scrypt' or 'pbkdf2'")
+
+
+class PasswordHasher:
+    """
+    Bounded process pool for password hashing and verification.
+
+    Args:
+        method: werkzeug hash method, e.g. 'scrypt:32768:8:1'
+        workers: Pool processes (0 = hash inline on the calling thread)
+        max_queue: Hashes allowed to wait for a free process before rejecting
+        timeout: Seconds to wait for a result before giving up
+        request_threads: Server threads per process; hashes admitted at once
+            are capped at request_threads - 1 (None = no cap)
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_queue=1, timeout=2.0, request_threads=None):
+        self.method = canonical_method(method)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.capacity = workers + max_queue
+        if request_threads:
+            self.capacity = min(self.capacity, max(1, request_threads - 1))
+        self._slots = threading.BoundedSemaphore(self.capacity) if workers else None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.rejected = 0
+        self.in_flight = 0
+
+    def _get_executor(self):
+        # A pool created before fork belongs to the parent; each worker process gets its own
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot is held until the hash finishes, not until this request stops waiting:
+        # a hash already running keeps its process busy after a timeout
+        future.add_done_callback(self._finished)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()  # Only drops it if it has not started yet
+            raise PasswordHasherBusy(f"Password hashing took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # A worker died (OOM kill); start a new pool on the next call
+            logger.warning("Password hashing pool broken; restarting")
+            with self._lock:
+                self._executor = None
+            raise PasswordHasherBusy("Password hashing pool restarted")
+
+    def _finished(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords):
+        """
+        Hash a batch in parallel across the pool's processes, preserving order.
+
+        At most one chunk per process is queued at a time, so login hashes
+        submitted meanwhile are not stuck behind the whole batch. Takes one
+        slot of the queue limit.
+        """
+        passwords = list(passwords)
+        if not self.workers:
+            return _hash_chunk(passwords, self.method)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        try:
+            executor = self._get_executor()
+            hashes, pending = [], deque()
+            chunks = [passwords[i:i + HASH_CHUNK_SIZE] for i in range(0, len(passwords), HASH_CHUNK_SIZE)]
+            for chunk in chunks + [None] * self.workers:
+                if pending and (chunk is None or len(pending) >= self.workers):
+                    hashes.extend(pending.popleft().result())
+                if chunk is not None:
+                    pending.append(executor.submit(_hash_chunk, chunk, self.method))
+            return hashes
+        except BrokenProcessPool:
+            logger.warning("Password hashing pool broken; restarting")
+            with self._lock:
+                self._executor = None
+            raise PasswordHasherBusy("Password hashing pool restarted")
+        finally:
+            self._slots.release()
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the stored hash was made with different parameters than PASSWORD_HASH_METHOD."""
+        return bool(password_hash) and password_hash.split('$', 1)[0] != self.method
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'method': self.method.split(':', 1)[0],
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'capacity': self.capacity if self.workers else None,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+_password_hasher: Optional[PasswordHasher] = None
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Get the global PasswordHasher (inline hashing until init_password_hasher() runs)."""
+    global _password_hasher
+    if _password_hasher is None:
+        _password_hasher = PasswordHasher(workers=0)
+    return _password_hasher
+
+
+def init_password_hasher(app) -> PasswordHasher:
+    """
+    Configure the global PasswordHasher from app config.
+
+    Config:
+        PASSWORD_HASH_METHOD: werkzeug method string (default 'scrypt')
+        PASSWORD_HASH_WORKERS: Pool processes (0 = inline)
+        PASSWORD_HASH_MAX_QUEUE: Hashes allowed to wait before returning 503
+        PASSWORD_HASH_TIMEOUT: Seconds before a waiting request gives up
+        SERVER_THREADS: Admitted hashes stay below this, leaving a thread for other requests
+    """
+    global _password_hasher
+    if _password_hasher is not None:
+        _password_hasher.shutdown()
+    _password_hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 1),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 2.0),
+        request_threads=app.config.get('SERVER_THREADS', 4),
+    )
+    return _password_hasher
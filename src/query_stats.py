@@ -0,0 +1,149 @@
+"""
+SQL query accounting for GLEH.
+
+SQLAlchemy engine events count statements and DB time for the current request
+(attached to the request_completed log event and /metrics) and log any
+statement slower than DB_SLOW_QUERY_MS with its parameters redacted.
+
+assert_max_queries() lets tests pin a query budget for a block of code, so
+N+1 regressions (see the lazy='joined' relationships in models.py) fail CI.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import db_queries_total, db_query_duration_seconds, db_queries_per_request
+
+logger = logging.getLogger(__name__)
+
+# Statements longer than this are truncated in slow_query log events
+MAX_LOGGED_STATEMENT_LENGTH = 1000
+
+# Per-request counters; None outside a request (CLI scripts, background jobs)
+_current_stats = ContextVar('gleh_query_stats', default=None)
+
+# Set by init_query_stats(); None disables slow-query logging
+_slow_query_seconds = None
+
+
+class QueryStats:
+    """Statement count and total DB time for one request."""
+
+    __slots__ = ('count', 'duration')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    @property
+    def duration_ms(self):
+        return round(self.duration * 1000, 2)
+
+
+def get_request_query_stats():
+    """Return the current request's QueryStats, or None outside a request."""
+    return _current_stats.get()
+
+
+def redact_parameters(parameters):
+    """Replace bound values with their type names so no user data reaches the logs."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_parameters(value) if isinstance(value, (dict, list, tuple)) else type(value).__name__
+                for value in parameters]
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    db_queries_total.inc()
+    db_query_duration_seconds.observe(elapsed)
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += elapsed
+
+    if _slow_query_seconds is not None and elapsed >= _slow_query_seconds:
+        logger.warning(
+            "slow_query duration_ms=%.2f statement=%r parameters=%r",
+            elapsed * 1000,
+            statement[:MAX_LOGGED_STATEMENT_LENGTH],
+            redact_parameters(parameters),
+        )
+
+
+def init_query_stats(app):
+    """
+    Install engine listeners and per-request hooks.
+
+    Config:
+        DB_SLOW_QUERY_MS: Log statements at or above this duration (0 disables)
+    """
+    global _slow_query_seconds
+    slow_ms = app.config.get('DB_SLOW_QUERY_MS', 500)
+    _slow_query_seconds = slow_ms / 1000 if slow_ms else None
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    from flask import request
+
+    @app.before_request
+    def _start_query_stats():
+        _current_stats.set(QueryStats())
+
+    @app.after_request
+    def _record_query_stats(response):
+        stats = _current_stats.get()
+        if stats is not None:
+            db_queries_per_request.observe(stats.count, endpoint=request.endpoint or 'unmatched')
+        return response
+
+    # after_request_logging() reads the stats for request_completed before teardown
+    @app.teardown_request
+    def _clear_query_stats(exc=None):
+        _current_stats.set(None)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fail if the block executes more than `limit` SQL statements.
+
+    Counts statements on every engine and thread, so it also covers requests
+    made through the Flask test client. Yields the list of statements seen.
+
+    Usage:
+        with assert_max_queries(3):
+            client.get('/api/content')
+    """
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, 'after_cursor_execute', _count)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'after_cursor_execute', _count)
+
+    assert len(statements) <= limit, (
+        f"Expected at most {limit} queries, got {len(statements)}:\n" + '\n'.join(statements)
+    )
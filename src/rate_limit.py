@@ -0,0 +1,431 @@
+"""
+Rate Limiting Backends for GLEH
+
+Provides token-bucket rate limiting with pluggable storage so limits hold
+under waitress threads and across multiple worker processes.
+
+Backends:
+    memory:   In-process buckets with LRU eviction and a lock (single worker)
+    database: Buckets stored in the rate_limit_bucket table (multi-worker)
+
+Both backends answer each check with O(1) work: one dictionary lookup for
+the memory backend, one primary-key read/write for the database backend.
+
+Usage:
+    from .rate_limit import create_rate_limiter, rate_limit
+
+    limiter = create_rate_limiter(app)
+    result = limiter.hit('auth:10.0.0.1', limit=5, period=60)
+    if not result.allowed:
+        return jsonify({'error': 'Too many attempts'}), 429
+
+    # Per-route limits keyed by user id (or IP for anonymous requests)
+    @app.route('/api/content')
+    @rate_limit('content')
+    def get_content():
+        ...
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import NamedTuple, Optional, Callable, Tuple
+
+from flask import current_app, request, jsonify, make_response, g
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a single rate limit check."""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # Seconds until the next request would be allowed
+    reset_after: float  # Seconds until the bucket is completely full again
+
+
+def _refill(tokens, updated_at, now, limit, period):
+    """Return the token count after refilling a bucket up to ``now``."""
+    rate = limit / period
+    elapsed = max(0.0, now - updated_at)
+    return min(float(limit), tokens + elapsed * rate)
+
+
+def _result(tokens, limit, period, allowed):
+    """Build a RateLimitResult for a bucket holding ``tokens``."""
+    rate = limit / period
+    return RateLimitResult(
+        allowed=allowed,
+        limit=limit,
+        remaining=int(math.floor(tokens)),
+        retry_after=0.0 if allowed else (1.0 - tokens) / rate,
+        reset_after=(limit - tokens) / rate,
+    )
+
+
+def _consume(tokens, limit, period):
+    """
+    Try to take one token from a bucket that has already been refilled.
+
+    Returns:
+        (tokens_after, RateLimitResult)
+    """
+    if tokens >= 1.0:
+        tokens -= 1.0
+        return tokens, _result(tokens, limit, period, allowed=True)
+    return tokens, _result(tokens, limit, period, allowed=False)
+
+
+class RateLimitBackend:
+    """
+    Base class for token-bucket rate limit storage.
+
+    Each key owns a bucket holding up to ``limit`` tokens that refills at
+    ``limit / period`` tokens per second. A request consumes one token.
+    """
+
+    def __init__(self, clock: Optional[Callable[[], float]] = None):
+        # Clock is replaceable so tests can move time forward
+        self.clock = clock or time.time
+
+    def hit(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """Consume one token for ``key`` and report whether it was allowed."""
+        raise NotImplementedError
+
+    def peek(self, key: str, limit: int, period: float) -> RateLimitResult:
+        """Report the state of ``key`` without consuming a token."""
+        raise NotImplementedError
+
+    def reset(self, key: Optional[str] = None):
+        """Forget one bucket, or every bucket when ``key`` is None."""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    In-process token buckets guarded by a lock.
+
+    Buckets live in an OrderedDict used as an LRU: every check moves the key
+    to the end and the least recently seen key is evicted once ``max_keys``
+    is exceeded, so memory stays bounded no matter how many IPs show up.
+    """
+
+    def __init__(self, max_keys: int = 10000, clock: Optional[Callable[[], float]] = None):
+        super().__init__(clock)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(limit)
+            else:
+                tokens = _refill(bucket[0], bucket[1], now, limit, period)
+                self._buckets.move_to_end(key)
+
+            tokens, result = _consume(tokens, limit, period)
+            self._buckets[key] = [tokens, now]
+
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return result
+
+    def peek(self, key, limit, period):
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = float(limit) if bucket is None else _refill(bucket[0], bucket[1], now, limit, period)
+
+        return _result(tokens, limit, period, allowed=tokens >= 1.0)
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class DatabaseRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets stored in the application database.
+
+    Every worker process shares the same rate_limit_bucket rows, so running
+    more waitress/gunicorn workers does not multiply the effective limit.
+    Each check is a primary-key SELECT ... FOR UPDATE plus one UPDATE (or
+    INSERT) in its own short transaction, independent of the request session.
+    SQLite ignores FOR UPDATE, so there the transaction is opened with
+    BEGIN IMMEDIATE instead: checks take the database write lock up front and
+    run one at a time, rather than two reading the same token count.
+
+    Idle buckets are purged every ``cleanup_interval`` checks, which keeps the
+    table bounded while leaving the per-check cost constant.
+
+    If the database cannot answer (unavailable, "database is locked" on
+    SQLite, ...) the error is logged and the check fails open (request
+    allowed) or closed (request rejected) according to ``fail_open``.
+    """
+
+    def __init__(self, db, idle_ttl: float = 3600, cleanup_interval: int = 1000,
+                 fail_open: bool = True, clock: Optional[Callable[[], float]] = None):
+        super().__init__(clock)
+        self.db = db
+        self.idle_ttl = idle_ttl
+        self.cleanup_interval = cleanup_interval
+        self.fail_open = fail_open
+        self._checks = 0
+        self._counter_lock = threading.Lock()
+
+    @property
+    def _table(self):
+        from .models import RateLimitBucket
+        return RateLimitBucket.__table__
+
+    def hit(self, key, limit, period):
+        try:
+            try:
+                return self._hit(key, limit, period)
+            except IntegrityError:
+                # Another worker inserted the same key first; its row now exists
+                return self._hit(key, limit, period)
+        except SQLAlchemyError as e:
+            logger.error(
+                f"Rate limit check failed for {key}, "
+                f"failing {'open' if self.fail_open else 'closed'}: {e}"
+            )
+            return RateLimitResult(
+                allowed=self.fail_open,
+                limit=limit,
+                remaining=0,
+                retry_after=0.0 if self.fail_open else period / limit,
+                reset_after=0.0,
+            )
+        finally:
+            self._maybe_cleanup()
+
+    def _hit(self, key, limit, period):
+        table = self._table
+        now = self.clock()
+
+        with self.db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite' and not conn.connection.dbapi_connection.in_transaction:
+                # Not inside a transaction already (StaticPool shares one connection with the session)
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+            row = conn.execute(
+                table.select().where(table.c.key == key).with_for_update()
+            ).first()
+
+            if row is None:
+                tokens, result = _consume(float(limit), limit, period)
+                conn.execute(table.insert().values(key=key, tokens=tokens, updated_at=now))
+            else:
+                tokens = _refill(row.tokens, row.updated_at, now, limit, period)
+                tokens, result = _consume(tokens, limit, period)
+                conn.execute(
+                    table.update().where(table.c.key == key).values(tokens=tokens, updated_at=now)
+                )
+
+        return result
+
+    def peek(self, key, limit, period):
+        table = self._table
+        now = self.clock()
+
+        with self.db.engine.connect() as conn:
+            row = conn.execute(table.select().where(table.c.key == key)).first()
+
+        tokens = float(limit) if row is None else _refill(row.tokens, row.updated_at, now, limit, period)
+        return _result(tokens, limit, period, allowed=tokens >= 1.0)
+
+    def reset(self, key=None):
+        table = self._table
+        with self.db.engine.begin() as conn:
+            if key is None:
+                conn.execute(table.delete())
+            else:
+                conn.execute(table.delete().where(table.c.key == key))
+
+    def _maybe_cleanup(self):
+        """Purge idle buckets once every ``cleanup_interval`` checks."""
+        with self._counter_lock:
+            self._checks += 1
+            if self._checks < self.cleanup_interval:
+                return
+            self._checks = 0
+
+        table = self._table
+        cutoff = self.clock() - self.idle_ttl
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.updated_at < cutoff))
+        except Exception as e:
+            logger.warning(f"Rate limit bucket cleanup failed: {e}")
+
+
+def create_rate_limiter(app, db=None) -> RateLimitBackend:
+    """
+    Build the rate limit backend selected by RATE_LIMIT_BACKEND.
+
+    The backend is also registered as app.extensions['rate_limiter'] so the
+    rate_limit() decorator can find it from blueprints. RATE_LIMITS is parsed
+    here into app.extensions['rate_limits'], so a malformed value fails at
+    startup instead of on every request.
+
+    Args:
+        app: Flask application (reads RATE_LIMIT_* config values)
+        db: Flask-SQLAlchemy instance, required for the database backend
+
+    Returns:
+        RateLimitBackend instance
+    """
+    backend = app.config.get('RATE_LIMIT_BACKEND', 'memory').lower()
+
+    if backend == 'memory':
+        limiter = MemoryRateLimitBackend(max_keys=app.config.get('RATE_LIMIT_MAX_KEYS', 10000))
+    elif backend == 'database':
+        if db is None:
+            raise ValueError("The database rate limit backend requires a db instance")
+        limiter = DatabaseRateLimitBackend(
+            db,
+            idle_ttl=app.config.get('RATE_LIMIT_IDLE_TTL', 3600),
+            fail_open=app.config.get('RATE_LIMIT_FAIL_OPEN', True),
+        )
+    else:
+        raise ValueError(
+            f"Invalid RATE_LIMIT_BACKEND '{backend}'. "
+            "Must be 'memory' or 'database'"
+        )
+
+    rate_limits = {
+        scope: parse_limit(spec)
+        for scope, spec in app.config.get('RATE_LIMITS', {}).items()
+        if spec
+    }
+
+    app.extensions['rate_limiter'] = limiter
+    app.extensions['rate_limits'] = rate_limits
+    return limiter
+
+
+# ===========================
+# PER-ROUTE LIMITS
+# ===========================
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400,
+}
+
+
+def parse_limit(spec: str) -> Tuple[int, int]:
+    """
+    Parse a limit string such as '60/minute' or '10/hour'.
+
+    Returns:
+        (limit, period_seconds)
+
+    Raises:
+        ValueError: malformed spec, unknown unit, or a count below 1
+    """
+    try:
+        count, unit = spec.strip().split('/', 1)
+        count, period = int(count), PERIODS[unit.strip().lower().rstrip('s')]
+        if count < 1:
+            raise ValueError(count)
+        return count, period
+    except (ValueError, KeyError):
+        raise ValueError(
+            f"Invalid rate limit '{spec}'. "
+            f"Expected '<count>/<{'|'.join(PERIODS)}>'"
+        )
+
+
+def identity_key(by: str = 'user') -> str:
+    """
+    Return the identity a per-route bucket is keyed on.
+
+    by='user': authenticated user id, falling back to IP for anonymous requests.
+               Users behind one NAT (a classroom) each get their own bucket.
+    by='ip':   client IP address only.
+    """
+    if by == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'ip:{request.remote_addr}'
+
+
+def apply_rate_limit_headers(response, result: RateLimitResult):
+    """Attach X-RateLimit-* (and Retry-After when blocked) headers to a response."""
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    response.headers['X-RateLimit-Reset'] = str(int(math.ceil(result.reset_after)))
+    if not result.allowed:
+        response.headers['Retry-After'] = str(int(math.ceil(result.retry_after)))
+    return response
+
+
+def rate_limit(scope: str, limit: Optional[str] = None, by: str = 'user'):
+    """
+    Decorator applying a token-bucket limit to a route.
+
+    Args:
+        scope: Bucket name; the limit is read from RATE_LIMITS[scope] unless given
+        limit: Optional limit string overriding config (e.g. '30/minute')
+        by: 'user' (user id, IP when anonymous) or 'ip'
+
+    Place it below @login_required / @admin_required so rejected
+    unauthenticated requests do not spend tokens.
+    """
+    override = parse_limit(limit) if limit else None
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            app = current_app
+            limiter = app.extensions.get('rate_limiter')
+            if limiter is None or not app.config.get('RATE_LIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+
+            parsed = override or app.extensions.get('rate_limits', {}).get(scope)
+            if not parsed:
+                return f(*args, **kwargs)
+
+            count, period = parsed
+            identity = identity_key(by)
+            result = limiter.hit(f'{scope}:{identity}', count, period)
+
+            if not result.allowed:
+                if hasattr(g, 'log'):
+                    g.log.warning(
+                        "rate_limit_exceeded",
+                        scope=scope,
+                        identity=identity,
+                        endpoint=request.path,
+                        limit=count,
+                        period_seconds=period,
+                        retry_after_seconds=round(result.retry_after, 1)
+                    )
+                response = jsonify({
+                    'error': f'Too many requests. Please try again in {int(math.ceil(result.retry_after))} seconds.'
+                })
+                response.status_code = 429
+                return apply_rate_limit_headers(response, result)
+
+            response = make_response(f(*args, **kwargs))
+            return apply_rate_limit_headers(response, result)
+        return decorated
+    return decorator
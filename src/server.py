@@ -0,0 +1,76 @@
+"""
+Production server entrypoint for GLEH.
+
+    python -m src.server
+
+SERVER_MODE selects the server:
+    waitress  One process, SERVER_THREADS threads (default; also runs on Windows)
+    gunicorn  SERVER_WORKERS processes x SERVER_THREADS threads (gthread workers),
+              app preloaded in the master and forked (settings in gunicorn_conf.py)
+
+Multiple processes let CPU-bound work (JSON serialization, password hashing,
+Pillow validation) use more than one core despite the GIL.
+
+This module must not import src.app at import time: gunicorn_conf.py imports
+it before the app is loaded.
+"""
+
+import os
+import sys
+
+
+def worker_count(value=None):
+    """SERVER_WORKERS value to a process count; '0' or 'auto' means one per CPU."""
+    value = str(value if value is not None else os.environ.get('SERVER_WORKERS', '0')).strip().lower()
+    if value in ('', '0', 'auto'):
+        return os.cpu_count() or 1
+    count = int(value)
+    if count < 1:
+        raise ValueError(f"SERVER_WORKERS must be >= 1 or 'auto', got {value!r}")
+    return count
+
+
+def init_worker(app):
+    """
+    Re-initialize per-process state after fork (gunicorn post_fork hook).
+
+    Sockets and threads created in the master must not be shared with workers:
+    - DB pool: dispose without closing, so the master's connections are left alone
+    - Calibre-Web client: new requests.Session (pooled HTTP connections)
+    - Metrics: clear values copied from the master; this worker flushes its own file
+    - Log writer thread (LOG_ASYNC): threads do not survive fork, start a new one
+    The health monitor, request id generator and admin job runner detect the
+    new pid themselves.
+    """
+    from .app import db
+    from .calibre_client import init_calibre_client
+    from .logging_config import restart_log_listener_after_fork
+    from .metrics import registry
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    init_calibre_client()
+    registry.reset()
+    restart_log_listener_after_fork()
+
+
+def main():
+    mode = os.environ.get('SERVER_MODE', 'waitress').lower()
+    host = os.environ.get('SERVER_HOST', '0.0.0.0')
+    port = int(os.environ.get('SERVER_PORT', '5000'))
+    threads = int(os.environ.get('SERVER_THREADS', '4'))
+
+    if mode == 'gunicorn':
+        os.execvp('gunicorn', ['gunicorn', '--config', 'python:src.gunicorn_conf', 'src.app:app'])
+    elif mode == 'waitress':
+        from waitress import serve
+        from .app import app
+        serve(app, host=host, port=port, threads=threads)
+    else:
+        sys.exit(f"Invalid SERVER_MODE '{mode}'. Must be 'waitress' or 'gunicorn'")
+
+
+if __name__ == '__main__':
+    main()
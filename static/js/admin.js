@@ -35,6 +35,73 @@ function clearLog(elementId) {
     if (logContainer) logContainer.innerHTML = '';
 }
 
+const JOB_FINISHED = ['succeeded', 'failed', 'cancelled'];
+
+// Follow a background job (scan, extraction, script) until it finishes.
+// onUpdate(job) is called on every progress event; resolves with the finished job.
+// Uses the admin event stream, and polls if the stream is refused (all stream slots busy).
+function waitForJob(jobId, onUpdate) {
+    if (!window.EventSource) return pollJob(jobId, onUpdate);
+
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`/api/admin/events?job=${encodeURIComponent(jobId)}`);
+        let done = false;
+
+        source.addEventListener('job', (e) => {
+            const job = JSON.parse(e.data);
+            if (onUpdate) onUpdate(job);
+            if (JOB_FINISHED.includes(job.status)) {
+                done = true;
+                source.close();
+                resolve(job);
+            }
+        });
+        source.addEventListener('not_found', () => {
+            done = true;
+            source.close();
+            reject(new Error('Job not found'));
+        });
+        source.onerror = () => {
+            // Streams end after ADMIN_EVENTS_MAX_SECONDS and EventSource reconnects by itself;
+            // CLOSED means the server refused the stream
+            if (!done && source.readyState === EventSource.CLOSED) {
+                pollJob(jobId, onUpdate).then(resolve, reject);
+            }
+        };
+    });
+}
+
+// Fallback for waitForJob: poll the job status once a second
+async function pollJob(jobId, onUpdate) {
+    while (true) {
+        const response = await fetch(`/api/admin/jobs/${jobId}`);
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Job status unavailable');
+        if (onUpdate) onUpdate(data.job);
+        if (JOB_FINISHED.includes(data.job.status)) return data.job;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+// onUpdate callback for waitForJob that logs each new progress message
+function logJobProgress(elementId) {
+    let lastMessage = null;
+    return (job) => {
+        if (job.message && job.message !== lastMessage) {
+            lastMessage = job.message;
+            addLog(elementId, `[${job.progress}%] ${job.message}`, 'info');
+        }
+    };
+}
+
+// Cancel a running background job
+async function cancelJob(jobId) {
+    await fetch(`/api/admin/jobs/${jobId}/cancel`, {
+        method: 'POST',
+        headers: { 'X-CSRFToken': csrfToken }
+    });
+}
+
 // Switch to specific tab
 function switchToTab(tabName) {
     const tab = document.getElementById(`${tabName}-tab`);
@@ -189,46 +256,114 @@ function setupCourseUpload() {
     });
 }
 
-async function uploadCourseFile(file) {
-    const formData = new FormData();
-    formData.append('file', file);
+// Hex sha256 of a chunk, or null where WebCrypto is unavailable (plain HTTP)
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Start a chunked upload, or resume the one this browser began for the same file
+async function startOrResumeUpload(file) {
+    const key = `courseUpload:${file.name}:${file.size}:${file.lastModified}`;
+    const savedId = localStorage.getItem(key);
+    if (savedId) {
+        const response = await fetch(`/api/admin/uploads/${savedId}`);
+        if (response.ok) {
+            const data = await response.json();
+            const chunkSize = Number(localStorage.getItem(`${key}:chunk`)) || 8 * 1024 * 1024;
+            return { key, id: savedId, offset: data.upload.offset, chunkSize };
+        }
+        localStorage.removeItem(key);
+    }
+
+    const response = await fetch('/api/admin/uploads', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.error || 'Could not start upload');
+    localStorage.setItem(key, data.upload.id);
+    localStorage.setItem(`${key}:chunk`, data.chunk_size);
+    return { key, id: data.upload.id, offset: 0, chunkSize: data.chunk_size };
+}
+
+// PUT one chunk; resolves with the server's new offset. A 409 carries the offset to continue from.
+async function putChunk(uploadId, offset, blob) {
+    const headers = { 'Content-Type': 'application/octet-stream', 'X-CSRFToken': csrfToken };
+    const checksum = await sha256Hex(blob);
+    if (checksum) headers['X-Chunk-SHA256'] = checksum;
+
+    const response = await fetch(`/api/admin/uploads/${uploadId}?offset=${offset}`, {
+        method: 'PUT', headers, body: blob
+    });
+    const data = await response.json();
+    if (response.ok || (response.status === 409 && data.offset !== undefined)) return data.offset;
+    const error = new Error(data.error || `Upload failed (${response.status})`);
+    error.fatal = response.status !== 400;  // 400 = cut off or checksum mismatch: resend
+    throw error;
+}
 
+// Upload a course file in resumable chunks, then follow the verify/extract job
+async function uploadCourseFile(file) {
     const progressDiv = document.getElementById('upload-progress');
     const progressBar = document.getElementById('upload-progress-bar');
     progressDiv.style.display = 'block';
+    progressBar.classList.remove('bg-success', 'bg-danger');
     progressBar.style.width = '0%';
     progressBar.textContent = '0%';
 
+    const MAX_RETRIES = 5;
     try {
-        const xhr = new XMLHttpRequest();
-
-        xhr.upload.addEventListener('progress', (e) => {
-            if (e.lengthComputable) {
-                const percent = Math.round((e.loaded / e.total) * 100);
-                progressBar.style.width = percent + '%';
-                progressBar.textContent = percent + '%';
+        const upload = await startOrResumeUpload(file);
+        let offset = upload.offset;
+        let retries = 0;
+
+        while (offset < file.size) {
+            const percent = Math.floor((offset / file.size) * 100);
+            progressBar.style.width = percent + '%';
+            progressBar.textContent = percent + '%';
+            try {
+                offset = await putChunk(upload.id, offset, file.slice(offset, offset + upload.chunkSize));
+                retries = 0;
+            } catch (error) {
+                // Dropped connection: wait, ask the server how much arrived, continue from there
+                if (error.fatal || ++retries > MAX_RETRIES) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** retries));
+                const status = await fetch(`/api/admin/uploads/${upload.id}`);
+                if (!status.ok) throw error;
+                offset = (await status.json()).upload.offset;
             }
-        });
+        }
 
-        xhr.addEventListener('load', () => {
-            if (xhr.status === 200) {
-                const data = JSON.parse(xhr.responseText);
-                progressBar.classList.add('bg-success');
-                progressBar.textContent = 'Complete!';
-                alert(data.message);
-                loadCoursesTable();
-            } else {
-                const data = JSON.parse(xhr.responseText);
-                progressBar.classList.add('bg-danger');
-                alert(`Error: ${data.error}`);
-            }
+        progressBar.style.width = '100%';
+        progressBar.textContent = 'Verifying...';
+        const response = await fetch(`/api/admin/uploads/${upload.id}/complete`, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrfToken }
         });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || 'Could not complete upload');
 
-        xhr.open('POST', '/api/admin/upload-course');
-        xhr.setRequestHeader('X-CSRFToken', csrfToken);
-        xhr.send(formData);
-
+        const job = await waitForJob(data.job_id, (job) => {
+            progressBar.style.width = job.progress + '%';
+            progressBar.textContent = `${job.message || 'Processing'} (${job.progress}%)`;
+        });
+        localStorage.removeItem(upload.key);
+        localStorage.removeItem(`${upload.key}:chunk`);
+        if (job.status === 'succeeded') {
+            progressBar.classList.add('bg-success');
+            progressBar.textContent = 'Complete!';
+            alert(job.result.message);
+            loadCoursesTable();
+        } else {
+            progressBar.classList.add('bg-danger');
+            alert(`Error: ${job.error || job.status}`);
+        }
     } catch (error) {
+        progressBar.classList.add('bg-danger');
+        progressBar.textContent = 'Upload interrupted - drop the same file again to resume';
         alert(`Error: ${error.message}`);
     }
 }
@@ -257,8 +392,13 @@ async function scanCourses() {
         const data = await response.json();
 
         if (response.ok) {
-            addLog('course-log', `Found ${data.total} courses`, 'success');
-            addLog('course-log', `New: ${data.new}, Already imported: ${data.existing}`, 'info');
+            const job = await waitForJob(data.job_id, logJobProgress('course-log'));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `Scan ${job.status}`);
+            }
+            const result = job.result;
+            addLog('course-log', `Found ${result.total} courses`, 'success');
+            addLog('course-log', `New: ${result.new}, Updated: ${result.changed}, Unchanged: ${result.unchanged}, Removed: ${result.removed}`, 'info');
             await loadCoursesTable();
         } else {
             addLog('course-log', `Error: ${data.error}`, 'error');
@@ -324,8 +464,12 @@ async function generateThumbnails() {
         const data = await response.json();
 
         if (response.ok) {
-            addLog('course-log', `Generated ${data.generated} thumbnails`, 'success');
-            addLog('course-log', `Failed: ${data.failed}`, 'info');
+            const job = await waitForJob(data.job_id, logJobProgress('course-log'));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `Thumbnail generation ${job.status}`);
+            }
+            addLog('course-log', `Generated ${job.result.generated} thumbnails`, 'success');
+            addLog('course-log', `Failed: ${job.result.failed}`, 'info');
             await loadCoursesTable();
         } else {
             addLog('course-log', `Error: ${data.error}`, 'error');
@@ -338,6 +482,93 @@ async function generateThumbnails() {
     }
 }
 
+async function dedupeCourses() {
+    const btn = event.target;
+    btn.disabled = true;
+    btn.textContent = 'Deduplicating...';
+
+    const progressDiv = document.getElementById('course-progress');
+    progressDiv.style.display = 'block';
+    clearLog('course-log');
+
+    addLog('course-log', 'Linking identical course files...', 'info');
+
+    try {
+        const response = await fetch('/api/admin/dedupe-courses', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            }
+        });
+
+        const data = await response.json();
+
+        if (response.ok) {
+            const job = await waitForJob(data.job_id, logJobProgress('course-log'));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `Deduplication ${job.status}`);
+            }
+            const savedMb = (job.result.bytes_saved / (1024 * 1024)).toFixed(1);
+            addLog('course-log', `Linked ${job.result.linked} duplicate files, saved ${savedMb} MB`, 'success');
+            addLog('course-log', `Checked ${job.result.files} files (${job.result.already_linked} already linked)`, 'info');
+        } else {
+            addLog('course-log', `Error: ${data.error}`, 'error');
+        }
+    } catch (error) {
+        addLog('course-log', `Error: ${error.message}`, 'error');
+    } finally {
+        btn.disabled = false;
+        btn.textContent = 'Deduplicate Assets';
+    }
+}
+
+async function verifyCourses() {
+    const btn = event.target;
+    btn.disabled = true;
+    btn.textContent = 'Verifying...';
+
+    const progressDiv = document.getElementById('course-progress');
+    progressDiv.style.display = 'block';
+    clearLog('course-log');
+
+    addLog('course-log', 'Checking course files against their scan manifests...', 'info');
+
+    try {
+        const response = await fetch('/api/admin/verify-courses', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken
+            }
+        });
+
+        const data = await response.json();
+
+        if (response.ok) {
+            const job = await waitForJob(data.job_id, logJobProgress('course-log'));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `Verification ${job.status}`);
+            }
+            const result = job.result;
+            const clean = result.intact === result.courses;
+            addLog('course-log', result.message, clean ? 'success' : 'error');
+            for (const problem of result.problems) {
+                const paths = [...problem.paths.missing, ...problem.paths.modified, ...problem.paths.unexpected];
+                addLog('course-log', `${problem.uid}: ${problem.missing} missing, ${problem.modified} modified, ` +
+                    `${problem.unexpected} unexpected (${paths.join(', ')})`, 'error');
+            }
+        } else {
+            addLog('course-log', `Error: ${data.error}`, 'error');
+        }
+    } catch (error) {
+        addLog('course-log', `Error: ${error.message}`, 'error');
+    } finally {
+        btn.disabled = false;
+        btn.textContent = 'Verify Integrity';
+    }
+}
+
 async function autoCategorize() {
     const btn = event.target;
     btn.disabled = true;
@@ -445,9 +676,14 @@ async function runScript(scriptName) {
             body: JSON.stringify({ script: scriptName })
         });
 
-        const data = await response.json();
+        const accepted = await response.json();
 
         if (response.ok) {
+            const job = await waitForJob(accepted.job_id, logJobProgress('script-log'));
+            if (job.status !== 'succeeded') {
+                throw new Error(job.error || `Script ${job.status}`);
+            }
+            const data = job.result;
             if (data.success) {
                 addLog('script-log', 'Script completed successfully', 'success');
                 if (data.stdout) {
@@ -464,7 +700,7 @@ async function runScript(scriptName) {
                 }
             }
         } else {
-            addLog('script-log', `Error: ${data.error}`, 'error');
+            addLog('script-log', `Error: ${accepted.error}`, 'error');
         }
     } catch (error) {
         addLog('script-log', `Error: ${error.message}`, 'error');
@@ -572,7 +808,8 @@ async function fetchLogs() {
         const data = await response.json();
 
         if (response.ok && data.logs) {
-            data.logs.forEach(line => {
+            // API returns newest first; show oldest at the top like a tail
+            data.logs.slice().reverse().forEach(line => {
                 const logLine = document.createElement('div');
                 logLine.className = 'log-line';
                 logLine.textContent = line;
@@ -589,6 +826,53 @@ async function fetchLogs() {
     }
 }
 
+// Live log tail over the admin event stream
+let logSource = null;
+const MAX_LOG_LINES = 1000;
+
+function appendLogLine(contentDiv, text) {
+    const logLine = document.createElement('div');
+    logLine.className = 'log-line';
+    logLine.textContent = text;
+    contentDiv.appendChild(logLine);
+    while (contentDiv.childElementCount > MAX_LOG_LINES) {
+        contentDiv.removeChild(contentDiv.firstChild);
+    }
+    contentDiv.parentElement.scrollTop = contentDiv.parentElement.scrollHeight;
+}
+
+function toggleLogFollow() {
+    const btn = document.getElementById('logs-follow-btn');
+    if (logSource) {
+        logSource.close();
+        logSource = null;
+        btn.textContent = 'Follow Logs';
+        return;
+    }
+
+    const outputDiv = document.getElementById('logs-output');
+    const contentDiv = document.getElementById('logs-content');
+    outputDiv.style.display = 'block';
+
+    logSource = new EventSource('/api/admin/events?logs=1&jobs=0');
+    btn.textContent = 'Stop Following';
+
+    logSource.addEventListener('log', (e) => {
+        JSON.parse(e.data).lines.forEach(line => appendLogLine(contentDiv, line));
+    });
+    logSource.addEventListener('gap', (e) => {
+        const skipped = JSON.parse(e.data).skipped_bytes;
+        appendLogLine(contentDiv, `... ${skipped} bytes of log skipped (viewer fell behind) ...`);
+    });
+    logSource.onerror = () => {
+        if (logSource && logSource.readyState === EventSource.CLOSED) {
+            appendLogLine(contentDiv, 'Log stream unavailable (too many open streams?)');
+            logSource = null;
+            btn.textContent = 'Follow Logs';
+        }
+    };
+}
+
 // ===========================
 // USER MANAGEMENT FUNCTIONS
 // ===========================
@@ -4,8 +4,17 @@ Provides reusable fixtures for Flask app, database, CSRF tokens, and authenticat
 """
 import pytest
 import os
+import tempfile
+
+# Health checks, password hashing and admin jobs run inline in tests,
+# and StorageManager must not create its default dirs in the repo
+os.environ.setdefault('HEALTH_MONITOR_ENABLED', 'false')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('JOB_WORKERS', '0')
+os.environ.setdefault('CONTENT_DIR', tempfile.mkdtemp(prefix='gleh-test-content-'))
+
 from src.app import app as flask_app
-from src.app import db, auth_attempts
+from src.app import db, rate_limiter
 from src.models import User, Course, Ebook
 from flask_wtf.csrf import generate_csrf
 
@@ -43,8 +52,8 @@ def app():
         db.session.remove()
         db.drop_all()
 
-        # Clear in-memory rate limiting data
-        auth_attempts.clear()
+        # Clear rate limiting buckets
+        rate_limiter.reset()
 
 
 @pytest.fixture
@@ -0,0 +1,164 @@
+"""
+Admin event stream test suite.
+Tests the log follower, stream slot limits and /api/admin/events job and log events.
+"""
+import json
+import os
+import pytest
+from src.admin_events import LogFollower, StreamSlots, format_event, get_stream_slots
+
+
+def _events(body):
+    """Parse an SSE body into (event, data) pairs, skipping comments and retry lines."""
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.fixture
+def fast_stream(app):
+    app.config.update(ADMIN_EVENTS_POLL_INTERVAL=0.02, ADMIN_EVENTS_MAX_SECONDS=0.2)
+    yield
+    app.config.update(ADMIN_EVENTS_POLL_INTERVAL=1.0, ADMIN_EVENTS_MAX_SECONDS=300.0)
+
+
+@pytest.mark.unit
+class TestLogFollower:
+    """Test reading appended log lines from an offset."""
+
+    def test_reads_only_new_complete_lines(self, tmp_path):
+        """Test that existing content is skipped and a partial line waits for its newline."""
+        path = tmp_path / 'app.log'
+        path.write_text('old line\n')
+        follower = LogFollower(path)
+
+        with open(path, 'a') as f:
+            f.write('first\nsecond\npart')
+        assert follower.read() == (['first', 'second'], 0)
+
+        with open(path, 'a') as f:
+            f.write('ial\n')
+        assert follower.read() == (['partial'], 0)
+        assert follower.read() == ([], 0)
+
+    def test_rotation_restarts_at_zero(self, tmp_path):
+        """Test that a replaced file is read from the start."""
+        path = tmp_path / 'app.log'
+        path.write_text('before rotation\n' * 10)
+        follower = LogFollower(path)
+
+        os.rename(path, tmp_path / 'app.log.1')
+        path.write_text('after rotation\n')
+
+        assert follower.read() == (['after rotation'], 0)
+
+    def test_lagging_reader_skips_ahead(self, tmp_path):
+        """Test that a reader more than max_lag behind jumps to a line boundary near the end."""
+        path = tmp_path / 'app.log'
+        path.write_text('')
+        follower = LogFollower(path, max_lag=100)
+
+        with open(path, 'a') as f:
+            for i in range(50):
+                f.write(f'line {i:03d}\n')
+        lines, skipped = follower.read()
+
+        assert skipped > 0
+        assert lines[-1] == 'line 049'
+        assert all(line.startswith('line ') for line in lines)
+        assert sum(len(line) + 1 for line in lines) <= 100
+
+
+@pytest.mark.unit
+class TestStreamSlots:
+    """Test the per-process cap on open streams."""
+
+    def test_limit_and_idempotent_release(self):
+        """Test that slots run out and a double release frees only one."""
+        slots = StreamSlots(1)
+        release = slots.acquire()
+
+        assert slots.acquire() is None
+        release()
+        release()
+        second = slots.acquire()
+        assert second is not None
+        assert slots.acquire() is None
+        second()
+
+    def test_format_event(self):
+        """Test the SSE wire format."""
+        assert format_event('log', {'lines': ['a']}, 42) == 'event: log\nid: 42\ndata: {"lines": ["a"]}\n\n'
+
+
+@pytest.mark.integration
+class TestEventsEndpoint:
+    """Test /api/admin/events."""
+
+    def test_job_stream_ends_when_job_finished(self, app, admin_user, csrf_token, fast_stream):
+        """Test that following a job sends its final state and closes the stream."""
+        client = admin_user['client']
+        job_id = client.post('/api/admin/generate-thumbnails',
+                             headers={'X-CSRFToken': csrf_token}).get_json()['job_id']
+
+        response = client.get(f'/api/admin/events?job={job_id}')
+
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['X-Accel-Buffering'] == 'no'
+        events = _events(response.get_data(as_text=True))
+        assert events[-1][0] == 'job'
+        assert events[-1][1]['id'] == job_id
+        assert events[-1][1]['status'] == 'succeeded'
+
+    def test_unknown_job(self, admin_user, fast_stream):
+        """Test that an unknown job id ends the stream with not_found."""
+        response = admin_user['client'].get('/api/admin/events?job=missing')
+
+        assert _events(response.get_data(as_text=True)) == [('not_found', {'error': 'Job not found'})]
+
+    def test_log_lines_from_offset(self, app, admin_user, fast_stream, tmp_path):
+        """Test that log events carry lines after the given offset and the offset as event id."""
+        log_dir = app.config.get('LOG_DIR')
+        app.config['LOG_DIR'] = str(tmp_path)
+        (tmp_path / 'app.log').write_text('{"event": "a"}\n{"event": "b"}\n')
+        try:
+            response = admin_user['client'].get('/api/admin/events?logs=1&jobs=0&offset=15')
+        finally:
+            app.config['LOG_DIR'] = log_dir
+
+        body = response.get_data(as_text=True)
+        assert _events(body) == [('log', {'lines': ['{"event": "b"}']})]
+        assert 'id: 30\n' in body
+
+    def test_refuses_beyond_stream_limit(self, app, admin_user, fast_stream):
+        """Test that 503 is returned while every stream slot is taken."""
+        app.config['ADMIN_EVENTS_MAX_STREAMS'] = 1
+        release = get_stream_slots(1).acquire()
+        try:
+            response = admin_user['client'].get('/api/admin/events')
+        finally:
+            release()
+            app.config['ADMIN_EVENTS_MAX_STREAMS'] = 2
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '5'
+
+    def test_slot_released_after_stream(self, app, admin_user, fast_stream):
+        """Test that a finished stream gives its slot back."""
+        app.config['ADMIN_EVENTS_MAX_STREAMS'] = 1
+        try:
+            first = admin_user['client'].get('/api/admin/events')
+            first.get_data()
+            first.close()
+            second = admin_user['client'].get('/api/admin/events')
+        finally:
+            app.config['ADMIN_EVENTS_MAX_STREAMS'] = 2
+
+        assert second.status_code == 200
+
+    def test_requires_admin(self, authenticated_user):
+        """Test that regular users cannot open the stream."""
+        assert authenticated_user['client'].get('/api/admin/events').status_code == 403
@@ -0,0 +1,107 @@
+"""
+Bulk user provisioning test suite.
+Tests /api/admin/users/bulk with JSON and CSV input, per-row results and query counts.
+"""
+import io
+import json
+import pytest
+from src.app import db
+from src.models import User
+from src.query_stats import assert_max_queries
+
+
+@pytest.fixture(autouse=True)
+def fast_hasher(monkeypatch):
+    """Cheap hash parameters so hundreds of rows hash quickly in tests."""
+    from src import passwords
+    monkeypatch.setattr(passwords, '_password_hasher',
+                        passwords.PasswordHasher(method='pbkdf2:sha256:1000', workers=0))
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.integration
+class TestBulkUsers:
+    """Test classroom provisioning through /api/admin/users/bulk."""
+
+    def test_json_rows_with_per_row_results(self, app, admin_user, csrf_token):
+        """Test created, existing, duplicate and invalid rows in one upload."""
+        client = admin_user['client']
+        with app.app_context():
+            existing = User(username='student-existing')
+            existing.set_password('Password123')
+            db.session.add(existing)
+            db.session.commit()
+
+        users = [
+            {'username': 'student-1', 'password': 'Password123'},
+            {'username': 'student-existing', 'password': 'Password123'},
+            {'username': 'student-1', 'password': 'Password123'},
+            {'username': 'x', 'password': 'Password123'},
+            {'username': 'teacher-1', 'password': 'Password123', 'is_admin': True},
+        ]
+        response = client.post('/api/admin/users/bulk', json={'users': users}, headers={'X-CSRFToken': csrf_token},
+                               buffered=True)
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = _lines(response)
+        statuses = {line['row']: line['status'] for line in lines if 'row' in line}
+        assert statuses == {1: 'created', 2: 'exists', 3: 'duplicate', 4: 'invalid', 5: 'created'}
+        assert lines[-1]['summary'] == {'total': 5, 'created': 2, 'exists': 1, 'duplicate': 1, 'invalid': 1}
+
+        with app.app_context():
+            teacher = User.query.filter_by(username='teacher-1').first()
+            assert teacher.is_admin
+            assert teacher.check_password('Password123')
+
+    def test_csv_upload(self, app, admin_user, csrf_token):
+        """Test a CSV file upload with a header row."""
+        client = admin_user['client']
+        csv_data = 'username,password,is_admin\nclass-a-1,Password123,no\nclass-a-2,Password123,yes\n'
+
+        response = client.post('/api/admin/users/bulk',
+                               data={'file': (io.BytesIO(csv_data.encode()), 'class.csv')},
+                               headers={'X-CSRFToken': csrf_token}, buffered=True)
+
+        assert _lines(response)[-1]['summary']['created'] == 2
+        with app.app_context():
+            assert User.query.filter_by(username='class-a-2').first().is_admin
+
+    def test_constant_query_count(self, app, admin_user, csrf_token):
+        """Test that 100 rows cost the same handful of statements as a few."""
+        client = admin_user['client']
+        users = [{'username': f'bulk-{i}', 'password': 'Password123'} for i in range(100)]
+
+        # user loader + IN lookup + one executemany insert (+ transaction bookkeeping)
+        with assert_max_queries(6):
+            response = client.post('/api/admin/users/bulk', json={'users': users},
+                                   headers={'X-CSRFToken': csrf_token}, buffered=True)
+
+        assert _lines(response)[-1]['summary']['created'] == 100
+        with app.app_context():
+            assert User.query.filter(User.username.like('bulk-%')).count() == 100
+
+    def test_rejects_bad_input(self, admin_user, csrf_token):
+        """Test missing CSV columns, empty uploads and the row limit."""
+        client = admin_user['client']
+        headers = {'X-CSRFToken': csrf_token}
+
+        assert client.post('/api/admin/users/bulk', data='name,pw\na,b\n', content_type='text/csv',
+                           headers=headers).status_code == 400
+        assert client.post('/api/admin/users/bulk', json={'users': []}, headers=headers).status_code == 400
+
+        client.application.config['BULK_USER_MAX_ROWS'] = 2
+        try:
+            response = client.post('/api/admin/users/bulk', json={'users': [{}, {}, {}]}, headers=headers)
+        finally:
+            client.application.config['BULK_USER_MAX_ROWS'] = 1000
+        assert response.status_code == 413
+
+    def test_requires_admin(self, authenticated_user, csrf_token):
+        """Test that regular users are refused."""
+        response = authenticated_user['client'].post('/api/admin/users/bulk', json={'users': []},
+                                                     headers={'X-CSRFToken': csrf_token})
+        assert response.status_code == 403
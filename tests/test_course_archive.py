@@ -0,0 +1,159 @@
+"""
+Course archive extraction test suite.
+Tests the size, count, ratio and path guards, parallel extraction and the atomic rename into place.
+"""
+import io
+import os
+import stat
+import zipfile
+import pytest
+from src import course_archive
+from src.course_archive import ArchiveRejected, ExtractionLimits, extract_archive
+from src.models import Course
+
+
+def _make_zip(path, members, compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(path, 'w', compression=compression) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return str(path)
+
+
+def _leftovers(directory):
+    return [name for name in os.listdir(directory) if name.startswith(('.extract-', '.replaced-'))]
+
+
+@pytest.mark.unit
+class TestExtractArchive:
+    """Test extract_archive() limits and placement."""
+
+    def test_extracts_into_place(self, tmp_path):
+        """Test that members land under dest_dir, readable by other users, without staging leftovers."""
+        archive = _make_zip(tmp_path / 'c.zip', {'index.html': '<html></html>', 'css/site.css': 'body {}',
+                                                 'empty/': ''})
+        dest = tmp_path / 'course'
+
+        result = extract_archive(archive, str(dest))
+
+        assert result == {'files': 2, 'bytes': len('<html></html>') + len('body {}')}
+        assert (dest / 'css' / 'site.css').read_text() == 'body {}'
+        assert stat.S_IMODE(dest.stat().st_mode) == 0o755
+        assert _leftovers(tmp_path) == []
+
+    @pytest.mark.parametrize('name', ['../escape.html', '/etc/passwd', 'a/../../escape.html', 'C:/windows.ini'])
+    def test_rejects_unsafe_paths(self, tmp_path, name):
+        """Test that members escaping the destination reject the whole archive."""
+        archive = _make_zip(tmp_path / 'c.zip', {'index.html': 'ok', name: 'bad'})
+
+        with pytest.raises(ArchiveRejected):
+            extract_archive(archive, str(tmp_path / 'course'))
+
+        assert not (tmp_path / 'course').exists()
+        assert not (tmp_path / 'escape.html').exists()
+        assert _leftovers(tmp_path) == []
+
+    def test_rejects_symlinks(self, tmp_path):
+        """Test that symlink members are refused."""
+        path = tmp_path / 'c.zip'
+        with zipfile.ZipFile(path, 'w') as zf:
+            info = zipfile.ZipInfo('link')
+            info.external_attr = (stat.S_IFLNK | 0o777) << 16
+            zf.writestr(info, '/etc/passwd')
+
+        with pytest.raises(ArchiveRejected, match='Symbolic links'):
+            extract_archive(str(path), str(tmp_path / 'course'))
+
+    def test_rejects_zip_bomb_ratio(self, tmp_path):
+        """Test that a highly compressible member over 1 MiB is refused before writing."""
+        archive = _make_zip(tmp_path / 'c.zip', {'zeros.bin': b'\0' * (4 * 1024 * 1024)})
+
+        with pytest.raises(ArchiveRejected, match='expands more than'):
+            extract_archive(archive, str(tmp_path / 'course'), ExtractionLimits(max_ratio=100))
+
+    def test_rejects_count_and_total_size(self, tmp_path):
+        """Test the member count and total uncompressed size limits."""
+        archive = _make_zip(tmp_path / 'c.zip', {f'page-{i}.html': 'x' * 100 for i in range(10)})
+
+        with pytest.raises(ArchiveRejected, match='entries'):
+            extract_archive(archive, str(tmp_path / 'a'), ExtractionLimits(max_files=5))
+        with pytest.raises(ArchiveRejected, match='expands to more than'):
+            extract_archive(archive, str(tmp_path / 'b'), ExtractionLimits(max_bytes=500))
+
+    def test_large_members_on_thread_pool(self, tmp_path, monkeypatch):
+        """Test that large members extracted by worker threads match the archive."""
+        monkeypatch.setattr(course_archive, 'LARGE_MEMBER', 1024)
+        members = {f'videos/part-{i}.bin': os.urandom(50_000) for i in range(6)}
+        members['index.html'] = b'<html></html>'
+        archive = _make_zip(tmp_path / 'c.zip', members, compression=zipfile.ZIP_STORED)
+
+        result = extract_archive(archive, str(tmp_path / 'course'), ExtractionLimits(workers=3))
+
+        assert result['files'] == 7
+        for name, data in members.items():
+            assert (tmp_path / 'course' / name).read_bytes() == data
+
+    def test_abort_leaves_nothing(self, tmp_path, monkeypatch):
+        """Test that an exception from progress (job cancelled) removes the partial extraction."""
+        monkeypatch.setattr(course_archive, 'LARGE_MEMBER', 1024)
+        archive = _make_zip(tmp_path / 'c.zip', {f'f{i}.bin': os.urandom(5000) for i in range(8)})
+
+        def cancel(done, total):
+            if done == 3:
+                raise RuntimeError('cancelled')
+
+        with pytest.raises(RuntimeError):
+            extract_archive(archive, str(tmp_path / 'course'), ExtractionLimits(workers=2), progress=cancel)
+
+        assert not (tmp_path / 'course').exists()
+        assert _leftovers(tmp_path) == []
+
+    def test_replaces_existing_course(self, tmp_path):
+        """Test that re-uploading a course swaps the folder instead of merging into it."""
+        (tmp_path / 'course').mkdir()
+        (tmp_path / 'course' / 'stale.html').write_text('old')
+        archive = _make_zip(tmp_path / 'c.zip', {'index.html': 'new'})
+
+        extract_archive(archive, str(tmp_path / 'course'))
+
+        assert os.listdir(tmp_path / 'course') == ['index.html']
+        assert _leftovers(tmp_path) == []
+
+
+@pytest.mark.integration
+class TestUploadExtraction:
+    """Test the extraction job behind /api/admin/upload-course."""
+
+    def _upload(self, app, client, csrf_token, tmp_path, data, name):
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        try:
+            response = client.post('/api/admin/upload-course', data={'file': (io.BytesIO(data), name)},
+                                   headers={'X-CSRFToken': csrf_token})
+        finally:
+            app.config['CONTENT_DIR'] = content_dir
+        return client.get(response.get_json()['status_url']).get_json()['job']
+
+    def test_extracted_course_is_imported(self, app, admin_user, csrf_token, tmp_path):
+        """Test that the job scans just the new folder so the course is listed right away."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('index.html', '<html></html>')
+            zf.writestr('data.json', '{"course_title": "Signals and Systems"}')
+
+        job = self._upload(app, admin_user['client'], csrf_token, tmp_path, archive.getvalue(), 'signals.zip')
+
+        assert job['status'] == 'succeeded'
+        assert job['result']['scan']['new'] == 1
+        assert Course.query.filter_by(uid='signals').first().title == 'Signals and Systems'
+
+    def test_zip_bomb_fails_job(self, app, admin_user, csrf_token, tmp_path):
+        """Test that a rejected archive fails the job, writes nothing and removes the zip."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('zeros.bin', b'\0' * (4 * 1024 * 1024))
+
+        job = self._upload(app, admin_user['client'], csrf_token, tmp_path, archive.getvalue(), 'bomb.zip')
+
+        assert job['status'] == 'failed'
+        assert 'expands more than' in job['error']
+        assert os.listdir(tmp_path / 'courses') == []
@@ -0,0 +1,144 @@
+"""
+Course asset deduplication test suite.
+Tests hardlinking into the content store, reruns, garbage collection, dedupe during extraction and the admin job.
+"""
+import io
+import os
+import zipfile
+import pytest
+from src.course_archive import extract_archive
+from src.course_dedupe import ContentStore, dedupe_courses, hash_file
+from src.course_indexer import list_course_folders
+
+BUNDLE = b'/* shared theme */' + b'x' * 10_000
+
+
+def _course(root, name, files):
+    for relative, data in files.items():
+        path = root / name / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+
+def _inode(path):
+    return os.stat(path).st_ino
+
+
+@pytest.mark.unit
+class TestDedupeCourses:
+    """Test dedupe_courses() and ContentStore."""
+
+    def test_links_identical_files(self, tmp_path):
+        """Test that copies across courses become one inode and the saving is reported."""
+        for name in ('physics', 'chemistry', 'biology'):
+            _course(tmp_path, name, {'css/theme.css': BUNDLE, 'index.html': name.encode() * 2000})
+
+        result = dedupe_courses(str(tmp_path), ContentStore(str(tmp_path)), workers=2)
+
+        assert result['linked'] == 2
+        assert result['bytes_saved'] == 2 * len(BUNDLE)
+        assert len({_inode(tmp_path / name / 'css/theme.css') for name in ('physics', 'chemistry', 'biology')}) == 1
+        assert os.stat(tmp_path / 'physics' / 'css/theme.css').st_nlink == 4  # Three courses and the store
+        assert (tmp_path / 'biology' / 'css/theme.css').read_bytes() == BUNDLE
+        assert _inode(tmp_path / 'physics' / 'index.html') != _inode(tmp_path / 'chemistry' / 'index.html')
+
+    def test_rerun_skips_linked_files(self, tmp_path):
+        """Test that a second pass reads nothing already in the store."""
+        _course(tmp_path, 'a', {'theme.css': BUNDLE})
+        _course(tmp_path, 'b', {'theme.css': BUNDLE})
+        store = ContentStore(str(tmp_path))
+        dedupe_courses(str(tmp_path), store, workers=0)
+
+        result = dedupe_courses(str(tmp_path), store, workers=0)
+
+        assert result['already_linked'] == 2
+        assert (result['hashed'], result['bytes_saved']) == (0, 0)
+
+    def test_small_files_and_store_are_skipped(self, tmp_path):
+        """Test the size threshold, and that the store is neither deduplicated nor scanned as a course."""
+        _course(tmp_path, 'a', {'tiny.txt': b'same'})
+        _course(tmp_path, 'b', {'tiny.txt': b'same', 'theme.css': BUNDLE})
+
+        dedupe_courses(str(tmp_path), ContentStore(str(tmp_path), min_size=1024), workers=0)
+
+        assert _inode(tmp_path / 'a' / 'tiny.txt') != _inode(tmp_path / 'b' / 'tiny.txt')
+        assert sorted(list_course_folders(str(tmp_path))) == ['a', 'b']
+
+    def test_garbage_collection(self, tmp_path):
+        """Test that blobs of deleted courses are removed and counted."""
+        _course(tmp_path, 'a', {'theme.css': BUNDLE})
+        store = ContentStore(str(tmp_path))
+        dedupe_courses(str(tmp_path), store, workers=0)
+        blob = store.blob_path(hash_file(tmp_path / 'a' / 'theme.css'))
+        assert os.path.exists(blob)
+
+        os.remove(tmp_path / 'a' / 'theme.css')
+        result = dedupe_courses(str(tmp_path), store, workers=0)
+
+        assert (result['blobs_removed'], result['bytes_freed']) == (1, len(BUNDLE))
+        assert not os.path.exists(blob)
+
+    def test_extraction_links_into_store(self, tmp_path):
+        """Test that a new upload shares files with courses already in the store."""
+        _course(tmp_path, 'a', {'theme.css': BUNDLE})
+        store = ContentStore(str(tmp_path))
+        dedupe_courses(str(tmp_path), store, workers=0)
+        archive = tmp_path / 'b.zip'
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('static/theme.css', BUNDLE)
+            zf.writestr('index.html', '<html></html>')
+
+        result = extract_archive(str(archive), str(tmp_path / 'b'), store=store)
+
+        assert result['bytes_saved'] == len(BUNDLE)
+        assert _inode(tmp_path / 'b' / 'static' / 'theme.css') == _inode(tmp_path / 'a' / 'theme.css')
+
+
+@pytest.mark.integration
+class TestDedupeEndpoint:
+    """Test /api/admin/dedupe-courses and dedupe of uploads."""
+
+    @pytest.fixture
+    def courses_dir(self, app, tmp_path):
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        (tmp_path / 'courses').mkdir()
+        yield tmp_path / 'courses'
+        app.config['CONTENT_DIR'] = content_dir
+
+    def test_dedupe_job(self, admin_user, csrf_token, courses_dir):
+        """Test that the job reports the bytes saved."""
+        _course(courses_dir, 'a', {'theme.css': BUNDLE})
+        _course(courses_dir, 'b', {'theme.css': BUNDLE})
+        client = admin_user['client']
+
+        response = client.post('/api/admin/dedupe-courses', headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 202
+        job = client.get(response.get_json()['status_url']).get_json()['job']
+        assert job['status'] == 'succeeded'
+        assert job['result']['bytes_saved'] == len(BUNDLE)
+
+    def test_upload_is_deduplicated_when_enabled(self, app, admin_user, csrf_token, courses_dir):
+        """Test that COURSE_DEDUPE_ENABLED links uploaded files while extracting."""
+        _course(courses_dir, 'a', {'theme.css': BUNDLE})
+        dedupe_courses(str(courses_dir), ContentStore(str(courses_dir)), workers=0)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('theme.css', BUNDLE)
+        app.config['COURSE_DEDUPE_ENABLED'] = True
+        try:
+            response = admin_user['client'].post('/api/admin/upload-course',
+                                                 data={'file': (io.BytesIO(archive.getvalue()), 'b.zip')},
+                                                 headers={'X-CSRFToken': csrf_token})
+        finally:
+            app.config['COURSE_DEDUPE_ENABLED'] = False
+
+        job = admin_user['client'].get(response.get_json()['status_url']).get_json()['job']
+        assert job['result']['bytes_saved'] == len(BUNDLE)
+        assert _inode(courses_dir / 'b' / 'theme.css') == _inode(courses_dir / 'a' / 'theme.css')
+
+    def test_requires_admin(self, authenticated_user, csrf_token):
+        """Test that regular users cannot run the dedupe."""
+        response = authenticated_user['client'].post('/api/admin/dedupe-courses', headers={'X-CSRFToken': csrf_token})
+        assert response.status_code == 403
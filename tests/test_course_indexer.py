@@ -0,0 +1,395 @@
+"""
+Course scanning test suite.
+Tests incremental rescans driven by the course_scan_state fingerprints and the scan endpoint.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import pytest
+from src.app import db
+from src import course_indexer
+from src.course_indexer import scan_courses_dir
+from src.models import Course, CourseScanState
+from src.query_stats import assert_max_queries
+
+
+def _write_course(courses_dir, folder, title=None, index=True):
+    path = os.path.join(courses_dir, folder)
+    os.makedirs(path, exist_ok=True)
+    if index:
+        with open(os.path.join(path, 'index.html'), 'w') as f:
+            f.write('<html></html>')
+    if title is not None:
+        with open(os.path.join(path, 'data.json'), 'w') as f:
+            json.dump({'course_title': title, 'topics': [['Science', 'Physics']],
+                       'instructors': [{'first_name': 'Ada', 'last_name': 'Lovelace'}],
+                       'image_src': './static_resources/thumb.jpg'}, f)
+    return path
+
+
+def _bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+@pytest.fixture
+def courses_dir(tmp_path):
+    path = tmp_path / 'courses'
+    path.mkdir()
+    for i in range(5):
+        _write_course(str(path), f'course-{i}', title=f'Course {i}')
+    _write_course(str(path), 'html-only')
+    (path / 'not-a-course').mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+    original = course_indexer.parse_data_json
+
+    def counting(folder, data):
+        calls.append(folder)
+        return original(folder, data)
+
+    monkeypatch.setattr(course_indexer, 'parse_data_json', counting)
+    return calls
+
+
+@pytest.mark.unit
+class TestIncrementalScan:
+    """Test that rescans only read and write what changed."""
+
+    def test_first_scan_imports_everything(self, app, courses_dir):
+        """Test that a first scan parses data.json and records a fingerprint per course."""
+        result = scan_courses_dir(courses_dir)
+
+        assert result == {'total': 6, 'new': 6, 'changed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        course = Course.query.filter_by(uid='course-0').first()
+        assert course.title == 'Course 0'
+        assert course.instructor == 'Ada Lovelace'
+        assert course.categories == 'Physics, Science'
+        assert course.thumbnail == 'course-0/static_resources/thumb.jpg'
+        assert Course.query.filter_by(uid='html-only').first().title == 'html only'
+        assert CourseScanState.query.count() == 6
+        assert len(db.session.get(CourseScanState, 'course-0').data_hash) == 64
+
+    def test_rescan_skips_unchanged_folders(self, app, courses_dir, parse_calls):
+        """Test that an unchanged tree parses nothing and writes nothing."""
+        scan_courses_dir(courses_dir)
+        parse_calls.clear()
+
+        # scan state + course uids, nothing else
+        with assert_max_queries(2):
+            result = scan_courses_dir(courses_dir)
+
+        assert result['unchanged'] == 6
+        assert result['new'] == result['changed'] == 0
+        assert parse_calls == []
+
+    def test_changed_data_json_is_reparsed(self, app, courses_dir, parse_calls):
+        """Test that editing one data.json updates exactly that course."""
+        scan_courses_dir(courses_dir)
+        parse_calls.clear()
+        _write_course(courses_dir, 'course-2', title='Course 2 (Revised)')
+        _bump_mtime(os.path.join(courses_dir, 'course-2', 'data.json'))
+
+        result = scan_courses_dir(courses_dir)
+
+        assert (result['changed'], result['unchanged']) == (1, 5)
+        assert parse_calls == ['course-2']
+        assert Course.query.filter_by(uid='course-2').first().title == 'Course 2 (Revised)'
+
+    def test_touched_but_identical_data_json_is_not_reparsed(self, app, courses_dir, parse_calls):
+        """Test that a new mtime with the same content only refreshes the fingerprint."""
+        scan_courses_dir(courses_dir)
+        parse_calls.clear()
+        data_path = os.path.join(courses_dir, 'course-1', 'data.json')
+        _bump_mtime(data_path)
+        _bump_mtime(os.path.join(courses_dir, 'course-1'))
+
+        result = scan_courses_dir(courses_dir)
+
+        assert result['unchanged'] == 6
+        assert parse_calls == []
+        assert db.session.get(CourseScanState, 'course-1').data_mtime_ns == os.stat(data_path).st_mtime_ns
+
+    def test_unchanged_folder_keeps_admin_edits(self, app, courses_dir):
+        """Test that a rescan does not overwrite fields edited since the last scan."""
+        scan_courses_dir(courses_dir)
+        Course.query.filter_by(uid='course-3').first().categories = 'Edited'
+        db.session.commit()
+
+        scan_courses_dir(courses_dir)
+
+        assert Course.query.filter_by(uid='course-3').first().categories == 'Edited'
+
+    def test_full_scan_reparses_everything(self, app, courses_dir, parse_calls):
+        """Test that full=True ignores fingerprints but still counts identical rows as unchanged."""
+        scan_courses_dir(courses_dir)
+        parse_calls.clear()
+
+        result = scan_courses_dir(courses_dir, full=True)
+
+        assert len(parse_calls) == 5
+        assert result['unchanged'] == 6
+
+    def test_removed_folders_are_reported(self, app, courses_dir):
+        """Test that deleted folders are counted and dropped from the scan state, keeping the course."""
+        scan_courses_dir(courses_dir)
+        os.remove(os.path.join(courses_dir, 'course-4', 'data.json'))
+        os.remove(os.path.join(courses_dir, 'course-4', 'index.html'))
+        os.rmdir(os.path.join(courses_dir, 'course-4'))
+
+        result = scan_courses_dir(courses_dir)
+
+        assert (result['total'], result['removed']) == (5, 1)
+        assert db.session.get(CourseScanState, 'course-4') is None
+        assert Course.query.filter_by(uid='course-4').first() is not None
+
+    def test_deleted_course_row_is_recreated(self, app, courses_dir):
+        """Test that a course deleted in the admin panel comes back although its folder is unchanged."""
+        scan_courses_dir(courses_dir)
+        db.session.delete(Course.query.filter_by(uid='course-0').first())
+        db.session.commit()
+
+        result = scan_courses_dir(courses_dir)
+
+        assert result['new'] == 1
+        assert Course.query.filter_by(uid='course-0').first().title == 'Course 0'
+
+    def test_invalid_data_json_counts_as_failed(self, app, courses_dir):
+        """Test that a broken data.json falls back to folder defaults."""
+        with open(os.path.join(courses_dir, 'course-0', 'data.json'), 'w') as f:
+            f.write('{not json')
+
+        result = scan_courses_dir(courses_dir)
+
+        assert result['failed'] == 1
+        assert Course.query.filter_by(uid='course-0').first().title == 'course 0'
+
+
+@pytest.mark.unit
+class TestParallelScan:
+    """Test the threaded filesystem stage and bulk writes."""
+
+    def test_threaded_and_inline_scans_agree(self, app, courses_dir):
+        """Test that the worker pool produces the same rows as an inline scan."""
+        threaded = scan_courses_dir(courses_dir, workers=4)
+        scanned = Course.query.filter(Course.uid != 'sample-course')
+        rows = {c.uid: (c.title, c.categories, c.instructor) for c in scanned}
+        db.session.execute(db.delete(CourseScanState))
+        db.session.execute(db.delete(Course).where(Course.uid != 'sample-course'))
+        db.session.commit()
+
+        inline = scan_courses_dir(courses_dir, workers=0)
+
+        assert threaded == inline
+        assert {c.uid: (c.title, c.categories, c.instructor)
+                for c in Course.query.filter(Course.uid != 'sample-course')} == rows
+
+    def test_bulk_writes_are_constant_in_course_count(self, app, courses_dir):
+        """Test that importing many courses costs a fixed number of statements."""
+        for i in range(5, 60):
+            _write_course(courses_dir, f'course-{i}', title=f'Course {i}')
+
+        # scan state + course uids + one IN lookup + manifest cleanup and insert, course and state inserts
+        # (+ transaction bookkeeping)
+        with assert_max_queries(9):
+            result = scan_courses_dir(courses_dir)
+
+        assert result['new'] == 61
+
+    def test_skips_plain_files(self, app, courses_dir):
+        """Test that zip files and other entries next to the course folders are ignored."""
+        with open(os.path.join(courses_dir, 'upload.zip'), 'wb') as f:
+            f.write(b'PK')
+
+        assert scan_courses_dir(courses_dir)['total'] == 6
+
+
+@pytest.mark.unit
+class TestBatchedImport:
+    """Test batch-by-batch writes and the volume import script built on them."""
+
+    def test_small_batches_import_everything(self, app, courses_dir):
+        """Test that a scan split into batches writes the same rows, with a fixed cost per batch."""
+        for i in range(5, 20):
+            _write_course(courses_dir, f'course-{i}', title=f'Course {i}')
+
+        # scan state + course uids, then manifest cleanup and insert, course and state inserts for each of
+        # the 6 batches, one extra insert for html-only's shorter column list (+ transaction bookkeeping)
+        with assert_max_queries(2 + 6 * 4 + 1 + 2):
+            result = scan_courses_dir(courses_dir, chunk_size=4)
+
+        assert result == {'total': 21, 'new': 21, 'changed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        assert Course.query.filter(Course.uid.like('course-%')).count() == 20
+        assert scan_courses_dir(courses_dir, full=True, chunk_size=4)['unchanged'] == 21
+
+    def test_failure_in_later_batch_rolls_back_earlier_batches(self, app, courses_dir):
+        """Test that an aborted scan leaves no partially imported batches behind."""
+        def abort_late(done, total):
+            if done == 5:
+                raise RuntimeError('cancelled')
+
+        with pytest.raises(RuntimeError):
+            scan_courses_dir(courses_dir, chunk_size=2, progress=abort_late)
+
+        assert CourseScanState.query.count() == 0
+        assert Course.query.filter(Course.uid != 'sample-course').count() == 0
+
+    def test_license_url_from_image_metadata(self, app, courses_dir):
+        """Test that the image license recorded in data.json is stored as the course license."""
+        path = os.path.join(courses_dir, 'course-0', 'data.json')
+        with open(path) as f:
+            data = json.load(f)
+        data['course_image_metadata'] = {'license': 'https://creativecommons.org/licenses/by-nc-sa/4.0/'}
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+        scan_courses_dir(courses_dir)
+
+        assert Course.query.filter_by(uid='course-0').first().license_url.endswith('/by-nc-sa/4.0/')
+        assert Course.query.filter_by(uid='course-1').first().license_url is None
+
+    def test_volume_import_script(self, app, courses_dir, monkeypatch, capsys):
+        """Test that import_courses_from_volume.py imports through scan_courses_dir and updates on rerun."""
+        spec = importlib.util.spec_from_file_location(
+            'import_courses_from_volume',
+            os.path.join(os.path.dirname(__file__), '..', 'scripts', 'import_courses_from_volume.py'))
+        script = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(script)
+        monkeypatch.setenv('COURSES_BASE_PATH', courses_dir)
+
+        assert script.import_courses(chunk_size=4)
+        _write_course(courses_dir, 'course-2', title='Course 2 (Revised)')
+        assert script.import_courses(chunk_size=4)
+
+        output = capsys.readouterr().out
+        assert 'New imports: 6' in output
+        assert 'Updates: 1' in output
+        assert Course.query.filter_by(uid='course-2').first().title == 'Course 2 (Revised)'
+
+
+PACKAGE_INDEX = """<html><body>
+<div class="intro"><h1>Docker for <b>Developers</b></h1></div>
+<div id="content-main"><ul>
+  <li><h2>Introduction</h2><p>Containers from   scratch.<br>Part one.</p><p>Second paragraph</p></li>
+  <li><p>Not the description</p></li>
+</ul></div>
+<div class="chapter"><a class="watch" data-video="videos/01-intro.mp4">Watch</a></div>
+</body></html>"""
+
+
+def _write_package_course(courses_dir, folder):
+    path = os.path.join(courses_dir, folder, 'package')
+    os.makedirs(path)
+    with open(os.path.join(path, 'index.html'), 'w') as f:
+        f.write(PACKAGE_INDEX)
+    return os.path.join(courses_dir, folder)
+
+
+@pytest.mark.unit
+class TestExtract:
+    """Test the side-effect free extraction shared by scan, import and build."""
+
+    def test_data_json_course(self, courses_dir):
+        """Test that an OCW folder yields a record with the data.json fields."""
+        record = course_indexer.extract(os.path.join(courses_dir, 'course-0'))
+
+        assert record.uid == 'course-0'
+        assert record.title == 'Course 0'
+        assert record.instructor == 'Ada Lovelace'
+        assert record.to_dict()['thumbnail'] == 'course-0/static_resources/thumb.jpg'
+        assert not record.failed
+
+    def test_html_only_record_sets_only_default_fields(self, courses_dir):
+        """Test that a folder without data.json does not carry the data.json columns."""
+        record = course_indexer.extract(os.path.join(courses_dir, 'html-only'))
+
+        assert record.to_dict() == {'uid': 'html-only', 'title': 'html only', 'path': 'html-only/index.html',
+                                    'description': '', 'categories': ''}
+        assert not hasattr(record, '__dict__')
+
+    def test_packaged_course_html(self, tmp_path):
+        """Test that package/index.html provides title, description and intro video."""
+        course_dir = _write_package_course(str(tmp_path), 'docker-devops-course')
+
+        record = course_indexer.extract(course_dir)
+
+        assert record.title == 'Docker for Developers'
+        assert record.description == 'Containers from scratch.Part one.'
+        assert record.path == 'docker-devops-course/package/index.html'
+        assert record.categories == 'DevOps'
+        assert record.intro_video == os.path.join(course_dir, 'package', 'videos/01-intro.mp4')
+
+    def test_not_a_course(self, courses_dir):
+        """Test that folders without any index or data.json give None."""
+        assert course_indexer.extract(os.path.join(courses_dir, 'not-a-course')) is None
+
+    def test_batch_matches_serial(self, courses_dir):
+        """Test that extract_batch returns the same records, in order, as extracting one by one."""
+        dirs = [os.path.join(courses_dir, name) for name in sorted(os.listdir(courses_dir))]
+
+        assert course_indexer.extract_batch(dirs, workers=4) == [course_indexer.extract(d) for d in dirs]
+
+
+@pytest.mark.unit
+class TestSaveRecords:
+    """Test the shared persistence step."""
+
+    def test_inserts_new_and_updates_only_changed_columns(self, app, courses_dir):
+        """Test that existing rows get only their differing columns written."""
+        scan_courses_dir(courses_dir)
+        Course.query.filter_by(uid='course-1').first().description = 'Edited by an admin'
+        db.session.commit()
+        records = [course_indexer.extract(os.path.join(courses_dir, 'course-0')),
+                   course_indexer.CourseRecord('brand-new', title='Brand New', path='brand-new/index.html')]
+        records[0].title = 'Renamed'
+
+        result = course_indexer.save_records(records)
+        db.session.commit()
+
+        assert result == {'new': 1, 'changed': 1, 'unchanged': 0}
+        assert Course.query.filter_by(uid='course-0').first().title == 'Renamed'
+        assert Course.query.filter_by(uid='course-1').first().description == 'Edited by an admin'
+        assert Course.query.filter_by(uid='brand-new').first().title == 'Brand New'
+
+    def test_build_uses_shared_extraction(self, app, tmp_path, monkeypatch):
+        """Test that build.py imports packaged courses through extract_batch and save_records."""
+        from src import build
+        _write_package_course(str(tmp_path / 'courses'), 'docker-devops-course')
+        monkeypatch.setattr('sys.argv', ['build.py', str(tmp_path)])
+
+        build.main()
+        build.main()
+
+        uid = hashlib.md5(b'docker-devops-course').hexdigest()
+        courses = Course.query.filter_by(uid=uid).all()
+        assert len(courses) == 1
+        assert courses[0].title == 'Docker for Developers'
+        assert courses[0].thumbnail == 'images/default_course.jpg'
+
+
+@pytest.mark.integration
+class TestScanEndpoint:
+    """Test /api/admin/scan-courses."""
+
+    def test_reports_incremental_counts(self, app, admin_user, csrf_token, tmp_path):
+        """Test that the scan runs as a job whose result has new/changed/unchanged/removed counts."""
+        client = admin_user['client']
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        try:
+            _write_course(str(tmp_path / 'courses'), 'endpoint-course', title='Endpoint Course')
+            first = client.post('/api/admin/scan-courses', headers={'X-CSRFToken': csrf_token})
+            second = client.post('/api/admin/scan-courses', headers={'X-CSRFToken': csrf_token})
+        finally:
+            app.config['CONTENT_DIR'] = content_dir
+
+        assert first.status_code == 202
+        first_result = client.get(first.get_json()['status_url']).get_json()['job']['result']
+        second_result = client.get(second.get_json()['status_url']).get_json()['job']['result']
+        assert (first_result['total'], first_result['new']) == (1, 1)
+        assert (second_result['new'], second_result['unchanged'], second_result['existing']) == (0, 1, 1)
@@ -0,0 +1,262 @@
+"""
+Course file manifest test suite.
+Tests manifest building and encoding, scan integration, serving from the manifest and the integrity check.
+"""
+import os
+import pytest
+from src.app import db
+from src import course_manifest
+from src.course_indexer import scan_courses_dir
+from src.course_manifest import Manifest, ManifestCache, build_manifest, get_manifest_cache, hash_file, verify_course
+from src.models import CourseManifest
+
+PAGE = b'<html><body>Lecture 1</body></html>'
+
+
+def _course(root, name, files):
+    for relative, data in files.items():
+        path = root / name / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return root / name
+
+
+def _stored(uid):
+    return Manifest.decode(db.session.get(CourseManifest, uid).data)
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    calls = []
+    original = course_manifest.hash_file
+
+    def counting(path):
+        calls.append(os.path.basename(path))
+        return original(path)
+
+    monkeypatch.setattr(course_manifest, 'hash_file', counting)
+    return calls
+
+
+@pytest.mark.unit
+class TestManifest:
+    """Test build_manifest(), the stored encoding and verify_course()."""
+
+    def test_build_and_round_trip(self, tmp_path):
+        """Test that every file is listed with size, hash and mime, and survives encode/decode."""
+        course = _course(tmp_path, 'physics', {'index.html': PAGE, 'css/site.css': b'body {}',
+                                                'video/lecture.bin': b'\0' * 100})
+
+        manifest = build_manifest(str(course))
+        decoded = Manifest.decode(manifest.encode())
+
+        assert sorted(decoded.entries) == ['css/site.css', 'index.html', 'video/lecture.bin']
+        entry = decoded.get('index.html')
+        assert (entry.size, entry.sha256, entry.mime) == (len(PAGE), hash_file(course / 'index.html'), 'text/html')
+        assert decoded.get('css/site.css').mime == 'text/css'
+        assert decoded.get('video/lecture.bin').mime == 'application/octet-stream'
+        assert decoded.total_bytes == len(PAGE) + 7 + 100
+
+    def test_rebuild_rehashes_only_changed_files(self, tmp_path, hashed):
+        """Test that files with unchanged size and mtime keep their stored hash."""
+        course = _course(tmp_path, 'physics', {'index.html': PAGE, 'notes.txt': b'v1'})
+        previous = build_manifest(str(course))
+        hashed.clear()
+
+        (course / 'notes.txt').write_bytes(b'version 2')
+        rebuilt = build_manifest(str(course), previous)
+
+        assert hashed == ['notes.txt']
+        assert rebuilt.get('notes.txt').sha256 == hash_file(course / 'notes.txt')
+
+    def test_verify_reports_drift(self, tmp_path):
+        """Test that missing, modified (same size too) and unexpected files are all found."""
+        course = _course(tmp_path, 'physics', {'index.html': PAGE, 'a.txt': b'aaaa', 'b.txt': b'bbbb'})
+        manifest = build_manifest(str(course))
+        assert verify_course(str(course), manifest)['modified'] == 0
+
+        (course / 'a.txt').unlink()
+        (course / 'b.txt').write_bytes(b'BBBB')
+        (course / 'extra.txt').write_bytes(b'new')
+        report = verify_course(str(course), manifest)
+
+        assert (report['files'], report['missing'], report['modified'], report['unexpected']) == (2, 1, 1, 1)
+        assert report['paths'] == {'missing': ['a.txt'], 'modified': ['b.txt'], 'unexpected': ['extra.txt']}
+
+    def test_cache_expiry_and_eviction(self, app, tmp_path):
+        """Test that cached manifests expire after the TTL and the least recently used are evicted."""
+        now = [0.0]
+        cache = ManifestCache(ttl=60, max_entries=2, clock=lambda: now[0])
+        for uid in ('a', 'b', 'c'):
+            db.session.add(CourseManifest(uid=uid, data=Manifest().encode()))
+        db.session.commit()
+
+        first = cache.get('a')
+        assert cache.get('a') is first
+        cache.get('b')
+        cache.get('c')
+        assert list(cache._entries) == ['b', 'c']
+
+        now[0] = 61
+        assert cache.get('c') is not None and cache._entries['c'][0] == 61
+
+
+@pytest.mark.unit
+class TestScanManifests:
+    """Test that scans keep manifests in line with the course folders."""
+
+    def test_scan_builds_and_refreshes_manifests(self, app, tmp_path, hashed):
+        """Test new folders get a manifest and changed folders a rebuild, reusing hashes."""
+        _course(tmp_path, 'physics', {'index.html': PAGE, 'notes.txt': b'v1'})
+        scan_courses_dir(str(tmp_path), workers=0)
+        assert sorted(_stored('physics').entries) == ['index.html', 'notes.txt']
+
+        hashed.clear()
+        scan_courses_dir(str(tmp_path), workers=0)
+        assert hashed == []  # Unchanged folder: manifest left alone
+
+        (tmp_path / 'physics' / 'syllabus.txt').write_bytes(b'weeks 1-12')
+        scan_courses_dir(str(tmp_path), workers=0)
+
+        assert hashed == ['syllabus.txt']
+        assert db.session.get(CourseManifest, 'physics').files == 3
+
+    def test_removed_folder_drops_manifest(self, app, tmp_path):
+        """Test that a folder gone from the volume loses its manifest."""
+        course = _course(tmp_path, 'physics', {'index.html': PAGE})
+        scan_courses_dir(str(tmp_path), workers=0)
+
+        (course / 'index.html').unlink()
+        course.rmdir()
+        scan_courses_dir(str(tmp_path), workers=0)
+
+        assert db.session.get(CourseManifest, 'physics') is None
+
+    def test_disabled(self, app, tmp_path):
+        """Test that manifests=False skips them entirely."""
+        _course(tmp_path, 'physics', {'index.html': PAGE})
+
+        scan_courses_dir(str(tmp_path), workers=0, manifests=False)
+
+        assert CourseManifest.query.count() == 0
+
+
+@pytest.mark.integration
+class TestServeCourseFiles:
+    """Test /courses/<path> with and without a manifest."""
+
+    @pytest.fixture
+    def courses_dir(self, app, tmp_path):
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        (tmp_path / 'courses').mkdir()
+        get_manifest_cache().clear()
+        yield tmp_path / 'courses'
+        get_manifest_cache().clear()
+        app.config['CONTENT_DIR'] = content_dir
+
+    def test_listed_file_has_strong_etag(self, client, courses_dir):
+        """Test the sha256 ETag and a 304 for a matching If-None-Match."""
+        _course(courses_dir, 'physics', {'index.html': PAGE})
+        scan_courses_dir(str(courses_dir), workers=0)
+        digest = hash_file(courses_dir / 'physics' / 'index.html')
+
+        response = client.get('/courses/physics/index.html')
+        revalidated = client.get('/courses/physics/index.html', headers={'If-None-Match': f'"{digest}"'})
+
+        assert response.status_code == 200
+        assert response.data == PAGE
+        assert response.headers['ETag'] == f'"{digest}"'
+        assert revalidated.status_code == 304
+        assert revalidated.headers['ETag'] == f'"{digest}"'
+
+    def test_file_added_after_scan_is_served(self, client, courses_dir):
+        """Test that a nested file added since the scan is served from disk, and unknown paths are 404."""
+        _course(courses_dir, 'physics', {'index.html': PAGE, 'pages/a.html': PAGE})
+        scan_courses_dir(str(courses_dir), workers=0)
+        (courses_dir / 'physics' / 'pages' / 'late.html').write_bytes(b'late')
+
+        response = client.get('/courses/physics/pages/late.html')
+
+        assert response.status_code == 200
+        assert response.data == b'late'
+        assert client.get('/courses/physics/nope.html').status_code == 404
+
+    def test_file_edited_after_scan_drops_stored_etag(self, client, courses_dir):
+        """Test that a nested file changed since the scan never gets its old sha256 as ETag or a 304."""
+        _course(courses_dir, 'physics', {'index.html': PAGE, 'pages/a.html': PAGE})
+        scan_courses_dir(str(courses_dir), workers=0)
+        old_digest = hash_file(courses_dir / 'physics' / 'pages' / 'a.html')
+        edited = courses_dir / 'physics' / 'pages' / 'a.html'
+        edited.write_bytes(b'<html>edited</html>')
+        os.utime(edited, ns=(edited.stat().st_atime_ns, edited.stat().st_mtime_ns + 1_000_000_000))
+
+        response = client.get('/courses/physics/pages/a.html', headers={'If-None-Match': f'"{old_digest}"'})
+
+        assert response.status_code == 200
+        assert response.data == b'<html>edited</html>'
+        assert response.headers.get('ETag') != f'"{old_digest}"'
+
+    def test_course_without_manifest_falls_back(self, client, courses_dir):
+        """Test that courses not scanned since manifests were added are still served from disk."""
+        _course(courses_dir, 'legacy', {'index.html': PAGE})
+
+        response = client.get('/courses/legacy/index.html')
+
+        assert response.status_code == 200
+        assert response.data == PAGE
+
+    def test_dot_directories_are_hidden(self, client, courses_dir):
+        """Test that upload parts and the content store are never served."""
+        _course(courses_dir, '.uploads', {'abc.part': b'partial'})
+
+        assert client.get('/courses/.uploads/abc.part').status_code == 404
+
+
+@pytest.mark.integration
+class TestVerifyEndpoint:
+    """Test /api/admin/verify-courses."""
+
+    @pytest.fixture
+    def courses_dir(self, app, tmp_path):
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        (tmp_path / 'courses').mkdir()
+        yield tmp_path / 'courses'
+        app.config['CONTENT_DIR'] = content_dir
+
+    def test_verify_job_reports_problems(self, admin_user, csrf_token, courses_dir):
+        """Test that a corrupted file is reported and an untouched course counts as intact."""
+        _course(courses_dir, 'physics', {'index.html': PAGE})
+        _course(courses_dir, 'chemistry', {'index.html': PAGE, 'notes.txt': b'intact'})
+        scan_courses_dir(str(courses_dir), workers=0)
+        (courses_dir / 'physics' / 'index.html').write_bytes(b'corrupted')
+        client = admin_user['client']
+
+        response = client.post('/api/admin/verify-courses', headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 202
+        result = client.get(response.get_json()['status_url']).get_json()['job']['result']
+        assert (result['courses'], result['intact'], result['modified']) == (2, 1, 1)
+        assert result['problems'][0]['uid'] == 'physics'
+        assert result['problems'][0]['paths']['modified'] == ['index.html']
+
+    def test_verify_selected_courses(self, admin_user, csrf_token, courses_dir):
+        """Test the uids filter and courses without a manifest."""
+        _course(courses_dir, 'physics', {'index.html': PAGE})
+        scan_courses_dir(str(courses_dir), workers=0)
+        client = admin_user['client']
+
+        response = client.post('/api/admin/verify-courses', json={'uids': ['physics', 'unknown']},
+                               headers={'X-CSRFToken': csrf_token})
+        invalid = client.post('/api/admin/verify-courses', json={'uids': 'physics'},
+                              headers={'X-CSRFToken': csrf_token})
+
+        result = client.get(response.get_json()['status_url']).get_json()['job']['result']
+        assert (result['courses'], result['intact'], result['no_manifest']) == (1, 1, ['unknown'])
+        assert invalid.status_code == 400
+
+    def test_requires_admin(self, authenticated_user, csrf_token):
+        """Test that regular users cannot run the check."""
+        response = authenticated_user['client'].post('/api/admin/verify-courses', headers={'X-CSRFToken': csrf_token})
+        assert response.status_code == 403
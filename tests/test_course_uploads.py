@@ -0,0 +1,244 @@
+"""
+Resumable course upload test suite.
+Tests chunk writes, offsets and resume, checksums, completion jobs and upload expiry.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import zipfile
+from datetime import datetime, timedelta
+import pytest
+from src.app import db
+from src.course_uploads import COPY_BLOCK, UploadError, expire_uploads, part_path, write_chunk
+from src.models import CourseUpload
+
+
+class DroppingStream(io.BytesIO):
+    """Request body whose connection drops after `limit` bytes; records read sizes."""
+
+    def __init__(self, data, limit=None):
+        super().__init__(data)
+        self.limit = limit
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        if self.limit is not None and self.tell() >= self.limit:
+            raise ConnectionResetError('client went away')
+        if self.limit is not None:
+            size = min(size, self.limit - self.tell())
+        return super().read(size)
+
+
+@pytest.fixture
+def courses_dir(app, tmp_path):
+    content_dir = app.config.get('CONTENT_DIR')
+    app.config['CONTENT_DIR'] = str(tmp_path)
+    yield tmp_path / 'courses'
+    app.config['CONTENT_DIR'] = content_dir
+
+
+def _zip_bytes():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('index.html', '<html></html>')
+        zf.writestr('videos/intro.txt', 'x' * 5000)
+    return archive.getvalue()
+
+
+def _start(client, csrf_token, filename, data, **extra):
+    response = client.post('/api/admin/uploads', json={'filename': filename, 'size': len(data), **extra},
+                           headers={'X-CSRFToken': csrf_token})
+    assert response.status_code == 201
+    return response.get_json()['upload']['id']
+
+
+def _put(client, csrf_token, upload_id, offset, chunk, **headers):
+    return client.put(f'/api/admin/uploads/{upload_id}?offset={offset}', data=chunk,
+                      headers={'X-CSRFToken': csrf_token, 'Content-Type': 'application/octet-stream', **headers})
+
+
+@pytest.mark.unit
+class TestWriteChunk:
+    """Test streaming one chunk into the part file."""
+
+    def test_streams_in_blocks(self, tmp_path):
+        """Test that the body is copied block by block, never read whole."""
+        path = tmp_path / 'a.part'
+        path.write_bytes(b'')
+        data = os.urandom(COPY_BLOCK * 2 + 10)
+        stream = DroppingStream(data)
+
+        assert write_chunk(str(path), 0, stream, len(data), len(data)) == len(data)
+        assert path.read_bytes() == data
+        assert max(stream.reads) <= COPY_BLOCK
+
+    def test_dropped_connection_keeps_received_bytes(self, tmp_path):
+        """Test that a chunk without checksum keeps what arrived, so the client can resume from there."""
+        path = tmp_path / 'a.part'
+        path.write_bytes(b'')
+
+        with pytest.raises(ConnectionResetError):
+            write_chunk(str(path), 0, DroppingStream(b'x' * 100, limit=60), 100, 1000)
+
+        assert path.stat().st_size == 60
+        assert write_chunk(str(path), 60, io.BytesIO(b'y' * 40), 40, 1000) == 100
+
+    def test_checksummed_chunk_is_all_or_nothing(self, tmp_path):
+        """Test that a cut-off or corrupted checksummed chunk is truncated away."""
+        path = tmp_path / 'a.part'
+        path.write_bytes(b'head')
+        chunk = b'z' * 100
+        digest = hashlib.sha256(chunk).hexdigest()
+
+        with pytest.raises(ConnectionResetError):
+            write_chunk(str(path), 4, DroppingStream(chunk, limit=50), 100, 1000, sha256=digest)
+        with pytest.raises(UploadError, match='checksum'):
+            write_chunk(str(path), 4, io.BytesIO(b'q' * 100), 100, 1000, sha256=digest)
+
+        assert path.read_bytes() == b'head'
+        assert write_chunk(str(path), 4, io.BytesIO(chunk), 100, 1000, sha256=digest) == 104
+
+    def test_rejects_wrong_offset_and_overflow(self, tmp_path):
+        """Test 409 with the real offset, and chunks past the declared size."""
+        path = tmp_path / 'a.part'
+        path.write_bytes(b'12345')
+
+        with pytest.raises(UploadError) as conflict:
+            write_chunk(str(path), 0, io.BytesIO(b'abc'), 3, 100)
+        with pytest.raises(UploadError) as overflow:
+            write_chunk(str(path), 5, io.BytesIO(b'abc'), 3, 6)
+
+        assert (conflict.value.status, conflict.value.offset) == (409, 5)
+        assert overflow.value.status == 400
+
+    def test_concurrent_chunk_is_rejected(self, tmp_path):
+        """Test that a chunk arriving while another is being written gets 409 instead of appending too."""
+        path = tmp_path / 'a.part'
+        path.write_bytes(b'12345')
+
+        with open(path, 'ab') as writer:
+            fcntl.flock(writer, fcntl.LOCK_EX)
+            with pytest.raises(UploadError) as busy:
+                write_chunk(str(path), 5, io.BytesIO(b'abc'), 3, 100)
+
+        assert (busy.value.status, busy.value.offset) == (409, 5)
+        assert write_chunk(str(path), 5, io.BytesIO(b'abc'), 3, 100) == 8
+
+
+@pytest.mark.integration
+class TestUploadEndpoints:
+    """Test /api/admin/uploads."""
+
+    def test_chunked_zip_upload_is_extracted(self, app, admin_user, csrf_token, courses_dir):
+        """Test init, chunks, status and completion of a zip upload."""
+        client = admin_user['client']
+        data = _zip_bytes()
+        upload_id = _start(client, csrf_token, 'video-course.zip', data, sha256=hashlib.sha256(data).hexdigest())
+
+        for offset in range(0, len(data), 1000):
+            chunk = data[offset:offset + 1000]
+            response = _put(client, csrf_token, upload_id, offset, chunk,
+                            **{'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()})
+            assert response.get_json()['offset'] == offset + len(chunk)
+        assert client.get(f'/api/admin/uploads/{upload_id}').get_json()['upload']['offset'] == len(data)
+
+        response = client.post(f'/api/admin/uploads/{upload_id}/complete', headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 202
+        job = client.get(response.get_json()['status_url']).get_json()['job']
+        assert job['status'] == 'succeeded'
+        assert job['result']['files'] == 2
+        assert (courses_dir / 'video-course' / 'videos' / 'intro.txt').exists()
+        assert not (courses_dir / 'video-course.zip').exists()
+        assert not os.path.exists(part_path(str(courses_dir), upload_id))
+        assert db.session.get(CourseUpload, upload_id) is None
+
+    def test_resume_after_conflict(self, app, admin_user, csrf_token, courses_dir):
+        """Test that a chunk sent at a stale offset gets 409 with the offset to resume from."""
+        client = admin_user['client']
+        upload_id = _start(client, csrf_token, 'notes.pdf', b'a' * 30)
+        _put(client, csrf_token, upload_id, 0, b'a' * 10)
+
+        response = _put(client, csrf_token, upload_id, 0, b'a' * 10)
+
+        assert response.status_code == 409
+        assert response.get_json()['offset'] == 10
+
+    def test_incomplete_upload_cannot_complete(self, app, admin_user, csrf_token, courses_dir):
+        """Test that completion is refused until every byte arrived."""
+        client = admin_user['client']
+        upload_id = _start(client, csrf_token, 'notes.pdf', b'a' * 30)
+        _put(client, csrf_token, upload_id, 0, b'a' * 10)
+
+        response = client.post(f'/api/admin/uploads/{upload_id}/complete', headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 409
+        assert response.get_json()['offset'] == 10
+
+    def test_file_checksum_mismatch_fails_job(self, app, admin_user, csrf_token, courses_dir):
+        """Test that a whole-file checksum mismatch fails the job and discards the upload."""
+        client = admin_user['client']
+        upload_id = _start(client, csrf_token, 'notes.pdf', b'a' * 10, sha256='0' * 64)
+        _put(client, csrf_token, upload_id, 0, b'a' * 10)
+
+        response = client.post(f'/api/admin/uploads/{upload_id}/complete', headers={'X-CSRFToken': csrf_token})
+
+        job = client.get(response.get_json()['status_url']).get_json()['job']
+        assert job['status'] == 'failed'
+        assert 'Checksum mismatch' in job['error']
+        assert not (courses_dir / 'notes.pdf').exists()
+        assert client.get(f'/api/admin/uploads/{upload_id}').status_code == 404
+
+    def test_limits(self, app, admin_user, csrf_token, courses_dir):
+        """Test the per-chunk and total size limits."""
+        client = admin_user['client']
+        app.config['COURSE_UPLOAD_CHUNK_SIZE'] = 16
+        try:
+            upload_id = _start(client, csrf_token, 'notes.pdf', b'a' * 100)
+            too_big = _put(client, csrf_token, upload_id, 0, b'a' * 17)
+        finally:
+            app.config['COURSE_UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+        too_large_file = client.post('/api/admin/uploads', json={'filename': 'huge.zip', 'size': 10 ** 15},
+                                     headers={'X-CSRFToken': csrf_token})
+
+        assert too_big.status_code == 413
+        assert too_large_file.status_code == 413
+
+    def test_abort_and_expiry(self, app, admin_user, csrf_token, courses_dir):
+        """Test DELETE and the cleanup of abandoned uploads."""
+        client = admin_user['client']
+        aborted = _start(client, csrf_token, 'a.zip', b'a' * 10)
+        stale = _start(client, csrf_token, 'b.zip', b'a' * 10)
+        assert client.delete(f'/api/admin/uploads/{aborted}', headers={'X-CSRFToken': csrf_token}).status_code == 200
+
+        db.session.get(CourseUpload, stale).created_at = datetime.utcnow() - timedelta(days=2)
+        db.session.commit()
+        old = (datetime.utcnow() - timedelta(days=2)).timestamp()
+        os.utime(part_path(str(courses_dir), stale), (old, old))
+
+        assert expire_uploads(str(courses_dir), max_age_hours=24) == 1
+        assert CourseUpload.query.count() == 0
+        assert os.listdir(courses_dir / '.uploads') == []
+
+    def test_expiry_sweeps_abandoned_staging_dirs(self, courses_dir):
+        """Test that extraction staging directories left by a killed process are removed once old."""
+        abandoned = courses_dir / '.extract-abandoned'
+        (abandoned / 'videos').mkdir(parents=True)
+        (abandoned / 'videos' / 'intro.mp4').write_bytes(b'partial')
+        in_progress = courses_dir / '.extract-running'
+        in_progress.mkdir()
+        old = (datetime.utcnow() - timedelta(days=2)).timestamp()
+        os.utime(abandoned, (old, old))
+
+        expire_uploads(str(courses_dir), max_age_hours=24)
+
+        assert not abandoned.exists()
+        assert in_progress.exists()
+
+    def test_requires_admin(self, authenticated_user, csrf_token):
+        """Test that regular users cannot start uploads."""
+        response = authenticated_user['client'].post('/api/admin/uploads', json={'filename': 'a.zip', 'size': 1},
+                                                     headers={'X-CSRFToken': csrf_token})
+        assert response.status_code == 403
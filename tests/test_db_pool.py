@@ -0,0 +1,131 @@
+"""
+Connection pool instrumentation test suite.
+Tests checkout accounting, timeouts, invalidations and sizing recommendations.
+"""
+import threading
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from src.db_pool import InstrumentedQueuePool, get_pool_stats, pool_recommendation
+
+
+def _engine(tmp_path, **kwargs):
+    return create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, **kwargs)
+
+
+@pytest.mark.unit
+class TestInstrumentedQueuePool:
+    """Test the counters recorded by InstrumentedQueuePool."""
+
+    def test_checkouts_and_peak_recorded(self, tmp_path):
+        """Test that concurrent checkouts raise the peak and overflow counts."""
+        engine = _engine(tmp_path, pool_size=1, max_overflow=2, pool_pre_ping=True)
+
+        first, second = engine.connect(), engine.connect()
+        first.execute(text('SELECT 1'))
+        first.close()
+        second.close()
+        with engine.connect() as conn:  # Reused connection gets pre-pinged
+            conn.execute(text('SELECT 1'))
+
+        stats = get_pool_stats(engine)
+        assert stats['checkouts'] == 3
+        assert stats['peak_checked_out'] == 2
+        assert stats['peak_overflow'] == 1
+        assert stats['pre_ping_avg_ms'] >= 0
+        engine.dispose()
+
+    def test_timeout_counted(self, tmp_path):
+        """Test that a checkout that times out is counted."""
+        engine = _engine(tmp_path, pool_size=1, max_overflow=0, pool_timeout=0.05)
+        held = engine.connect()
+        try:
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+        finally:
+            held.close()
+
+        stats = get_pool_stats(engine)
+        assert stats['timeouts'] == 1
+        assert stats['checkout_wait_max_ms'] >= 50
+        engine.dispose()
+
+    def test_invalidation_counted_and_stats_survive_dispose(self, tmp_path):
+        """Test invalidation events and that engine.dispose() keeps the counters."""
+        engine = _engine(tmp_path, pool_size=2, max_overflow=0)
+        with engine.connect() as conn:
+            conn.invalidate()
+        engine.dispose()
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+        stats = get_pool_stats(engine)
+        assert stats['invalidations'] == 1
+        assert stats['checkouts'] == 2
+        engine.dispose()
+
+    def test_concurrent_checkouts(self, tmp_path):
+        """Test that counts stay consistent under concurrent use."""
+        engine = _engine(tmp_path, pool_size=4, max_overflow=0)
+
+        def work():
+            for _ in range(20):
+                with engine.connect() as conn:
+                    conn.execute(text('SELECT 1'))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = get_pool_stats(engine)
+        assert stats['checkouts'] == 80
+        assert 1 <= stats['peak_checked_out'] <= 4
+        engine.dispose()
+
+
+@pytest.mark.unit
+class TestPoolRecommendation:
+    """Test sizing advice from observed usage."""
+
+    def test_oversized_pool_trimmed_to_threads(self):
+        """Test that pool_size + max_overflow beyond the thread count is flagged."""
+        advice = pool_recommendation(pool_size=10, max_overflow=20, peak_checked_out=3, threads=4)
+
+        assert advice['pool_size'] == 4
+        assert advice['pool_size'] + advice['max_overflow'] == 5
+        assert 'at most 5 connections' in advice['notes'][0]
+
+    def test_timeouts_size_for_every_thread(self):
+        """Test that timeouts recommend a connection per thread."""
+        advice = pool_recommendation(pool_size=2, max_overflow=0, peak_checked_out=2, threads=8, timeouts=3)
+
+        assert advice['pool_size'] == 9
+        assert any('timed out' in note for note in advice['notes'])
+
+    def test_rate_limit_backend_and_job_workers_counted(self):
+        """Test two connections per thread with the database rate limiter, two per job worker, one for health."""
+        advice = pool_recommendation(pool_size=5, max_overflow=10, peak_checked_out=12, threads=4,
+                                     connections_per_thread=2, job_workers=2)
+
+        assert advice['pool_size'] + advice['max_overflow'] == 13
+        assert advice['pool_size'] == 13
+        assert 'at most 13 connections' in advice['notes'][0]
+
+
+@pytest.mark.integration
+class TestPoolHealth:
+    """Test that /health/deep exposes pool usage."""
+
+    def test_deep_health_reports_usage(self, client):
+        """Test the pool component includes usage and a recommendation."""
+        from src.app import db, health_monitor
+        if get_pool_stats(db.engine) is None:
+            pytest.skip('Database URL uses a pool without fixed capacity')
+        health_monitor.refresh()
+
+        pool = client.get('/health/deep').get_json()['components']['pool']
+
+        assert pool['usage']['checkouts'] >= 1
+        assert 'pool_size' in pool['recommendation']
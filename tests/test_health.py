@@ -0,0 +1,150 @@
+"""
+Health monitor test suite.
+Tests cached health snapshots, staleness, /health, /health/deep and /ready.
+"""
+import time
+import pytest
+from src.health import HealthMonitor, DEGRADED, HEALTHY, UNHEALTHY
+
+
+class FakePool:
+    """QueuePool stand-in with fixed counts."""
+
+    def __init__(self, size, max_overflow, checked_out):
+        self._size = size
+        self._max_overflow = max_overflow
+        self._checked_out = checked_out
+
+    def size(self):
+        return self._size
+
+    def checkedout(self):
+        return self._checked_out
+
+    def overflow(self):
+        return self._checked_out - self._size
+
+
+class FakeEngine:
+    def __init__(self, pool):
+        self.pool = pool
+
+
+@pytest.mark.unit
+class TestHealthMonitor:
+    """Test check aggregation and caching."""
+
+    def test_critical_and_non_critical_failures(self):
+        """Test that only critical checks make the snapshot unhealthy."""
+        monitor = HealthMonitor(enabled=False)
+        monitor.add_check('database', lambda: {'status': HEALTHY})
+        monitor.add_check('calibre', lambda: {'status': DEGRADED}, critical=False)
+        assert monitor.refresh()['status'] == DEGRADED
+
+        def broken():
+            raise RuntimeError('connection refused')
+
+        monitor.add_check('storage', broken)
+        snapshot = monitor.refresh()
+        assert snapshot['status'] == UNHEALTHY
+        assert snapshot['components']['storage']['error'] == 'connection refused'
+
+    def test_snapshot_cached_within_interval(self):
+        """Test that probes within the interval do not re-run the checks."""
+        calls = []
+        monitor = HealthMonitor(interval=60, enabled=False)
+        monitor.add_check('database', lambda: calls.append(1) or {'status': HEALTHY})
+
+        for _ in range(5):
+            snapshot = monitor.snapshot()
+
+        assert len(calls) == 1
+        assert snapshot['age_seconds'] >= 0
+
+    def test_stale_snapshot_reported_unhealthy(self):
+        """Test that an old snapshot (stalled monitor) is not served as healthy."""
+        monitor = HealthMonitor(interval=60, stale_after=1, enabled=False)
+        monitor.add_check('database', lambda: {'status': HEALTHY})
+        monitor.refresh()
+        monitor._snapshot['checked_at'] -= 5
+
+        snapshot = monitor.snapshot()
+
+        assert snapshot['status'] == UNHEALTHY
+        assert 'stalled' in snapshot['error']
+
+    def test_background_thread_refreshes(self):
+        """Test that the monitor thread keeps the snapshot fresh."""
+        calls = []
+        monitor = HealthMonitor(interval=0.05, enabled=True)
+        monitor.add_check('database', lambda: calls.append(1) or {'status': HEALTHY})
+        try:
+            monitor.snapshot()
+            time.sleep(0.3)
+            assert len(calls) >= 3
+        finally:
+            monitor.stop()
+
+    def test_pool_status(self):
+        """Test saturation from QueuePool counts."""
+        from src.health import pool_status
+
+        stats = pool_status(FakeEngine(FakePool(size=10, max_overflow=20, checked_out=27)))
+
+        assert stats['saturation'] == 0.9
+        assert stats['overflow'] == 17
+        assert pool_status(FakeEngine(object())) is None
+
+
+@pytest.mark.integration
+class TestHealthEndpoints:
+    """Test the probes served from the cached snapshot."""
+
+    def test_health_serves_cached_snapshot(self, client, monkeypatch):
+        """Test that /health reports the snapshot age and does not query per probe."""
+        from src.app import health_monitor
+        from src.query_stats import assert_max_queries
+        health_monitor.refresh()
+
+        with assert_max_queries(0):
+            response = client.get('/health')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] in (HEALTHY, DEGRADED)
+        assert 'age_seconds' in data
+
+    def test_health_unhealthy_when_database_down(self, client, monkeypatch):
+        """Test a 503 naming the failed component."""
+        from src.app import health_monitor
+        monkeypatch.setattr(health_monitor, '_checks', [
+            ('database', lambda: {'status': UNHEALTHY, 'error': 'db down'}, True)])
+        health_monitor.refresh()
+
+        response = client.get('/health')
+
+        assert response.status_code == 503
+        assert 'database: db down' in response.get_json()['error']
+        assert client.get('/ready').status_code == 503
+
+    def test_deep_includes_cached_and_live_components(self, client):
+        """Test that /health/deep merges monitor components with in-process ones."""
+        from src.app import health_monitor
+        health_monitor.refresh()
+
+        data = client.get('/health/deep').get_json()
+
+        assert {'database', 'storage', 'calibre', 'pool', 'csrf'} <= set(data['components'])
+        assert 'latency_ms' in data['components']['database']
+
+    def test_ready_fails_on_pool_saturation(self, client, monkeypatch):
+        """Test that /ready reports an almost exhausted pool."""
+        import src.app as app_module
+        app_module.health_monitor.refresh()
+        monkeypatch.setattr(app_module, 'pool_status', lambda engine: {
+            'pool_size': 10, 'max_overflow': 20, 'checked_out': 29, 'overflow': 19, 'saturation': 0.967})
+
+        response = client.get('/ready')
+
+        assert response.status_code == 503
+        assert 'connection pool' in response.get_json()['reasons'][0]
@@ -0,0 +1,249 @@
+"""
+Admin job runner test suite.
+Tests background execution, progress, cancellation, orphan cleanup and the job endpoints.
+"""
+import io
+import os
+import socket
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+import pytest
+from src.app import db
+from src.admin_api import _run_script_job
+from src.jobs import JobRunner, get_job_runner, SUCCEEDED, FAILED, CANCELLED, RUNNING
+from src.models import AdminJob
+
+
+@pytest.fixture
+def runner(app):
+    runner = JobRunner(app, workers=2, progress_interval=0)
+    yield runner
+    runner.shutdown()
+
+
+def _counting_job(job, steps):
+    for step in range(1, steps + 1):
+        job.report(step * 100 // steps, f'step {step}')
+    return {'steps': steps}
+
+
+@pytest.mark.unit
+class TestJobRunner:
+    """Test JobRunner on a real thread pool."""
+
+    def test_job_succeeds_with_result(self, app, runner):
+        """Test that a job runs in the background and stores its result."""
+        job_id = runner.submit('count', _counting_job, 5, user_id=7)
+        job = runner.wait(job_id, timeout=10)
+
+        assert job.status == SUCCEEDED
+        assert job.progress == 100
+        assert job.to_dict()['result'] == {'steps': 5}
+        assert job.created_by == 7
+        assert job.started_at and job.finished_at
+
+    def test_failing_job_records_error(self, app, runner):
+        """Test that an exception marks the job failed with its message."""
+        def broken(job):
+            raise ValueError('bad course folder')
+
+        job = runner.wait(runner.submit('broken', broken), timeout=10)
+
+        assert job.status == FAILED
+        assert job.error == 'bad course folder'
+
+    def test_cancel_running_job(self, app, runner):
+        """Test that a running job stops at its next report() after cancel()."""
+        started = threading.Event()
+
+        def long_job(job):
+            started.set()
+            while True:
+                job.report(message='working')
+                time.sleep(0.01)
+
+        job_id = runner.submit('long', long_job)
+        assert started.wait(5)
+        runner.cancel(job_id)
+        job = runner.wait(job_id, timeout=10)
+
+        assert job.status == CANCELLED
+        assert job.cancel_requested
+
+    def test_cancel_queued_job(self, app):
+        """Test that a job still waiting for a thread is cancelled without running."""
+        runner = JobRunner(app, workers=1, progress_interval=0)
+        release = threading.Event()
+        ran = []
+        try:
+            blocker = runner.submit('blocker', lambda job: release.wait(10))
+            queued = runner.submit('queued', lambda job: ran.append(True))
+
+            assert runner.cancel(queued).status == CANCELLED
+            release.set()
+            runner.wait(blocker, timeout=10)
+        finally:
+            release.set()
+            runner.shutdown()
+
+        assert ran == []
+        assert runner.get(queued).status == CANCELLED
+
+    def test_cleanup_runs_however_the_job_ends(self, app):
+        """Test that cleanup runs after success, failure and cancellation before the job started."""
+        runner = JobRunner(app, workers=1, progress_interval=0)
+        release = threading.Event()
+        cleaned = []
+
+        def broken(job):
+            raise ValueError('bad archive')
+
+        try:
+            done = runner.submit('done', lambda job: None, cleanup=lambda: cleaned.append('done'))
+            runner.wait(done, timeout=10)
+            failed = runner.submit('failed', broken, cleanup=lambda: cleaned.append('failed'))
+            runner.wait(failed, timeout=10)
+            blocker = runner.submit('blocker', lambda job: release.wait(10))
+            queued = runner.submit('queued', lambda job: None, cleanup=lambda: cleaned.append('queued'))
+
+            runner.cancel(queued)
+            release.set()
+            runner.wait(blocker, timeout=10)
+        finally:
+            release.set()
+            runner.shutdown()
+
+        assert cleaned == ['done', 'failed', 'queued']
+
+    def test_cancel_flag_from_another_process(self, app, runner):
+        """Test that report() picks up cancel_requested written by a different worker process."""
+        started = threading.Event()
+
+        def long_job(job):
+            started.set()
+            while True:
+                job.report()
+                time.sleep(0.01)
+
+        job_id = runner.submit('long', long_job)
+        assert started.wait(5)
+        with db.engine.begin() as conn:
+            conn.execute(db.update(AdminJob).where(AdminJob.id == job_id).values(cancel_requested=True))
+
+        assert runner.wait(job_id, timeout=10).status == CANCELLED
+
+    def test_inline_mode_runs_in_submit(self, app):
+        """Test that workers=0 finishes the job before submit() returns."""
+        runner = JobRunner(app, workers=0)
+        job_id = runner.submit('count', _counting_job, 3)
+
+        assert runner.get(job_id).status == SUCCEEDED
+
+    def test_reap_orphans(self, app, runner):
+        """Test that jobs of exited processes fail and old finished jobs are deleted."""
+        hostname = socket.gethostname()
+        db.session.add_all([
+            AdminJob(id='orphan', kind='scan_courses', status=RUNNING, worker=f'{hostname}:999999'),
+            AdminJob(id='alive', kind='scan_courses', status=RUNNING, worker=f'{hostname}:{os.getppid()}'),
+            AdminJob(id='other-host', kind='scan_courses', status=RUNNING, worker='elsewhere:999999'),
+            AdminJob(id='old', kind='scan_courses', status=SUCCEEDED,
+                     created_at=datetime.utcnow() - timedelta(days=60)),
+        ])
+        db.session.commit()
+
+        assert runner.reap_orphans(retention_days=30) == 1
+        assert db.session.get(AdminJob, 'orphan').status == FAILED
+        assert db.session.get(AdminJob, 'alive').status == RUNNING
+        assert db.session.get(AdminJob, 'other-host').status == RUNNING
+        assert db.session.get(AdminJob, 'old') is None
+
+
+@pytest.mark.unit
+class TestScriptJob:
+    """Test the run-script job function."""
+
+    def test_captures_output(self, app, tmp_path):
+        """Test that stdout and the return code end up in the result."""
+        script = tmp_path / 'hello.py'
+        script.write_text('print("hello from script")\n')
+
+        job = get_job_runner().get(get_job_runner().submit('run_script', _run_script_job, str(script)))
+
+        assert job.status == SUCCEEDED
+        result = job.to_dict()['result']
+        assert result['success'] and 'hello from script' in result['stdout']
+
+    def test_timeout_kills_script(self, app, tmp_path):
+        """Test that a script running past the timeout is killed and the job fails."""
+        script = tmp_path / 'slow.py'
+        script.write_text('import time\ntime.sleep(30)\n')
+
+        job = get_job_runner().get(get_job_runner().submit('run_script', _run_script_job, str(script), 0.5))
+
+        assert job.status == FAILED
+        assert 'timed out' in job.error
+
+    def test_cancel_kills_script(self, app, tmp_path, runner):
+        """Test that cancelling the job kills the subprocess."""
+        script = tmp_path / 'slow.py'
+        script.write_text(f'import time\nopen({str(tmp_path / "started")!r}, "w").close()\ntime.sleep(30)\n')
+
+        job_id = runner.submit('run_script', _run_script_job, str(script))
+        for _ in range(100):
+            if (tmp_path / 'started').exists():
+                break
+            time.sleep(0.05)
+        runner.cancel(job_id)
+
+        assert runner.wait(job_id, timeout=10).status == CANCELLED
+
+
+@pytest.mark.integration
+class TestJobEndpoints:
+    """Test /api/admin/jobs and the endpoints that return a job."""
+
+    def test_upload_zip_extracts_in_job(self, app, admin_user, csrf_token, tmp_path):
+        """Test that a zip upload returns 202 and the job extracts it."""
+        client = admin_user['client']
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('index.html', '<html></html>')
+            zf.writestr('pages/one.html', '<html></html>')
+        archive.seek(0)
+
+        content_dir = app.config.get('CONTENT_DIR')
+        app.config['CONTENT_DIR'] = str(tmp_path)
+        try:
+            response = client.post('/api/admin/upload-course', data={'file': (archive, 'new-course.zip')},
+                                   headers={'X-CSRFToken': csrf_token})
+        finally:
+            app.config['CONTENT_DIR'] = content_dir
+
+        assert response.status_code == 202
+        job = client.get(response.get_json()['status_url']).get_json()['job']
+        assert job['status'] == SUCCEEDED
+        assert job['result']['files'] == 2
+        assert (tmp_path / 'courses' / 'new-course' / 'pages' / 'one.html').exists()
+        assert not (tmp_path / 'courses' / 'new-course.zip').exists()
+
+    def test_list_get_and_cancel(self, app, admin_user, csrf_token):
+        """Test the listing, a finished job's status and cancelling a finished job (no-op)."""
+        client = admin_user['client']
+        response = client.post('/api/admin/generate-thumbnails', headers={'X-CSRFToken': csrf_token})
+        job_id = response.get_json()['job_id']
+
+        jobs = client.get('/api/admin/jobs').get_json()['jobs']
+        assert jobs[0]['id'] == job_id
+        assert jobs[0]['kind'] == 'generate_thumbnails'
+
+        cancelled = client.post(f'/api/admin/jobs/{job_id}/cancel', headers={'X-CSRFToken': csrf_token})
+        assert cancelled.get_json()['job']['status'] == SUCCEEDED
+
+        assert client.get('/api/admin/jobs/missing').status_code == 404
+
+    def test_requires_admin(self, authenticated_user):
+        """Test that regular users cannot see jobs."""
+        assert authenticated_user['client'].get('/api/admin/jobs').status_code == 403
+
@@ -0,0 +1,295 @@
+"""
+Log viewer test suite.
+Tests the reverse block reader, server-side filters, cursors, the sidecar index and /api/admin/logs.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from src.log_reader import LogFilter, read_lines_reverse, read_log_page, parse_timestamp
+
+START = datetime(2025, 11, 20, 12, 0, tzinfo=timezone.utc)
+
+
+def _write_log(path, count=200):
+    """Write `count` JSON lines one minute apart, with a plain-text line mixed in."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            f.write(json.dumps({
+                'event': 'request_completed' if i % 2 else 'request_received',
+                'level': 'error' if i % 10 == 0 else 'info',
+                'request_id': f'req-{i}',
+                'timestamp': (START + timedelta(minutes=i)).isoformat().replace('+00:00', 'Z'),
+                'padding': 'x' * (i % 37),
+            }) + '\n')
+            if i == 100:
+                f.write('Failed to fetch books from Calibre-Web OPDS\n')
+    return path
+
+
+@pytest.mark.unit
+class TestReverseReader:
+    """Test that reading backwards yields every line exactly once."""
+
+    def test_matches_forward_read_with_small_blocks(self, tmp_path):
+        """Test block boundaries that split lines mid-way."""
+        path = _write_log(tmp_path / 'app.log', count=50)
+        with open(path, 'rb') as f:
+            expected = f.read().splitlines()
+
+        lines = [line for _, line in read_lines_reverse(path, block_size=17)]
+
+        assert lines == list(reversed(expected))
+
+    def test_offsets_point_at_line_starts(self, tmp_path):
+        """Test that yielded offsets can be used to seek to each line."""
+        path = _write_log(tmp_path / 'app.log', count=10)
+
+        with open(path, 'rb') as f:
+            for offset, line in read_lines_reverse(path, block_size=32):
+                f.seek(offset)
+                assert f.readline().rstrip(b'\n') == line
+
+
+@pytest.mark.unit
+class TestLogPage:
+    """Test filtering and cursor pagination."""
+
+    def test_newest_first_with_limit(self, tmp_path):
+        """Test that the first page is the tail of the file."""
+        path = _write_log(tmp_path / 'app.log')
+
+        page = read_log_page(path, limit=3)
+
+        assert [json.loads(line)['request_id'] for line in page.lines] == ['req-199', 'req-198', 'req-197']
+        assert page.next_cursor
+
+    def test_cursor_pages_cover_file_once(self, tmp_path):
+        """Test that following cursors returns every line with no duplicates."""
+        path = _write_log(tmp_path / 'app.log')
+
+        seen, cursor = [], None
+        while True:
+            page = read_log_page(path, limit=37, cursor=cursor)
+            seen.extend(page.lines)
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+
+        assert len(seen) == 201
+        assert len(set(seen)) == 201
+
+    def test_filters_by_level_event_and_request_id(self, tmp_path):
+        """Test server-side level/event/request_id filters."""
+        path = _write_log(tmp_path / 'app.log')
+
+        errors = read_log_page(path, LogFilter(level='warning'), limit=100).lines
+        assert len(errors) == 20
+        assert all(json.loads(line)['level'] == 'error' for line in errors)
+
+        completed = read_log_page(path, LogFilter(event='request_completed'), limit=500).lines
+        assert len(completed) == 100
+
+        one = read_log_page(path, LogFilter(request_id='req-42'), limit=10).lines
+        assert [json.loads(line)['request_id'] for line in one] == ['req-42']
+
+    def test_time_range_stops_early(self, tmp_path):
+        """Test since/until bounds and that the scan stops at the first older line."""
+        path = _write_log(tmp_path / 'app.log')
+        log_filter = LogFilter(since=START + timedelta(minutes=190), until=START + timedelta(minutes=194))
+
+        page = read_log_page(path, log_filter, limit=100)
+
+        assert [json.loads(line)['request_id'] for line in page.lines] == [f'req-{i}' for i in range(194, 189, -1)]
+        assert page.next_cursor is None
+
+    def test_scan_budget_returns_resume_cursor(self, tmp_path):
+        """Test that a sparse query stops after max_scan_bytes and hands back a cursor."""
+        path = _write_log(tmp_path / 'app.log')
+
+        page = read_log_page(path, LogFilter(request_id='req-0'), limit=10, max_scan_bytes=2000)
+        assert page.lines == []
+        assert page.next_cursor
+
+        rest = read_log_page(path, LogFilter(request_id='req-0'), limit=10, cursor=page.next_cursor)
+        assert [json.loads(line)['request_id'] for line in rest.lines] == ['req-0']
+
+    def test_stale_cursor_rejected(self, tmp_path):
+        """Test that a cursor from a rotated file is refused."""
+        path = _write_log(tmp_path / 'app.log')
+        cursor = read_log_page(path, limit=5).next_cursor
+
+        os.rename(path, tmp_path / 'app.log.2025-11-20')
+        _write_log(path, count=10)
+
+        with pytest.raises(ValueError):
+            read_log_page(path, limit=5, cursor=cursor)
+
+    def test_invalid_level_rejected(self):
+        """Test that unknown levels raise ValueError."""
+        with pytest.raises(ValueError):
+            LogFilter(level='loud')
+        assert parse_timestamp('2025-11-20T12:00:00Z') == START
+
+
+@pytest.mark.integration
+class TestAdminLogsEndpoint:
+    """Test /api/admin/logs query parameters."""
+
+    def test_filters_and_cursor(self, admin_user, monkeypatch, tmp_path):
+        """Test that the endpoint filters and paginates the configured app.log."""
+        client = admin_user['client']
+        _write_log(tmp_path / 'app.log')
+        monkeypatch.setitem(client.application.config, 'LOG_DIR', str(tmp_path))
+
+        response = client.get('/api/admin/logs?event=request_completed&limit=5')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['logs']) == 5
+        assert all(json.loads(line)['event'] == 'request_completed' for line in data['logs'])
+
+        older = client.get(f"/api/admin/logs?event=request_completed&limit=5&cursor={data['next_cursor']}")
+        assert json.loads(older.get_json()['logs'][0])['request_id'] == 'req-189'
+
+    def test_bad_parameters_return_400(self, admin_user, monkeypatch, tmp_path):
+        """Test that malformed filters are rejected."""
+        client = admin_user['client']
+        _write_log(tmp_path / 'app.log', count=5)
+        monkeypatch.setitem(client.application.config, 'LOG_DIR', str(tmp_path))
+
+        assert client.get('/api/admin/logs?level=loud').status_code == 400
+        assert client.get('/api/admin/logs?since=yesterday').status_code == 400
+        assert client.get('/api/admin/logs?cursor=garbage').status_code == 400
+
+
+def _indexed_logger(tmp_path, name='gleh.test.index'):
+    """Logger writing JSON lines through an IndexedFileHandler in tmp_path."""
+    from src.log_index import IndexedFileHandler, LogIndex, INDEX_FILENAME
+
+    index = LogIndex(tmp_path / INDEX_FILENAME)
+    handler = IndexedFileHandler(tmp_path / 'app.log', index, when='midnight', backupCount=30, encoding='utf-8')
+    test_logger = logging.getLogger(name)
+    test_logger.propagate = False
+    test_logger.setLevel(logging.INFO)
+    test_logger.addHandler(handler)
+    return test_logger, handler, index
+
+
+def _log_json(test_logger, **fields):
+    fields.setdefault('timestamp', START.isoformat())
+    fields.setdefault('level', 'info')
+    test_logger.info(json.dumps(fields))
+
+
+@pytest.mark.unit
+class TestLogIndex:
+    """Test the sidecar offset index populated by the file handler."""
+
+    def test_lookup_by_request_and_user(self, tmp_path):
+        """Test request_id and user_id lookups resolve to the right lines."""
+        from src.log_index import read_indexed_lines
+
+        test_logger, handler, index = _indexed_logger(tmp_path)
+        try:
+            for i in range(50):
+                _log_json(test_logger, event='request_received', request_id=f'req-{i}', user_id=i % 5)
+                test_logger.info('plain text line from a stdlib logger')
+                _log_json(test_logger, event='request_completed', request_id=f'req-{i}', status=200)
+
+            entries = index.lookup(request_id='req-7')
+            lines = read_indexed_lines(tmp_path, entries, 'req-7')
+            assert [json.loads(line)['event'] for line in lines] == ['request_completed', 'request_received']
+
+            # All lines of user 3's requests, not only the ones carrying user_id
+            user_lines = read_indexed_lines(tmp_path, index.lookup(user_id=3, limit=100))
+            assert len(user_lines) == 20
+            assert {json.loads(line)['request_id'] for line in user_lines} == {f'req-{i}' for i in range(3, 50, 5)}
+        finally:
+            logging.getLogger('gleh.test.index').removeHandler(handler)
+            handler.close()
+
+    def test_rotation_renames_entries(self, tmp_path):
+        """Test that rotated files stay reachable through the index."""
+        from src.log_index import read_indexed_lines
+
+        test_logger, handler, index = _indexed_logger(tmp_path, 'gleh.test.index.rotate')
+        try:
+            _log_json(test_logger, event='before_rotation', request_id='req-old')
+            handler.doRollover()
+            _log_json(test_logger, event='after_rotation', request_id='req-new')
+
+            old_entries = index.lookup(request_id='req-old')
+            assert old_entries[0][0] != 'app.log'
+            assert json.loads(read_indexed_lines(tmp_path, old_entries)[0])['event'] == 'before_rotation'
+            assert index.lookup(request_id='req-new')[0][0] == 'app.log'
+        finally:
+            logging.getLogger('gleh.test.index.rotate').removeHandler(handler)
+            handler.close()
+
+    def test_stale_offset_skipped(self, tmp_path):
+        """Test that an entry pointing at the wrong line is dropped on read."""
+        from src.log_index import read_indexed_lines
+
+        (tmp_path / 'app.log').write_text('{"request_id": "req-1"}\n{"request_id": "req-2"}\n')
+
+        assert read_indexed_lines(tmp_path, [('app.log', 0)], 'req-2') == []
+        assert read_indexed_lines(tmp_path, [('app.log', 0), ('gone.log', 0)], 'req-1') == ['{"request_id": "req-1"}']
+
+
+@pytest.mark.integration
+class TestAdminLogsIndexed:
+    """Test that /api/admin/logs uses the index for request_id/user_id lookups."""
+
+    def test_request_id_lookup_spans_rotated_files(self, admin_user, monkeypatch, tmp_path):
+        """Test an indexed lookup that finds lines in a rotated file."""
+        client = admin_user['client']
+        test_logger, handler, index = _indexed_logger(tmp_path, 'gleh.test.index.endpoint')
+        try:
+            _log_json(test_logger, event='request_received', request_id='req-trace', user_id=9)
+            handler.doRollover()
+            _log_json(test_logger, event='request_completed', request_id='req-trace')
+            _log_json(test_logger, event='request_completed', request_id='req-other')
+            index.flush()
+        finally:
+            logging.getLogger('gleh.test.index.endpoint').removeHandler(handler)
+            handler.close()
+
+        monkeypatch.setitem(client.application.config, 'LOG_DIR', str(tmp_path))
+        monkeypatch.setitem(client.application.config, 'LOG_INDEX_ENABLED', True)
+
+        data = client.get('/api/admin/logs?request_id=req-trace').get_json()
+        assert data['indexed']
+        assert [json.loads(line)['event'] for line in data['logs']] == ['request_completed', 'request_received']
+
+        by_user = client.get('/api/admin/logs?user_id=9').get_json()
+        assert len(by_user['logs']) == 2
+
+    def test_level_filter_and_cursor_page_through_index(self, admin_user, monkeypatch, tmp_path):
+        """Test that level is applied before the limit and next_cursor continues with older lines."""
+        client = admin_user['client']
+        test_logger, handler, index = _indexed_logger(tmp_path, 'gleh.test.index.pages')
+        try:
+            for i in range(30):
+                _log_json(test_logger, event=f'step-{i}', request_id='req-busy',
+                          level='warning' if i % 3 == 0 else 'info')
+            index.flush()
+        finally:
+            logging.getLogger('gleh.test.index.pages').removeHandler(handler)
+            handler.close()
+
+        monkeypatch.setitem(client.application.config, 'LOG_DIR', str(tmp_path))
+        monkeypatch.setitem(client.application.config, 'LOG_INDEX_ENABLED', True)
+
+        first = client.get('/api/admin/logs?request_id=req-busy&level=warning&limit=4').get_json()
+        assert [json.loads(line)['event'] for line in first['logs']] == ['step-27', 'step-24', 'step-21', 'step-18']
+
+        rest = client.get(f"/api/admin/logs?request_id=req-busy&level=warning&limit=4&cursor={first['next_cursor']}")
+        second = rest.get_json()
+        assert [json.loads(line)['event'] for line in second['logs']] == ['step-15', 'step-12', 'step-9', 'step-6']
+
+        last = client.get(f"/api/admin/logs?request_id=req-busy&level=warning&limit=4&cursor={second['next_cursor']}")
+        assert [json.loads(line)['event'] for line in last.get_json()['logs']] == ['step-3', 'step-0']
+        assert last.get_json()['next_cursor'] is None
+        assert client.get('/api/admin/logs?request_id=req-busy&cursor=abc').status_code == 400
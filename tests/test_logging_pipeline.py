@@ -0,0 +1,341 @@
+"""
+Logging pipeline test suite.
+Tests the queue-backed log handler used to keep log I/O off request threads.
+"""
+import io
+import logging
+import threading
+import time
+import pytest
+from flask import Flask
+from werkzeug.wsgi import FileWrapper
+from src.logging_config import (
+    BoundedQueueHandler, ResponseSizeMiddleware, RequestLogSampler, configure_logging, _start_queue_logging,
+    stop_log_listener, get_log_queue_stats, parse_sample_rates, LazyBoundLogger, RequestIdGenerator
+)
+
+
+class BlockingHandler(logging.Handler):
+    """Handler that waits on an event before 'writing', simulating slow storage."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.unblock.wait(timeout=5)
+        self.records.append(record.getMessage())
+
+
+def _make_record(msg, level=logging.INFO):
+    return logging.LogRecord('gleh.test', level, __file__, 1, msg, None, None)
+
+
+class RecordingLog:
+    """Minimal bound-logger stand-in that records info() calls."""
+
+    def __init__(self):
+        self.events = []
+
+    def bind(self, **kwargs):
+        return self
+
+    def info(self, event, **kwargs):
+        self.events.append((event, kwargs))
+
+
+def _start_response(status, headers, exc_info=None):
+    return lambda data: None
+
+
+@pytest.mark.unit
+class TestBoundedQueueHandler:
+    """Test the non-blocking bounded queue handler."""
+
+    def test_enqueue_counts_records(self):
+        """Test that records are enqueued and counted."""
+        handler = BoundedQueueHandler(maxsize=10)
+        for i in range(3):
+            handler.handle(_make_record(f'event {i}'))
+
+        stats = handler.get_stats()
+        assert stats['enqueued'] == 3
+        assert stats['dropped'] == 0
+        assert stats['queue_depth'] == 3
+        assert stats['queue_capacity'] == 10
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that a full buffer drops records and counts them by level."""
+        handler = BoundedQueueHandler(maxsize=2)
+        handler.handle(_make_record('a'))
+        handler.handle(_make_record('b'))
+        handler.handle(_make_record('c'))
+        handler.handle(_make_record('d', logging.ERROR))
+
+        stats = handler.get_stats()
+        assert stats['enqueued'] == 2
+        assert stats['dropped'] == 2
+        assert stats['dropped_by_level'] == {'info': 1, 'error': 1}
+
+    def test_dropped_since_last_check_window(self):
+        """Test that a past burst stops counting once it has been reported."""
+        handler = BoundedQueueHandler(maxsize=1)
+        handler.handle(_make_record('a'))
+        handler.handle(_make_record('b'))
+
+        assert handler.get_stats(mark_checked=True)['dropped_since_last_check'] == 1
+        assert handler.get_stats()['dropped_since_last_check'] == 0
+        assert handler.get_stats()['dropped'] == 1
+
+
+@pytest.mark.unit
+class TestQueueListener:
+    """Test that the listener thread performs the writes."""
+
+    def test_slow_handler_does_not_block_caller(self):
+        """Test that logging returns immediately while the writer is stalled."""
+        slow = BlockingHandler()
+        logger = logging.getLogger('gleh.test.queue')
+        logger.setLevel(logging.INFO)
+        logger.propagate = True
+
+        _start_queue_logging([slow], maxsize=100)
+        try:
+            start = time.perf_counter()
+            for i in range(5):
+                logger.info('queued %d', i)  # Would block for 5s each if synchronous
+            elapsed = time.perf_counter() - start
+
+            assert elapsed < 1.0, f"Logging blocked the caller for {elapsed:.2f}s"
+            assert get_log_queue_stats()['enqueued'] >= 5
+            slow.unblock.set()
+        finally:
+            stop_log_listener()
+
+        assert [m for m in slow.records if m.startswith('queued')] == [f'queued {i}' for i in range(5)]
+        assert get_log_queue_stats() is None
+
+    def test_configure_logging_installs_queue_handler(self):
+        """Test that LOG_ASYNC=True routes the root logger through the queue."""
+        app = Flask(__name__)
+        app.config.update(DEBUG=True, LOG_ASYNC=True, LOG_QUEUE_SIZE=50)
+
+        configure_logging(app)
+        try:
+            queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, BoundedQueueHandler)]
+            assert len(queue_handlers) == 1
+            assert get_log_queue_stats()['queue_capacity'] == 50
+
+            logging.getLogger('gleh.test.configure').info('through the queue')
+            assert get_log_queue_stats()['enqueued'] >= 1
+        finally:
+            stop_log_listener()
+
+        assert not any(isinstance(h, BoundedQueueHandler) for h in logging.getLogger().handlers)
+
+
+@pytest.mark.unit
+class TestResponseSizeMiddleware:
+    """Test byte counting for request_completed without buffering bodies."""
+
+    def test_counts_streamed_bytes_and_logs_on_close(self):
+        """Test that bytes are counted as yielded and logged only when closed."""
+        recorder = RecordingLog()
+
+        def wsgi_app(environ, start_response):
+            environ[ResponseSizeMiddleware.REQUEST_LOG_KEY] = (recorder, 200, time.time(), True)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return iter([b'abc', b'defg'])
+
+        app_iter = ResponseSizeMiddleware(wsgi_app)({}, _start_response)
+
+        assert b''.join(app_iter) == b'abcdefg'
+        assert recorder.events == []
+
+        app_iter.close()
+        event, fields = recorder.events[0]
+        assert event == 'request_completed'
+        assert fields['status'] == 200
+        assert fields['response_size_bytes'] == 7
+
+    def test_file_wrapper_passes_through(self):
+        """Test that server file wrappers are not wrapped, so sendfile still works."""
+        recorder = RecordingLog()
+        body = FileWrapper(io.BytesIO(b'x' * 10))
+
+        def wsgi_app(environ, start_response):
+            environ[ResponseSizeMiddleware.REQUEST_LOG_KEY] = (recorder, 200, time.time(), True)
+            start_response('200 OK', [('Content-Length', '10')])
+            return body
+
+        app_iter = ResponseSizeMiddleware(wsgi_app)({'wsgi.file_wrapper': FileWrapper}, _start_response)
+
+        assert app_iter is body
+        assert recorder.events[0][1]['response_size_bytes'] == 10
+
+    def test_app_logs_request_completed_with_size(self, client, monkeypatch):
+        """Test that app responses are logged with their real size."""
+        recorder = RecordingLog()
+        monkeypatch.setattr('src.app.log', recorder)
+
+        response = client.get('/csrf-token', buffered=True)
+
+        completed = [fields for event, fields in recorder.events if event == 'request_completed']
+        assert len(completed) == 1
+        assert completed[0]['status'] == 200
+        assert completed[0]['response_size_bytes'] == len(response.data)
+
+
+@pytest.mark.unit
+class TestRequestLogSampler:
+    """Test per-path sampling, the per-second budget and always-log rules."""
+
+    def test_parse_sample_rates(self):
+        """Test LOG_SAMPLE_RATES parsing and validation."""
+        assert parse_sample_rates('/health=0.01, /auth/check=0.5') == {'/health': 0.01, '/auth/check': 0.5}
+        assert parse_sample_rates('') == {}
+        with pytest.raises(ValueError):
+            parse_sample_rates('/health=often')
+        with pytest.raises(ValueError):
+            parse_sample_rates('/health=2')
+
+    def test_per_path_rates_use_longest_prefix(self):
+        """Test that the most specific prefix wins and unlisted paths are kept."""
+        sampler = RequestLogSampler(rates={'/health': 0.0, '/health/deep': 1.0})
+
+        assert not sampler.sample_request('/health')
+        assert sampler.sample_request('/health/deep')
+        assert sampler.sample_request('/api/content')
+        assert sampler.get_stats()['sampled_out_requests'] == 1
+
+    def test_budget_limits_requests_per_second(self):
+        """Test that only budget_per_second requests are logged in one second."""
+        now = [100.0]
+        sampler = RequestLogSampler(budget_per_second=2, clock=lambda: now[0])
+
+        assert [sampler.sample_request('/api/content') for _ in range(3)] == [True, True, False]
+        now[0] += 1
+        assert sampler.sample_request('/api/content')
+        assert sampler.get_stats()['budget_exceeded_requests'] == 1
+
+    def test_errors_and_slow_requests_always_logged(self):
+        """Test that sampled-out requests still log errors and slow completions."""
+        sampler = RequestLogSampler(slow_ms=500, error_status=500)
+
+        assert not sampler.should_log_completion(False, 200, 20)
+        assert sampler.should_log_completion(False, 503, 20)
+        assert sampler.should_log_completion(False, 200, 750)
+        assert sampler.get_stats()['forced_completions'] == 2
+
+    def test_sampled_out_completion_dropped_and_counted(self):
+        """Test that the middleware skips and counts routine sampled-out completions."""
+        recorder = RecordingLog()
+        sampler = RequestLogSampler()
+        middleware = ResponseSizeMiddleware(lambda environ, start_response: [], sampler=sampler)
+
+        environ = {ResponseSizeMiddleware.REQUEST_LOG_KEY: (recorder, 200, time.time(), False)}
+        middleware.log_request_completed(environ, 0)
+        environ = {ResponseSizeMiddleware.REQUEST_LOG_KEY: (recorder, 500, time.time(), False)}
+        middleware.log_request_completed(environ, 0)
+
+        assert [fields['status'] for _, fields in recorder.events] == [500]
+        assert sampler.get_stats()['dropped_by_event'] == {'request_completed': 1}
+
+    def test_health_polls_sampled_out_in_app(self, client, monkeypatch):
+        """Test that a zero-rate path logs nothing for successful requests."""
+        from src import app as app_module
+
+        recorder = RecordingLog()
+        monkeypatch.setattr(app_module, 'log', recorder)
+        monkeypatch.setattr(app_module.request_log_sampler, 'rates', [('/health', 0.0)])
+
+        client.get('/health', buffered=True)
+        client.get('/csrf-token', buffered=True)
+
+        events = [(event, fields.get('status')) for event, fields in recorder.events]
+        assert events == [('request_received', None), ('request_completed', 200)]
+
+
+class CountingLog:
+    """Bound-logger stand-in that counts bind() calls and keeps bound fields."""
+
+    def __init__(self, events, binds, **fields):
+        self.events = events
+        self.binds = binds
+        self.fields = fields
+
+    def bind(self, **fields):
+        self.binds.append(fields)
+        return CountingLog(self.events, self.binds, **{**self.fields, **fields})
+
+    def info(self, event, **kwargs):
+        self.events.append((event, {**self.fields, **kwargs}))
+
+
+class UnloadableUser:
+    """current_user stand-in that fails if the logging hook touches it."""
+
+    @property
+    def is_authenticated(self):
+        raise AssertionError("user loaded for an excluded path")
+
+
+@pytest.mark.unit
+class TestLeanRequestContext:
+    """Test request id generation and lazy context binding."""
+
+    def test_request_ids_unique_and_prefixed(self):
+        """Test that ids share a process prefix and never repeat."""
+        generate = RequestIdGenerator()
+        ids = [generate() for _ in range(1000)]
+
+        assert len(set(ids)) == 1000
+        assert len({request_id.split('-')[0] for request_id in ids}) == 1
+
+    def test_request_ids_change_prefix_after_fork(self, monkeypatch):
+        """Test that a forked worker gets its own prefix."""
+        generate = RequestIdGenerator()
+        parent_id = generate()
+        monkeypatch.setattr('os.getpid', lambda: -1)
+
+        assert generate().split('-')[0] != parent_id.split('-')[0]
+
+    def test_bind_deferred_until_first_log_call(self):
+        """Test that nothing is bound unless something is logged."""
+        events, binds = [], []
+        lazy = LazyBoundLogger(CountingLog(events, binds), {'request_id': 'r1'})
+
+        child = lazy.bind(status=200)
+        assert binds == []
+
+        child.info('request_completed')
+        child.info('request_completed')
+        assert binds == [{'request_id': 'r1', 'status': 200}]
+        assert events[0] == ('request_completed', {'request_id': 'r1', 'status': 200})
+
+    def test_sampled_out_request_never_binds(self, client, monkeypatch):
+        """Test that a sampled-out health check does no binding at all."""
+        import src.app as app_module
+        events, binds = [], []
+        monkeypatch.setattr(app_module, 'log', CountingLog(events, binds))
+        monkeypatch.setattr(app_module.request_log_sampler, 'rate_for', lambda path: 0.0)
+
+        client.get('/health', buffered=True)
+
+        assert binds == []
+        assert events == []
+
+    def test_skip_user_lookup_paths(self, client, monkeypatch):
+        """Test that excluded paths log request_received without loading the user."""
+        import src.app as app_module
+        events, binds = [], []
+        monkeypatch.setattr(app_module, 'log', CountingLog(events, binds))
+        monkeypatch.setattr(app_module.request_log_sampler, 'rate_for', lambda path: 1.0)
+        monkeypatch.setattr(app_module, 'current_user', UnloadableUser())
+
+        client.get('/health', buffered=True)
+
+        received = [fields for event, fields in events if event == 'request_received']
+        assert received[0]['user_id'] is None
+        assert received[0]['path'] == '/health'
@@ -0,0 +1,110 @@
+"""
+Metrics registry test suite.
+Tests counters, histograms, Prometheus rendering, multi-process merging and /metrics.
+"""
+import json
+import pytest
+from src.metrics import MetricsRegistry, db_queries_total, http_requests_total
+
+
+@pytest.mark.unit
+class TestMetricsRegistry:
+    """Test metric types and Prometheus text rendering."""
+
+    def test_counter_and_histogram_render(self):
+        """Test that counters and cumulative histogram buckets render correctly."""
+        reg = MetricsRegistry()
+        hits = reg.counter('test_hits_total', 'Hits', ('route',))
+        latency = reg.histogram('test_latency_seconds', 'Latency', buckets=(0.1, 1.0))
+
+        hits.inc(route='a')
+        hits.inc(2, route='a')
+        latency.observe(0.05)
+        latency.observe(0.5)
+        latency.observe(3.0)
+
+        text = reg.render()
+        assert '# TYPE test_hits_total counter' in text
+        assert 'test_hits_total{route="a"} 3' in text
+        assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{le="1.0"} 2' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+        assert 'test_latency_seconds_count 3' in text
+        assert 'test_latency_seconds_sum 3.55' in text
+
+    def test_label_values_escaped(self):
+        """Test that quotes and newlines in label values cannot break the format."""
+        reg = MetricsRegistry()
+        reg.counter('test_total', 'Test', ('path',)).inc(path='a"b\nc')
+
+        assert 'test_total{path="a\\"b\\nc"} 1' in reg.render()
+
+    def test_wrong_labels_rejected(self):
+        """Test that recording with missing labels raises."""
+        reg = MetricsRegistry()
+        hits = reg.counter('test_total', 'Test', ('route',))
+
+        with pytest.raises(ValueError):
+            hits.inc()
+
+    def test_multiprocess_snapshots_are_merged(self, tmp_path):
+        """Test that counters and histograms sum across worker snapshot files."""
+        reg = MetricsRegistry(multiprocess_dir=tmp_path)
+        reg.counter('test_total', 'Test').inc(2)
+        reg.histogram('test_seconds', 'Test', buckets=(1.0,)).observe(0.5)
+        reg.gauge('test_in_flight', 'Test').set(4)
+
+        # Snapshot left behind by another (exited) worker
+        other = MetricsRegistry()
+        other.counter('test_total', 'Test').inc(5)
+        other.histogram('test_seconds', 'Test', buckets=(1.0,)).observe(2.0)
+        other.gauge('test_in_flight', 'Test').set(7)
+        (tmp_path / 'gleh_999999999.json').write_text(json.dumps(other.snapshot()))
+
+        text = reg.render()
+        assert 'test_total 7' in text
+        assert 'test_seconds_bucket{le="1.0"} 1' in text
+        assert 'test_seconds_count 2' in text
+        # Gauges from dead processes are dropped
+        assert 'test_in_flight 4' in text
+
+
+@pytest.mark.integration
+class TestMetricsEndpoint:
+    """Test request instrumentation and the /metrics endpoint."""
+
+    def test_requests_and_queries_recorded(self, client):
+        """Test that a request records its endpoint, status and SQL statements."""
+        before_requests = http_requests_total.get(method='GET', endpoint='get_content', status='200')
+        before_queries = db_queries_total.get()
+
+        assert client.get('/api/content').status_code == 200
+
+        assert http_requests_total.get(method='GET', endpoint='get_content', status='200') == before_requests + 1
+        assert db_queries_total.get() > before_queries
+
+    def test_metrics_endpoint_prometheus_text(self, client):
+        """Test that /metrics serves Prometheus text with latency histograms."""
+        client.get('/api/content')
+
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        body = response.get_data(as_text=True)
+        assert '# TYPE gleh_http_request_duration_seconds histogram' in body
+        assert 'gleh_http_request_duration_seconds_bucket{method="GET",endpoint="get_content",le="+Inf"}' in body
+
+    def test_conditional_request_counts_cache_hit(self, client):
+        """Test that a 304 on a conditional GET is counted as a cache hit."""
+        from src.metrics import cache_requests_total
+
+        first = client.get('/static/css/style.css')
+        if not first.headers.get('ETag'):
+            pytest.skip("static file has no ETag")
+        hits = cache_requests_total.get(cache='http_conditional', result='hit')
+
+        response = client.get('/static/css/style.css', headers={'If-None-Match': first.headers['ETag']})
+
+        assert response.status_code == 304
+        assert cache_requests_total.get(cache='http_conditional', result='hit') == hits + 1
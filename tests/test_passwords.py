@@ -0,0 +1,121 @@
+"""
+Password hashing test suite.
+Tests the bounded hashing pool, 503 on saturation and rehash-on-login.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from werkzeug.security import generate_password_hash
+from src.app import db
+from src.models import User
+from src.passwords import PasswordHasher, PasswordHasherBusy, canonical_method
+
+
+@pytest.mark.unit
+class TestPasswordHasher:
+    """Test hashing in the process pool and its limits."""
+
+    def test_canonical_method(self):
+        """Test that short method names expand to the stored prefix."""
+        assert canonical_method('scrypt') == 'scrypt:32768:8:1'
+        assert canonical_method('scrypt:16384') == 'scrypt:16384:8:1'
+        assert canonical_method('pbkdf2:sha256:1000') == 'pbkdf2:sha256:1000'
+        with pytest.raises(ValueError):
+            canonical_method('md5')
+
+    def test_hash_and_verify_in_pool(self):
+        """Test a round trip through a worker process."""
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1)
+        try:
+            password_hash = hasher.hash('SecurePassword123')
+
+            assert password_hash.startswith('pbkdf2:sha256:1000$')
+            assert hasher.verify(password_hash, 'SecurePassword123')
+            assert not hasher.verify(password_hash, 'wrong')
+            assert hasher.get_stats()['in_flight'] == 0
+        finally:
+            hasher.shutdown()
+
+    def test_saturated_pool_rejects(self):
+        """Test that requests beyond workers + max_queue fail fast."""
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, max_queue=0)
+        hasher._slots.acquire()  # Another request is hashing
+
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('SecurePassword123')
+        assert hasher.get_stats()['rejected'] == 1
+
+    def test_admission_capped_below_request_threads(self):
+        """Test that admitted hashes always leave one server thread free."""
+        assert PasswordHasher(workers=2, max_queue=32, request_threads=4).capacity == 3
+        assert PasswordHasher(workers=2, max_queue=0, request_threads=8).capacity == 2
+        assert PasswordHasher(workers=4, max_queue=0, request_threads=1).capacity == 1
+
+    def test_timed_out_hash_keeps_its_slot(self):
+        """Test that a request giving up does not free the slot while the hash still runs."""
+        hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=1, max_queue=0, timeout=0.01)
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        hasher._get_executor = lambda: executor
+        try:
+            with pytest.raises(PasswordHasherBusy, match='longer than'):
+                hasher._run(release.wait, 5)
+            with pytest.raises(PasswordHasherBusy, match='queue is full'):
+                hasher.hash('SecurePassword123')
+
+            release.set()
+            executor.shutdown(wait=True)
+            assert hasher.get_stats()['in_flight'] == 0
+            assert hasher._slots.acquire(blocking=False)
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+    def test_needs_rehash(self):
+        """Test detection of hashes made with other parameters."""
+        hasher = PasswordHasher(method='scrypt', workers=0)
+
+        assert hasher.needs_rehash(generate_password_hash('x', 'pbkdf2:sha256:1000'))
+        assert not hasher.needs_rehash(generate_password_hash('x', 'scrypt'))
+        assert not hasher.needs_rehash(None)
+
+
+@pytest.mark.integration
+class TestPasswordHashingEndpoints:
+    """Test login behaviour around the hashing pool."""
+
+    def _create_user(self, app, password_hash):
+        with app.app_context():
+            user = User(username='hash_test_user', password_hash=password_hash)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+    def test_login_returns_503_when_busy(self, app, client, csrf_token, monkeypatch):
+        """Test that a saturated pool turns logins away with Retry-After."""
+        from src import app as app_module
+        self._create_user(app, generate_password_hash('SecurePassword123', 'pbkdf2:sha256:1000'))
+
+        def busy(*args):
+            raise PasswordHasherBusy('queue full')
+
+        monkeypatch.setattr(app_module.password_hasher, 'verify', busy)
+
+        response = client.post('/api/login', json={'username': 'hash_test_user', 'password': 'SecurePassword123'},
+                               headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_login_rehashes_outdated_hash(self, app, client, csrf_token):
+        """Test that a hash with old parameters is replaced on successful login."""
+        user_id = self._create_user(app, generate_password_hash('SecurePassword123', 'pbkdf2:sha256:1000'))
+
+        response = client.post('/api/login', json={'username': 'hash_test_user', 'password': 'SecurePassword123'},
+                               headers={'X-CSRFToken': csrf_token})
+
+        assert response.status_code == 200
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            assert user.password_hash.startswith('scrypt:32768:8:1$')
+            assert user.check_password('SecurePassword123')
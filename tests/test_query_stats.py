@@ -0,0 +1,101 @@
+"""
+Query accounting test suite.
+Pins per-endpoint query budgets (N+1 guards) and tests slow-query logging.
+"""
+import logging
+import pytest
+from src.app import db
+from src.models import Course, CourseProgress, CourseNote
+from src.query_stats import assert_max_queries, redact_parameters
+import src.query_stats as query_stats
+
+
+class BindingLog:
+    """Bound-logger stand-in that keeps bound fields, like structlog."""
+
+    def __init__(self, events, **fields):
+        self.events = events
+        self.fields = fields
+
+    def bind(self, **fields):
+        return BindingLog(self.events, **{**self.fields, **fields})
+
+    def info(self, event, **kwargs):
+        self.events.append((event, {**self.fields, **kwargs}))
+
+    warning = info
+
+
+def _add_progress(user, count=5):
+    """Give the user progress and a note on several courses, so N+1 would show."""
+    for i in range(count):
+        course = Course(uid=f'budget-course-{i}', title=f'Budget Course {i}')
+        db.session.add(course)
+        db.session.flush()
+        db.session.add(CourseProgress(user_id=user.id, course_id=course.id, status='In Progress'))
+        db.session.add(CourseNote(user_id=user.id, course_id=course.id, content='note'))
+    db.session.commit()
+
+
+@pytest.mark.integration
+class TestQueryBudgets:
+    """Pin query counts so N+1 regressions fail the suite."""
+
+    def test_content_query_budget(self, app, authenticated_user):
+        """Test that /api/content does not query per course."""
+        _add_progress(authenticated_user['user'])
+
+        # courses + progress (joined) + notes (joined) + user loader
+        with assert_max_queries(4):
+            response = authenticated_user['client'].get('/api/content')
+        assert response.status_code == 200
+
+    def test_profile_query_budget(self, app, authenticated_user):
+        """Test that /api/profile does not query per progress entry or note."""
+        _add_progress(authenticated_user['user'])
+
+        # progress + course notes + ebook notes + reading progress + user loader
+        with assert_max_queries(5):
+            response = authenticated_user['client'].get('/api/profile')
+        assert response.status_code == 200
+
+    def test_budget_exceeded_fails(self, app):
+        """Test that the helper fails and lists statements when over budget."""
+        with pytest.raises(AssertionError, match='at most 1 queries, got 2'):
+            with assert_max_queries(1):
+                db.session.execute(db.text('SELECT 1'))
+                db.session.execute(db.text('SELECT 2'))
+
+
+@pytest.mark.integration
+class TestRequestQueryStats:
+    """Test per-request counts on request_completed and slow-query logging."""
+
+    def test_request_completed_includes_query_stats(self, client, monkeypatch):
+        """Test that request_completed carries db_queries and db_time_ms."""
+        events = []
+        monkeypatch.setattr('src.app.log', BindingLog(events))
+
+        client.get('/api/content', buffered=True)
+
+        completed = [fields for event, fields in events if event == 'request_completed']
+        assert completed[0]['db_queries'] >= 1
+        assert completed[0]['db_time_ms'] >= 0
+
+    def test_slow_query_logged_with_redacted_parameters(self, app, monkeypatch, caplog):
+        """Test that slow statements are logged without their bound values."""
+        monkeypatch.setattr(query_stats, '_slow_query_seconds', 0.0)
+
+        with caplog.at_level(logging.WARNING, logger='src.query_stats'):
+            db.session.execute(db.text('SELECT :secret_value'), {'secret_value': 'hunter2'})
+
+        messages = [r.getMessage() for r in caplog.records if r.name == 'src.query_stats']
+        assert messages and 'slow_query' in messages[0]
+        assert 'hunter2' not in messages[0]
+        assert "parameters=['str']" in messages[0]
+
+    def test_redact_parameters(self):
+        """Test redaction of dict, positional and executemany parameters."""
+        assert redact_parameters({'a': 1, 'b': 'x'}) == {'a': 'int', 'b': 'str'}
+        assert redact_parameters((1, 'x')) == ['int', 'str']
+        assert redact_parameters([{'a': 1}, {'a': 2}]) == [{'a': 'int'}, {'a': 'int'}]
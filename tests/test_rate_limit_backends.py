@@ -0,0 +1,211 @@
+"""
+Rate limit backend test suite.
+Tests token-bucket behavior, LRU eviction, thread safety, and the shared database backend.
+"""
+import threading
+import pytest
+from sqlalchemy.exc import OperationalError
+from src.app import db
+from src.rate_limit import MemoryRateLimitBackend, DatabaseRateLimitBackend, create_rate_limiter
+
+
+class FakeClock:
+    """Manually advanced clock for deterministic refill tests."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenDB:
+    """Stand-in for db whose engine raises like a locked or unreachable database."""
+
+    class engine:
+        @staticmethod
+        def begin():
+            raise OperationalError('SELECT', {}, Exception('database is locked'))
+
+
+@pytest.mark.rate_limit
+@pytest.mark.unit
+class TestMemoryBackend:
+    """Test the in-process token-bucket backend."""
+
+    def test_allows_up_to_limit_then_blocks(self):
+        """Test that a fresh bucket allows exactly `limit` hits."""
+        limiter = MemoryRateLimitBackend(clock=FakeClock())
+
+        results = [limiter.hit('ip', 5, 60) for _ in range(6)]
+
+        assert all(r.allowed for r in results[:5])
+        assert not results[5].allowed
+        assert results[4].remaining == 0
+        assert results[5].retry_after == pytest.approx(12.0)
+
+    def test_bucket_refills_over_time(self):
+        """Test that tokens refill at limit/period per second."""
+        clock = FakeClock()
+        limiter = MemoryRateLimitBackend(clock=clock)
+        for _ in range(5):
+            limiter.hit('ip', 5, 60)
+
+        clock.now += 12  # One token at 5 per minute
+        assert limiter.hit('ip', 5, 60).allowed
+        assert not limiter.hit('ip', 5, 60).allowed
+
+    def test_peek_does_not_consume(self):
+        """Test that peek reports state without taking a token."""
+        limiter = MemoryRateLimitBackend(clock=FakeClock())
+        limiter.hit('ip', 5, 60)
+
+        assert limiter.peek('ip', 5, 60).remaining == 4
+        assert limiter.peek('ip', 5, 60).remaining == 4
+
+    def test_lru_eviction_bounds_memory(self):
+        """Test that the least recently used key is evicted past max_keys."""
+        limiter = MemoryRateLimitBackend(max_keys=3, clock=FakeClock())
+        for ip in ['a', 'b', 'c']:
+            limiter.hit(ip, 5, 60)
+
+        limiter.hit('a', 5, 60)  # 'a' becomes most recently used
+        limiter.hit('d', 5, 60)  # Evicts 'b'
+
+        assert len(limiter) == 3
+        assert limiter.peek('b', 5, 60).remaining == 5
+        assert limiter.peek('a', 5, 60).remaining == 3
+
+    def test_concurrent_hits_never_exceed_limit(self):
+        """Test that concurrent threads cannot overspend a bucket."""
+        limiter = MemoryRateLimitBackend(clock=FakeClock())
+        allowed = []
+
+        def worker():
+            for _ in range(10):
+                allowed.append(limiter.hit('ip', 50, 60).allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert sum(allowed) == 50
+
+    def test_reset_single_key(self):
+        """Test that reset(key) only clears that bucket."""
+        limiter = MemoryRateLimitBackend(clock=FakeClock())
+        limiter.hit('a', 5, 60)
+        limiter.hit('b', 5, 60)
+
+        limiter.reset('a')
+
+        assert limiter.peek('a', 5, 60).remaining == 5
+        assert limiter.peek('b', 5, 60).remaining == 4
+
+
+@pytest.mark.rate_limit
+@pytest.mark.integration
+class TestDatabaseBackend:
+    """Test the shared database token-bucket backend."""
+
+    def test_shared_state_across_instances(self, app):
+        """Test that two backends (two workers) share one bucket."""
+        clock = FakeClock()
+        worker1 = DatabaseRateLimitBackend(db, clock=clock)
+        worker2 = DatabaseRateLimitBackend(db, clock=clock)
+        worker1.reset()
+
+        for _ in range(3):
+            assert worker1.hit('auth:10.0.0.1', 5, 60).allowed
+        for _ in range(2):
+            assert worker2.hit('auth:10.0.0.1', 5, 60).allowed
+
+        assert not worker1.hit('auth:10.0.0.1', 5, 60).allowed
+        assert not worker2.hit('auth:10.0.0.1', 5, 60).allowed
+
+    def test_refill_and_cleanup(self, app):
+        """Test that buckets refill and idle rows are purged."""
+        from src.models import RateLimitBucket
+
+        clock = FakeClock()
+        limiter = DatabaseRateLimitBackend(db, idle_ttl=60, cleanup_interval=2, clock=clock)
+        limiter.reset()
+
+        for _ in range(5):
+            limiter.hit('old', 5, 60)
+        clock.now += 120
+
+        assert limiter.peek('old', 5, 60).remaining == 5
+        limiter.hit('new', 5, 60)  # Second check since the last cleanup triggers a purge
+
+        db.session.expire_all()
+        keys = {row.key for row in RateLimitBucket.query.all()}
+        assert keys == {'new'}
+
+    def test_database_error_fails_open(self, app):
+        """Test that a DB error allows the request when fail_open=True."""
+        limiter = DatabaseRateLimitBackend(BrokenDB(), fail_open=True, clock=FakeClock())
+
+        result = limiter.hit('auth:10.0.0.1', 5, 60)
+
+        assert result.allowed
+        assert result.remaining == 0
+
+    def test_database_error_fails_closed(self, app):
+        """Test that a DB error rejects the request when fail_open=False."""
+        limiter = DatabaseRateLimitBackend(BrokenDB(), fail_open=False, clock=FakeClock())
+
+        result = limiter.hit('auth:10.0.0.1', 5, 60)
+
+        assert not result.allowed
+        assert result.retry_after == pytest.approx(12.0)
+
+    def test_factory_selects_backend(self, app, monkeypatch):
+        """Test that RATE_LIMIT_BACKEND picks the backend class."""
+        # The factory re-registers app.extensions['rate_limiter'] and ['rate_limits']; restore them afterwards
+        monkeypatch.setitem(app.extensions, 'rate_limiter', app.extensions['rate_limiter'])
+        monkeypatch.setitem(app.extensions, 'rate_limits', app.extensions['rate_limits'])
+
+        monkeypatch.setitem(app.config, 'RATE_LIMIT_BACKEND', 'database')
+        assert isinstance(create_rate_limiter(app, db), DatabaseRateLimitBackend)
+
+        monkeypatch.setitem(app.config, 'RATE_LIMIT_BACKEND', 'memory')
+        assert isinstance(create_rate_limiter(app, db), MemoryRateLimitBackend)
+
+        monkeypatch.setitem(app.config, 'RATE_LIMIT_BACKEND', 'redis')
+        with pytest.raises(ValueError):
+            create_rate_limiter(app, db)
+
+
+@pytest.mark.rate_limit
+@pytest.mark.unit
+class TestDatabaseBackendConcurrency:
+    """Test that concurrent checks against one bucket never over-admit."""
+
+    def test_sqlite_checks_are_serialized(self, tmp_path):
+        """Test that racing threads on a file-backed SQLite database get exactly `limit` tokens."""
+        from sqlalchemy import create_engine
+        from src.models import RateLimitBucket
+
+        class FileDB:
+            engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}", connect_args={'timeout': 30})
+
+        RateLimitBucket.__table__.create(FileDB.engine)
+        limiter = DatabaseRateLimitBackend(FileDB, fail_open=True, clock=FakeClock())
+        allowed = []
+
+        def worker():
+            for _ in range(10):
+                allowed.append(limiter.hit('auth:10.0.0.1', 20, 3600).allowed)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        FileDB.engine.dispose()
+
+        assert len(allowed) == 80
+        assert allowed.count(True) == 20
@@ -4,8 +4,7 @@ Tests rate limiting on authentication endpoints (login, register).
 """
 import pytest
 import time
-from datetime import datetime, timedelta
-from src.app import auth_attempts
+from src.app import db, rate_limiter
 from src.models import User
 
 
@@ -23,7 +22,7 @@ class TestRateLimitingLogin:
             db.session.commit()
 
         # Clear any existing rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make 5 login attempts (should all be allowed, though fail auth)
         for i in range(5):
@@ -54,7 +53,7 @@ class TestRateLimitingLogin:
             db.session.commit()
 
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make 5 successful login attempts
         for i in range(5):
@@ -84,7 +83,7 @@ class TestRateLimitingLogin:
             db.session.commit()
 
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make mixed attempts (all from same IP)
         attempts = [
@@ -115,7 +114,7 @@ class TestRateLimitingRegister:
     def test_rate_limit_register_enforcement(self, client, csrf_token):
         """Test that register rate limit (5 per minute) is enforced."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make 5 registration attempts
         for i in range(5):
@@ -138,7 +137,7 @@ class TestRateLimitingRegister:
     def test_rate_limit_register_invalid_data(self, client, csrf_token):
         """Test that invalid registration attempts count toward rate limit."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make 5 invalid registration attempts
         for i in range(5):
@@ -162,13 +161,10 @@ class TestRateLimitReset:
     def test_rate_limit_resets_after_timeout(self, client, app, csrf_token):
         """Test that rate limit resets after 1 minute timeout."""
         # This test would take 60+ seconds to run, so we'll simulate it
-        # by manipulating the auth_attempts data structure
-
-        from datetime import datetime, timedelta
-        from src.app import auth_attempts
+        # by exhausting the bucket with the rate limiter clock set in the past
 
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Create a test user
         with app.app_context():
@@ -179,9 +175,13 @@ class TestRateLimitReset:
             db.session.commit()
 
         # Simulate 5 old attempts (older than 1 minute)
-        old_time = datetime.utcnow() - timedelta(minutes=2)
-        test_ip = '127.0.0.1'
-        auth_attempts[test_ip] = [old_time] * 5
+        real_clock = rate_limiter.clock
+        rate_limiter.clock = lambda: real_clock() - 120
+        try:
+            for _ in range(5):
+                rate_limiter.hit('auth:127.0.0.1', 5, 60)
+        finally:
+            rate_limiter.clock = real_clock
 
         # New attempt should succeed because old attempts expired
         response = client.post('/api/login',
@@ -192,18 +192,21 @@ class TestRateLimitReset:
         assert response.status_code == 200, "Rate limit didn't reset after timeout"
 
     def test_rate_limit_cleanup_removes_old_attempts(self, client, csrf_token):
-        """Test that rate limit tracking removes old attempts."""
-        from datetime import datetime, timedelta
-
+        """Test that old attempts are refilled before new ones are counted."""
         # Clear and setup test data
-        auth_attempts.clear()
-        test_ip = '127.0.0.1'
+        rate_limiter.reset()
+        test_key = 'auth:127.0.0.1'
 
         # Add old attempts
-        old_time = datetime.utcnow() - timedelta(minutes=2)
-        auth_attempts[test_ip] = [old_time] * 3
-
-        # Make a new request (should trigger cleanup)
+        real_clock = rate_limiter.clock
+        rate_limiter.clock = lambda: real_clock() - 120
+        try:
+            for _ in range(3):
+                rate_limiter.hit(test_key, 5, 60)
+        finally:
+            rate_limiter.clock = real_clock
+
+        # Make a new request (should refill the bucket first)
         response = client.post('/api/register',
                               json={'username': 'cleanuptest', 'password': 'Password123'},
                               headers={'X-CSRFToken': csrf_token})
@@ -211,9 +214,9 @@ class TestRateLimitReset:
         # Should succeed
         assert response.status_code == 201
 
-        # Old attempts should be cleaned up
-        # New tracking should only have 1 attempt
-        assert len(auth_attempts[test_ip]) == 1
+        # Old attempts should have been refilled
+        # Bucket should only reflect 1 attempt
+        assert rate_limiter.peek(test_key, 5, 60).remaining == 4
 
 
 class TestRateLimitHeaders:
@@ -222,7 +225,7 @@ class TestRateLimitHeaders:
     def test_rate_limit_error_message(self, client, csrf_token):
         """Test that rate limit error returns clear message."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Exhaust rate limit
         for i in range(5):
@@ -262,19 +265,19 @@ class TestRateLimitMultipleIPs:
             db.session.commit()
 
         # Clear rate limit data and import
-        from src.app import auth_attempts, check_rate_limit
-        from datetime import datetime
-        auth_attempts.clear()
+        from src.app import rate_limiter, check_rate_limit
+        rate_limiter.reset()
 
-        # Simulate different IPs by manually manipulating auth_attempts
+        # Simulate different IPs by recording attempts directly
         # IP 1: Exhaust rate limit
         ip1 = '192.168.1.1'
-        now = datetime.utcnow()
-        auth_attempts[ip1] = [now] * 5
+        for _ in range(5):
+            rate_limiter.hit(f'auth:{ip1}', 5, 60)
 
         # IP 2: Should still be able to make requests
         ip2 = '192.168.1.2'
-        auth_attempts[ip2] = [now] * 2
+        for _ in range(2):
+            rate_limiter.hit(f'auth:{ip2}', 5, 60)
 
         # Verify IP 1 is blocked (within app context)
         with app.app_context():
@@ -292,7 +295,7 @@ class TestRateLimitEdgeCases:
     def test_rate_limit_rapid_fire_requests(self, client, csrf_token):
         """Test rate limiting with rapid sequential requests."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make rapid requests in quick succession
         responses = []
@@ -312,7 +315,7 @@ class TestRateLimitEdgeCases:
     def test_rate_limit_boundary_condition(self, client, app, csrf_token):
         """Test rate limiting at exact boundary (5 attempts)."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make exactly 5 requests
         for i in range(5):
@@ -330,8 +333,8 @@ class TestRateLimitEdgeCases:
     def test_rate_limit_concurrent_requests_tracking(self, client, csrf_token):
         """Test that concurrent requests are tracked correctly."""
         # Clear rate limit data and import
-        from src.app import auth_attempts
-        auth_attempts.clear()
+        from src.app import rate_limiter
+        rate_limiter.reset()
 
         # Make multiple requests that should all be tracked
         for i in range(3):
@@ -341,14 +344,13 @@ class TestRateLimitEdgeCases:
             assert response.status_code == 201
 
         # Verify tracking count
-        test_ip = '127.0.0.1'
-        assert test_ip in auth_attempts
-        assert len(auth_attempts[test_ip]) == 3, "Should have 3 tracked attempts"
+        test_key = 'auth:127.0.0.1'
+        assert rate_limiter.peek(test_key, 5, 60).remaining == 2, "Should have 3 tracked attempts"
 
     def test_rate_limit_does_not_affect_get_requests(self, client):
         """Test that rate limiting doesn't affect GET requests."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make many GET requests (should not be rate limited)
         for i in range(20):
@@ -361,7 +363,7 @@ class TestRateLimitEdgeCases:
     def test_rate_limit_with_missing_credentials(self, client, csrf_token):
         """Test rate limiting with missing username/password."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Make 5 requests with missing credentials
         for i in range(5):
@@ -387,7 +389,7 @@ class TestRateLimitSecurityBypass:
         # Rate limiting is per IP, not per username
 
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Create multiple users
         with app.app_context():
@@ -415,7 +417,7 @@ class TestRateLimitSecurityBypass:
     def test_rate_limit_bypass_with_false_headers(self, client, csrf_token):
         """Test that rate limit cannot be bypassed with spoofed headers."""
         # Clear rate limit data
-        auth_attempts.clear()
+        rate_limiter.reset()
 
         # Try to bypass by adding fake forwarding headers
         for i in range(5):
@@ -433,3 +435,136 @@ class TestRateLimitSecurityBypass:
                                       'X-Forwarded-For': '192.168.5.5'})
 
         assert response.status_code == 429, "Rate limit should not be bypassed with spoofed headers"
+
+
+class TestPerRouteRateLimits:
+    """Test the @rate_limit decorator on expensive routes."""
+
+    def test_rate_limit_headers_on_allowed_request(self, client, app, monkeypatch):
+        """Test that limited routes report their quota in headers."""
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'content', (3, 60))
+
+        response = client.get('/api/content')
+
+        assert response.status_code == 200
+        assert response.headers['X-RateLimit-Limit'] == '3'
+        assert response.headers['X-RateLimit-Remaining'] == '2'
+        assert 'X-RateLimit-Reset' in response.headers
+        assert 'Retry-After' not in response.headers
+
+    def test_content_rate_limit_enforced_with_retry_after(self, client, app, monkeypatch):
+        """Test that exceeding a route limit returns 429 with Retry-After."""
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'content', (3, 60))
+
+        for i in range(3):
+            assert client.get('/api/content').status_code == 200, f"Request {i+1} should succeed"
+
+        response = client.get('/api/content')
+
+        assert response.status_code == 429
+        assert response.headers['X-RateLimit-Remaining'] == '0'
+        assert int(response.headers['Retry-After']) == 20
+        assert 'too many' in response.get_json()['error'].lower()
+
+    def test_users_behind_same_ip_have_separate_buckets(self, app, authenticated_user, monkeypatch):
+        """Test that per-user keys don't punish a whole NATed classroom."""
+        client = authenticated_user['client']
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'profile', (2, 60))
+
+        for _ in range(2):
+            assert client.get('/api/profile').status_code == 200
+        assert client.get('/api/profile').status_code == 429
+
+        # A second user from the same IP still has a full bucket.
+        # Fresh app context so flask-wtf doesn't reuse the first client's cached CSRF token from g.
+        with app.app_context():
+            user = User(username='second_classroom_user')
+            user.set_password('SecurePassword123')
+            db.session.add(user)
+            db.session.commit()
+
+            other = app.test_client(use_cookies=True)
+            token = other.get('/csrf-token').get_json()['csrf_token']
+            login_response = other.post('/api/login',
+                                        json={'username': 'second_classroom_user',
+                                              'password': 'SecurePassword123'},
+                                        headers={'X-CSRFToken': token})
+            assert login_response.status_code == 200
+
+            response = other.get('/api/profile')
+        assert response.status_code == 200
+        assert response.headers['X-RateLimit-Remaining'] == '1'
+
+    def test_anonymous_clients_behind_proxy_have_separate_buckets(self, app, monkeypatch):
+        """Test that ProxyFix keys anonymous clients on X-Forwarded-For, not the proxy IP."""
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'content', (2, 60))
+        monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+        client = app.test_client()
+
+        # Both requests arrive from nginx (127.0.0.1) on behalf of different clients
+        for _ in range(2):
+            assert client.get('/api/content', headers={'X-Forwarded-For': '203.0.113.10'}).status_code == 200
+        assert client.get('/api/content', headers={'X-Forwarded-For': '203.0.113.10'}).status_code == 429
+
+        response = client.get('/api/content', headers={'X-Forwarded-For': '203.0.113.20'})
+        assert response.status_code == 200
+        assert rate_limiter.peek('content:ip:203.0.113.20', 2, 60).remaining == 1
+        assert rate_limiter.peek('content:ip:127.0.0.1', 2, 60).remaining == 2
+
+    def test_route_limits_independent_of_auth_limit(self, client, app, csrf_token, monkeypatch):
+        """Test that route buckets don't consume login/register attempts."""
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'content', (3, 60))
+
+        for _ in range(3):
+            client.get('/api/content')
+
+        response = client.post('/api/register',
+                              json={'username': 'separatebucket', 'password': 'Password123'},
+                              headers={'X-CSRFToken': csrf_token})
+        assert response.status_code == 201
+
+    def test_rate_limit_can_be_disabled(self, client, app, monkeypatch):
+        """Test that RATE_LIMIT_ENABLED=False bypasses route limits."""
+        rate_limiter.reset()
+        monkeypatch.setitem(app.extensions['rate_limits'], 'content', (1, 60))
+        monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', False)
+
+        for _ in range(3):
+            response = client.get('/api/content')
+            assert response.status_code == 200
+            assert 'X-RateLimit-Limit' not in response.headers
+
+    def test_parse_limit(self):
+        """Test limit string parsing."""
+        from src.rate_limit import parse_limit
+
+        assert parse_limit('60/minute') == (60, 60)
+        assert parse_limit('10/hours') == (10, 3600)
+        with pytest.raises(ValueError):
+            parse_limit('ten per minute')
+
+    def test_parse_limit_rejects_non_positive_counts(self):
+        """Test that a zero or negative count is rejected instead of blocking every request."""
+        from src.rate_limit import parse_limit
+
+        for spec in ('0/minute', '-5/hour'):
+            with pytest.raises(ValueError, match='Invalid rate limit'):
+                parse_limit(spec)
+
+    def test_invalid_config_fails_at_startup(self, app, monkeypatch):
+        """Test that a malformed RATE_LIMITS value is rejected when the limiter is built."""
+        from src.rate_limit import create_rate_limiter
+
+        monkeypatch.setitem(app.extensions, 'rate_limiter', app.extensions['rate_limiter'])
+        monkeypatch.setitem(app.extensions, 'rate_limits', app.extensions['rate_limits'])
+        monkeypatch.setitem(app.config, 'RATE_LIMITS', dict(app.config['RATE_LIMITS'], content='lots/minute'))
+
+        with pytest.raises(ValueError):
+            create_rate_limiter(app, db)
@@ -0,0 +1,69 @@
+"""
+Serving mode test suite.
+Tests worker count parsing and the per-worker re-initialization run after fork.
+"""
+import logging
+import pytest
+from src.server import init_worker, worker_count
+
+
+@pytest.mark.unit
+class TestWorkerCount:
+    """Test SERVER_WORKERS parsing."""
+
+    def test_auto_uses_cpu_count(self, monkeypatch):
+        """Test that 'auto' and 0 mean one worker per CPU."""
+        monkeypatch.setattr('os.cpu_count', lambda: 6)
+
+        assert worker_count('auto') == 6
+        assert worker_count('0') == 6
+        assert worker_count('3') == 3
+
+    def test_invalid_count_rejected(self):
+        """Test that negative counts raise."""
+        with pytest.raises(ValueError):
+            worker_count('-2')
+
+
+@pytest.mark.integration
+class TestInitWorker:
+    """Test that inherited sockets, threads and counters are replaced."""
+
+    def test_resets_pool_session_and_metrics(self, app):
+        """Test that the DB pool, Calibre session and metrics are per worker."""
+        from src.app import db
+        from src.calibre_client import get_calibre_client
+        from src.metrics import registry, http_requests_total
+
+        old_pool = db.engine.pool
+        old_session = get_calibre_client().session
+        http_requests_total.inc(method='GET', endpoint='index', status=200)
+
+        init_worker(app)
+
+        assert db.engine.pool is not old_pool
+        assert get_calibre_client().session is not old_session
+        assert http_requests_total.get(method='GET', endpoint='index', status=200) == 0
+
+    def test_restarts_log_writer_thread(self, app):
+        """Test that queue-backed logging gets a fresh queue and listener."""
+        from src import logging_config
+
+        records = []
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+
+        logging_config._start_queue_logging([ListHandler()], maxsize=100)
+        try:
+            old_handler = logging_config._queue_handler
+
+            init_worker(app)
+
+            assert logging_config._queue_handler is not old_handler
+            logging.getLogger('gleh.test.fork').warning('after fork')
+            logging_config.stop_log_listener()
+            assert 'after fork' in records
+        finally:
+            logging_config.stop_log_listener()